@@ -0,0 +1,55 @@
+'''
+Created on 18.10.26
+
+@author: Dennis Rathgeb
+
+Adaptive placement of sweep frequencies.
+New points are put where the measured curve can not be linearly interpolated
+from its neighbours, i.e. where gain or phase bend.
+'''
+
+import numpy as np
+
+# intervals narrower than this (in decades) are not split anymore
+MIN_LOG_SPACING = 0.002
+
+
+def interpolation_error(freq, gain_db, phase):
+    """
+    Error of each inner point against the linear interpolation (over log f) of its neighbours.
+    Returns gain error (dB) and phase error (degrees), the outer points get 0.
+    """
+    x = np.log10(freq)
+    gain_db = np.asarray(gain_db, dtype=float)
+    phase = np.degrees(np.unwrap(np.radians(phase)))
+    gain_err = np.zeros_like(x)
+    phase_err = np.zeros_like(x)
+    if x.size < 3:
+        return gain_err, phase_err
+    w = (x[1:-1] - x[:-2]) / (x[2:] - x[:-2])
+    gain_err[1:-1] = np.abs(gain_db[1:-1] - (gain_db[:-2] + w * (gain_db[2:] - gain_db[:-2])))
+    phase_err[1:-1] = np.abs(phase[1:-1] - (phase[:-2] + w * (phase[2:] - phase[:-2])))
+    return gain_err, phase_err
+
+
+def refine(freq, gain, phase, max_gain_error, max_phase_error, budget):
+    """
+    Returns up to budget new frequencies, worst intervals first.
+    freq, gain (linear) and phase have to be sorted by frequency.
+    An empty result means the error target is reached.
+    """
+    freq = np.asarray(freq, dtype=float)
+    if budget <= 0 or freq.size < 3:
+        return []
+    gain_db = 20 * np.log10(np.maximum(gain, 1e-12))
+    gain_err, phase_err = interpolation_error(freq, gain_db, phase)
+    score = np.maximum(gain_err / max_gain_error, phase_err / max_phase_error)
+
+    # an interval is as bad as the worse of its two end points
+    interval_score = np.maximum(score[:-1], score[1:])
+    x = np.log10(freq)
+    interval_score[np.diff(x) < 2 * MIN_LOG_SPACING] = 0
+
+    candidates = np.flatnonzero(interval_score > 1)
+    candidates = candidates[np.argsort(interval_score[candidates])[::-1]][:budget]
+    return list(10 ** ((x[candidates] + x[candidates + 1]) / 2))
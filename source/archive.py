@@ -0,0 +1,207 @@
+'''
+Created on 18.10.26
+
+@author: Dennis Rathgeb
+
+Persistent store for sweep results.
+
+Layout of the archive directory:
+    index.jsonl             one line per run (id, device, date, param hash), append only
+    runs/<run_id>/meta.json parameter snapshot of the run
+    runs/<run_id>/<col>.f64 one append only float64 file per column
+    runs/<run_id>/checkpoint.json planned points of the sweep, to resume it (see checkpoint.py)
+    runs/<run_id>/samples.f64 raw samples of fixed sampling, per point freq, n, n x rms1, n x rms2, n x phase
+
+Points are appended while the sweep runs, so an aborted sweep keeps what was measured.
+The column files can be memory mapped without loading the whole archive.
+The raw samples can be reduced again later, e.g. with another outlier tolerance (see sample_stats.reduce_batch).
+'''
+
+import json
+import os
+import threading
+import time
+import uuid
+from datetime import datetime
+
+import numpy as np
+
+from params import params_hash
+
+COLUMNS = ("timestamp", "freq", "gain", "phase", "n", "gain_std", "phase_std")
+INDEX_FILE = "index.jsonl"
+RUNS_DIR = "runs"
+META_FILE = "meta.json"
+CHECKPOINT_FILE = "checkpoint.json"
+SAMPLES_FILE = "samples.f64"
+
+
+class RunWriter:
+    '''
+    Appends the points of one run to its column files.
+    '''
+    def __init__(self, run_dir, run_id):
+        self.run_id = run_id
+        self.checkpoint_path = os.path.join(run_dir, CHECKPOINT_FILE)
+        self.files = {col: open(os.path.join(run_dir, col + ".f64"), "ab") for col in COLUMNS}
+        self.samples_path = os.path.join(run_dir, SAMPLES_FILE)
+        self.samples = None
+        self.n_points = 0
+
+    def append(self, freq, gain, phase, stats=None, samples=None):
+        """samples are the raw (rms1, rms2, phase) lists of the point if the sampling keeps them"""
+        if samples is not None:
+            self.append_samples(freq, *samples)
+        stats = stats or {}
+        row = {
+            "timestamp": time.time(),
+            "freq": freq,
+            "gain": gain,
+            "phase": phase,
+            "n": stats.get("n", 0),
+            "gain_std": stats.get("gain_std", np.nan),
+            "phase_std": stats.get("phase_std", np.nan),
+        }
+        for col, f in self.files.items():
+            f.write(np.float64(row[col]).tobytes())
+            f.flush()
+        self.n_points += 1
+
+    def append_samples(self, freq, rms1, rms2, phase):
+        if self.samples is None:
+            self.samples = open(self.samples_path, "ab")
+        record = np.concatenate(([freq, len(rms1)], rms1, rms2, phase)).astype(np.float64)
+        # one write per point, a crash leaves at most the last record incomplete
+        self.samples.write(record.tobytes())
+        self.samples.flush()
+
+    def close(self):
+        for f in self.files.values():
+            f.close()
+        if self.samples is not None:
+            self.samples.close()
+
+
+class SweepArchive:
+    '''
+    Archive of sweep runs with an in-memory index by device, date and parameter hash.
+    '''
+    def __init__(self, root):
+        self.root = root
+        os.makedirs(os.path.join(root, RUNS_DIR), exist_ok=True)
+        self.runs = {}
+        self.by_device = {}
+        self.by_date = {}
+        self.by_hash = {}
+        # rigs and requests create runs from their own threads
+        self.lock = threading.Lock()
+        self.load_index()
+
+    def load_index(self):
+        path = os.path.join(self.root, INDEX_FILE)
+        if not os.path.exists(path):
+            return
+        with open(path) as f:
+            for line in f:
+                if line.strip():
+                    self.add_to_index(json.loads(line))
+
+    def add_to_index(self, entry):
+        run_id = entry["id"]
+        self.runs[run_id] = entry
+        self.by_device.setdefault(entry["device"], []).append(run_id)
+        self.by_date.setdefault(entry["date"], []).append(run_id)
+        self.by_hash.setdefault(entry["param_hash"], []).append(run_id)
+
+    def create_run(self, params, device):
+        """creates a new run and returns its RunWriter"""
+        now = datetime.now()
+        run_id = now.strftime("%Y%m%d-%H%M%S-") + uuid.uuid4().hex[:6]
+        entry = {
+            "id": run_id,
+            "device": device or "unknown",
+            "date": now.strftime("%Y-%m-%d"),
+            "started": now.isoformat(timespec="seconds"),
+            "param_hash": params_hash(params),
+        }
+        run_dir = os.path.join(self.root, RUNS_DIR, run_id)
+        os.makedirs(run_dir)
+        with open(os.path.join(run_dir, META_FILE), "w") as f:
+            json.dump(dict(entry, params=params), f, indent=2)
+        with self.lock:
+            with open(os.path.join(self.root, INDEX_FILE), "a") as f:
+                f.write(json.dumps(entry) + "\n")
+            self.add_to_index(entry)
+        return RunWriter(run_dir, run_id)
+
+    def open_run(self, run_id):
+        """RunWriter that appends to an existing run, e.g. to resume it"""
+        if run_id not in self.runs:
+            raise KeyError(f"Unknown run {run_id}")
+        return RunWriter(os.path.join(self.root, RUNS_DIR, run_id), run_id)
+
+    def checkpoint_path(self, run_id):
+        """path of the checkpoint of a run, None if the run has none"""
+        if run_id not in self.runs:
+            raise KeyError(f"Unknown run {run_id}")
+        path = os.path.join(self.root, RUNS_DIR, run_id, CHECKPOINT_FILE)
+        return path if os.path.exists(path) else None
+
+    def list_runs(self, device=None, date=None, param_hash=None):
+        """index entries matching all given filters, oldest first"""
+        with self.lock:
+            ids = None
+            for index, key in ((self.by_device, device), (self.by_date, date), (self.by_hash, param_hash)):
+                if key is None:
+                    continue
+                matches = set(index.get(key, []))
+                ids = matches if ids is None else ids & matches
+            if ids is None:
+                ids = list(self.runs.keys())
+            entries = [self.runs[i] for i in ids]
+        return sorted(entries, key=lambda e: e["started"])
+
+    def load_run(self, run_id):
+        """meta data and memory mapped columns of a run"""
+        if run_id not in self.runs:
+            raise KeyError(f"Unknown run {run_id}")
+        run_dir = os.path.join(self.root, RUNS_DIR, run_id)
+        with open(os.path.join(run_dir, META_FILE)) as f:
+            meta = json.load(f)
+        columns = {}
+        for col in COLUMNS:
+            path = os.path.join(run_dir, col + ".f64")
+            # only complete values, a point might be half written
+            n = os.path.getsize(path) // 8
+            columns[col] = np.memmap(path, dtype=np.float64, mode="r", shape=(n,)) if n else np.empty(0)
+        n_points = min(len(c) for c in columns.values())
+        meta["columns"] = {col: c[:n_points] for col, c in columns.items()}
+        return meta
+
+    def load_samples(self, run_id):
+        """
+        Raw samples of a run as freq and (points x samples) arrays rms1, rms2, phase,
+        padded with NaN where a point has fewer samples. None if the run kept no samples.
+        """
+        if run_id not in self.runs:
+            raise KeyError(f"Unknown run {run_id}")
+        path = os.path.join(self.root, RUNS_DIR, run_id, SAMPLES_FILE)
+        if not os.path.exists(path):
+            return None
+        data = np.fromfile(path, dtype=np.float64)
+        records = []
+        pos = 0
+        while pos + 2 <= len(data):
+            n = int(data[pos + 1])
+            end = pos + 2 + 3 * n
+            if end > len(data):
+                # half written last point
+                break
+            records.append((data[pos], data[pos + 2:end].reshape(3, n)))
+            pos = end
+        width = max((r.shape[1] for _, r in records), default=0)
+        block = np.full((3, len(records), width), np.nan)
+        for i, (_, r) in enumerate(records):
+            block[:, i, :r.shape[1]] = r
+        freq = np.array([f for f, _ in records])
+        return freq, block[0], block[1], block[2]
@@ -0,0 +1,153 @@
+'''
+Created on 18.10.26
+
+@author: Dennis Rathgeb
+
+Async sweep scheduler for the BodePlotter.
+'''
+
+import asyncio
+import time
+
+import broadband
+from async_instruments import AsyncAWG, AsyncSDS8XX
+from tracing import tracer
+
+
+class AsyncSweep:
+    '''
+    Runs a BodePlotter sweep without blocking the event loop.
+    Work that does not depend on each other is overlapped:
+    - the AWG frequency and the scope timebase of a point are set at the same time
+    - the next point is set up while the current one is reduced and streamed
+    - a broadband capture is analysed while the multisine of the next decade is uploaded
+    The points come from BodePlotter.point_batches, an adaptive sweep refines after each batch.
+    '''
+    def __init__(self, bode):
+        self.bode = bode
+        self.awg = AsyncAWG(bode.awg)
+        self.scope = AsyncSDS8XX(bode.scope)
+
+    async def setup(self):
+        # setup touches both instruments in order, nothing else runs yet
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self.bode.setup_run)
+
+    async def resume(self, checkpoint):
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self.bode.resume_run, checkpoint)
+
+    async def set_point(self, freq, timebase):
+        await asyncio.gather(
+            self.awg.set_frequency(1, int(freq)),
+            self.scope.run(self.set_scope_point, freq, timebase),
+        )
+        self.bode.point_set_at = time.monotonic()
+
+    def set_scope_point(self, freq, timebase):
+        """runs on the scope's worker thread, its measurements count their attempts for freq from here on"""
+        tracer.set_point(freq)
+        self.bode.scope.set_timebase(timebase)
+
+    async def points(self):
+        """async generator of (freq_meas, gain, phase) in sweep order"""
+        if self.bode.mode == "broadband":
+            points = self.broadband_points()
+        elif self.bode.mode == "hwsweep":
+            points = self.hwsweep_points()
+        else:
+            points = self.checkpoint_points()
+        try:
+            async for point in points:
+                yield point
+        finally:
+            await points.aclose()
+            self.close()
+
+    async def checkpoint_points(self):
+        batches = self.bode.point_batches()
+        try:
+            for batch in batches:
+                async for point in self.pipelined(batch):
+                    yield point
+        finally:
+            batches.close()
+
+    async def pipelined(self, points):
+        """
+        Measures (index, freq, timebase) of the checkpoint with the next point set up early.
+        An instrument error fails the point, the instruments are recovered before the next one is set.
+        """
+        loop = asyncio.get_running_loop()
+        if not points:
+            return
+        next_set = asyncio.ensure_future(self.set_point(*points[0][1:]))
+        try:
+            for i, (index, f, tb) in enumerate(points):
+                try:
+                    await next_set
+                    raw = await self.scope.run(self.bode.acquire_point, f)
+                except Exception as e:
+                    await self.scope.run(self.bode.point_failed, index, f, e)
+                    raw = None
+                if i + 1 < len(points):
+                    next_set = asyncio.ensure_future(self.set_point(*points[i + 1][1:]))
+                if raw is None:
+                    yield 0.0, 0.0, 0.0
+                    continue
+                try:
+                    result = await loop.run_in_executor(None, self.bode.reduce_point, f, raw)
+                except Exception as e:
+                    # the next point is already being set, no reconnect now
+                    self.bode.point_failed(index, f, e, recover=False)
+                    yield 0.0, 0.0, 0.0
+                    continue
+                yield self.bode.point_done(index, result)
+        finally:
+            if not next_set.done():
+                next_set.cancel()
+
+    async def broadband_points(self):
+        """one capture per decade, its analysis overlaps the upload of the next multisine"""
+        loop = asyncio.get_running_loop()
+        bode = self.bode
+        plan = broadband.plan(bode.start_freq, bode.stop_freq, bode.num_points)
+        if not plan:
+            return
+        await self.awg.run(bode.set_multisine, *plan[0])
+        for i, (f0, harmonics) in enumerate(plan):
+            waveforms, dt = await self.scope.run(bode.capture_broadband, f0, harmonics)
+            jobs = [loop.run_in_executor(None, bode.reduce_broadband, f0, harmonics, waveforms, dt, dict(bode.vdiv))]
+            if i + 1 < len(plan):
+                jobs.append(self.awg.run(bode.set_multisine, *plan[i + 1]))
+            (freq, gain, phase), *_ = await asyncio.gather(*jobs)
+            for point in bode.spectrum_points(freq, gain, phase):
+                yield point
+
+    async def hwsweep_points(self):
+        """the whole sweep is one capture, only its demodulation moves off the scope's worker"""
+        loop = asyncio.get_running_loop()
+        waveforms, dt = await self.scope.run(self.bode.capture_hwsweep)
+        freq, gain, phase = await loop.run_in_executor(None, self.bode.reduce_hwsweep, waveforms, dt,
+                                                       dict(self.bode.vdiv))
+        for point in self.bode.spectrum_points(freq, gain, phase):
+            yield point
+
+    async def run(self):
+        """async counterpart of BodePlotter.run"""
+        freq_meas = []
+        gain = []
+        phase = []
+        await self.setup()
+        async for f, g, p in self.points():
+            if f > 0:
+                freq_meas.append(f)
+                gain.append(g)
+                phase.append(p)
+        if freq_meas:
+            freq_meas, gain, phase = (list(x) for x in zip(*sorted(zip(freq_meas, gain, phase))))
+        return freq_meas, gain, phase
+
+    def close(self):
+        self.awg.close()
+        self.scope.close()
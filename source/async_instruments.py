@@ -0,0 +1,88 @@
+'''
+Created on 18.10.26
+
+@author: Dennis Rathgeb
+
+Asyncio versions of the AWG and scope interfaces.
+Every instrument gets its own worker thread, so calls to one device stay in order
+while the AWG (serial) and the scope (VISA) can work at the same time.
+'''
+
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+
+def _async_method(name):
+    async def method(self, *args, **kwargs):
+        return await self.run(getattr(self.device, name), *args, **kwargs)
+    method.__name__ = name
+    return method
+
+
+class AsyncInstrument:
+    def __init__(self, device):
+        self.device = device
+        self.executor = ThreadPoolExecutor(max_workers=1)
+
+    async def run(self, func, *args, **kwargs):
+        """runs func on the worker thread of this instrument"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, functools.partial(func, *args, **kwargs))
+
+    def close(self):
+        self.executor.shutdown(wait=False)
+
+
+class AsyncAWG(AsyncInstrument):
+    '''
+    Async wrapper around a BaseAWG driver.
+    '''
+    connect = _async_method("connect")
+    disconnect = _async_method("disconnect")
+    initialize = _async_method("initialize")
+    get_id = _async_method("get_id")
+    enable_output = _async_method("enable_output")
+    set_frequency = _async_method("set_frequency")
+    set_phase = _async_method("set_phase")
+    set_wave_type = _async_method("set_wave_type")
+    set_amplitude = _async_method("set_amplitude")
+    set_offset = _async_method("set_offset")
+    set_load_impedance = _async_method("set_load_impedance")
+    upload_arbitrary = _async_method("upload_arbitrary")
+    start_sweep = _async_method("start_sweep")
+    stop_sweep = _async_method("stop_sweep")
+    ping = _async_method("ping")
+    reconnect = _async_method("reconnect")
+    invalidate = _async_method("invalidate")
+
+
+class AsyncSDS8XX(AsyncInstrument):
+    '''
+    Async wrapper around the SDS8XX driver.
+    '''
+    connect = _async_method("connect")
+    query = _async_method("query")
+    write = _async_method("write")
+    auto_setup = _async_method("auto_setup")
+    set_vdiv = _async_method("set_vdiv")
+    get_vdiv = _async_method("get_vdiv")
+    set_coupling = _async_method("set_coupling")
+    set_timebase = _async_method("set_timebase")
+    get_timebase = _async_method("get_timebase")
+    get_sample_rate = _async_method("get_sample_rate")
+    run_auto = _async_method("run_auto")
+    capture_waveforms = _async_method("capture_waveforms")
+    capture_record = _async_method("capture_record")
+    query_rms = _async_method("query_rms")
+    query_freq = _async_method("query_freq")
+    query_pkpk = _async_method("query_pkpk")
+    query_pha = _async_method("query_pha")
+    query_measurements = _async_method("query_measurements")
+    setup_statistics = _async_method("setup_statistics")
+    reset_statistics = _async_method("reset_statistics")
+    query_statistics = _async_method("query_statistics")
+    measure_statistics = _async_method("measure_statistics")
+    ping = _async_method("ping")
+    reconnect = _async_method("reconnect")
+    invalidate = _async_method("invalidate")
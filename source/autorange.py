@@ -0,0 +1,74 @@
+'''
+Created on 18.10.26
+
+@author: Dennis Rathgeb
+
+Vertical auto ranging of the scope channels during a sweep.
+The VDIV of the next point is predicted from the RMS measured at the nearest frequencies,
+so the signal fills the screen and the measurements are valid on the first try.
+Adaptive sweeps and retries jump around in frequency, the prediction doesn't depend on the order.
+'''
+
+import bisect
+import math
+
+import oscillatordrivers.constants as constants
+from oscillatordrivers.sds8xx import N_DIV_V
+
+# fraction of the vertical screen the peak to peak value should fill after a range change
+TARGET_FILL = 0.6
+# hysteresis band, the range is only changed if the fill leaves it
+MIN_FILL = 0.25
+MAX_FILL = 0.9
+# limit for the extrapolated change of the RMS from the nearest measured point
+MAX_STEP = 10.0
+
+
+class AutoRanger:
+    def __init__(self, vdiv_options=constants.VALID_VDIVRANGES):
+        self.vdiv_options = sorted(vdiv_options)
+        self.history = {}
+
+    def reset(self):
+        self.history = {}
+
+    def update(self, channel, freq, rms):
+        """stores the RMS measured at freq"""
+        if rms > 0 and freq > 0:
+            self.history.setdefault(channel, {})[freq] = rms
+
+    def predict(self, channel, freq):
+        """
+        RMS expected at freq, interpolated over log f and log RMS between the measured neighbours
+        or extrapolated from the two nearest points outside of them.
+        """
+        history = self.history.get(channel)
+        if not history:
+            return None
+        if freq in history:
+            return history[freq]
+        freqs = sorted(history)
+        i = bisect.bisect(freqs, freq)
+        if len(freqs) == 1:
+            return history[freqs[0]]
+        # neighbours around freq, or the two nearest ones at the end it lies beyond
+        f0, f1 = freqs[min(max(i - 1, 0), len(freqs) - 2):][:2]
+        nearest = f0 if abs(math.log(freq / f0)) < abs(math.log(freq / f1)) else f1
+        slope = math.log(history[f1] / history[f0]) / math.log(f1 / f0)
+        step = (freq / nearest) ** slope
+        return history[nearest] * min(max(step, 1 / MAX_STEP), MAX_STEP)
+
+    @staticmethod
+    def fill(rms, vdiv):
+        """fraction of the screen a sine with this RMS fills"""
+        return 2 * math.sqrt(2) * rms / (N_DIV_V * vdiv)
+
+    def next_vdiv(self, channel, vdiv, freq):
+        """new VDIV for the point at freq or None if the current one is fine"""
+        rms = self.predict(channel, freq)
+        if rms is None or MIN_FILL <= self.fill(rms, vdiv) <= MAX_FILL:
+            return None
+        wanted = 2 * math.sqrt(2) * rms / (N_DIV_V * TARGET_FILL)
+        fitting = [v for v in self.vdiv_options if v >= wanted]
+        new_vdiv = min(fitting) if fitting else max(self.vdiv_options)
+        return None if math.isclose(new_vdiv, vdiv) else new_vdiv
@@ -6,22 +6,52 @@ Created on May 15, 2018
 Update of original file on Nov. 17 2018 by Dundarave to add entries needed for FY6600 support.
 '''
 
-from awgdrivers.dummy_awg import DummyAWG
-from awgdrivers.fy6900 import FY6900
+import importlib
+from importlib.metadata import entry_points
+
+# entry point group third-party AWG drivers register in, value "package.module:ClassName"
+ENTRY_POINT_GROUP = "sds8xx_bode.awg_drivers"
 
 class AwgFactory(object):
     
     def __init__(self):
         self.awgs = {}
+        # drivers that are not imported yet, short name -> "module:ClassName"
+        self.lazy_awgs = {}
+        self.entry_points_loaded = False
     
     def add_awg(self, short_name, awg_class):
         self.awgs[short_name] = awg_class
+
+    def add_lazy_awg(self, short_name, target):
+        """registers a driver by "module:ClassName", the module is imported on first use"""
+        self.lazy_awgs[short_name] = target
         
     def get_class_by_name(self, short_name):
+        if short_name not in self.awgs and short_name not in self.lazy_awgs:
+            self.load_entry_points()
+        if short_name not in self.awgs:
+            # the entry stays if the import fails, so the next call reports the error again
+            module_name, class_name = self.lazy_awgs[short_name].split(":")
+            module = importlib.import_module(module_name)
+            self.awgs[short_name] = getattr(module, class_name)
+            del self.lazy_awgs[short_name]
         return self.awgs[short_name]
 
+    def load_entry_points(self):
+        """adds the drivers of installed packages, only looked up once"""
+        if self.entry_points_loaded:
+            return
+        self.entry_points_loaded = True
+        for ep in entry_points(group=ENTRY_POINT_GROUP):
+            if ep.name not in self.awgs:
+                self.lazy_awgs.setdefault(ep.name, ep.value)
+
+    def names(self):
+        self.load_entry_points()
+        return sorted(set(self.awgs) | set(self.lazy_awgs))
+
 # Initialize factory
 awg_factory = AwgFactory()
-awg_factory.add_awg(DummyAWG.SHORT_NAME, DummyAWG)
-awg_factory.add_awg(FY6900.SHORT_NAME, FY6900)
-
+awg_factory.add_lazy_awg("dummy", "awgdrivers.dummy_awg:DummyAWG")
+awg_factory.add_lazy_awg("FY6900", "awgdrivers.fy6900:FY6900")
@@ -46,3 +46,34 @@ class BaseAWG(object):
     def set_load_impedance(self, channel, z):
         raise NotImplementedError()
 
+    def upload_arbitrary(self, channel, samples, slot=1):
+        """
+        Uploads one period of samples (scaled to -1..1) to arbitrary waveform slot
+        and outputs it on channel. The period repeats at the set frequency.
+        """
+        raise NotImplementedError()
+
+    def reconnect(self):
+        return self.connect()
+
+    def ping(self):
+        """health check of the connection, drivers that can't check it are always alive"""
+        return True
+
+    def start_sweep(self, channel, start_freq, stop_freq, duration, log=True):
+        """
+        Starts the internal frequency sweep of the generator from start_freq to stop_freq
+        in duration seconds, repeated until stop_sweep.
+        """
+        raise NotImplementedError()
+
+    def stop_sweep(self):
+        raise NotImplementedError()
+
+    def invalidate(self):
+        """
+        Forget any settings the driver remembers to skip redundant writes.
+        Drivers without such a cache don't need to override this.
+        """
+        pass
+
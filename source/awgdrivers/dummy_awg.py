@@ -56,4 +56,13 @@ class DummyAWG(BaseAWG):
     
     def set_load_impedance(self, channel, z):
         pass
+
+    def upload_arbitrary(self, channel, samples, slot=1):
+        pass
+
+    def start_sweep(self, channel, start_freq, stop_freq, duration, log=True):
+        pass
+
+    def stop_sweep(self):
+        pass
     
@@ -8,9 +8,11 @@ Driver for FeelTech FY6900 AWG.
 
 import serial
 import time
+import numpy as np
 from awgdrivers.base_awg import BaseAWG
 import awgdrivers.constants as constants
 from awgdrivers.exceptions import UnknownChannelError
+from tracing import traced
 
 # Port settings constants
 BAUD_RATE = 115200
@@ -25,7 +27,25 @@ EOL = '\x0A'
 CHANNELS = (0, 1, 2)
 CHANNELS_ERROR = "Channel can be 1 or 2."
 # FY6900 requires some delay between commands. 0.5 seconds seems to work, .25 seconds is iffy. Your unit might need more.
+# Only used as fallback if the unit does not acknowledge commands.
 SLEEP_TIME = 0.4
+# The FY6900 answers every W-command with a single LF once it is processed.
+# Timeout while waiting for that acknowledgement.
+ACK_TIMEOUT = 1.0
+# Bounds and safety margin for the per unit delay learned at connect time
+MIN_SLEEP_TIME = 0.02
+DELAY_MARGIN = 2.0
+# read timeout while probing the unit at connect time, a working unit answers much faster
+PROBE_TIMEOUT = 0.5
+
+# Arbitrary waveforms have 8192 points of 14 bit, there are 64 slots.
+# The wave number of slot n in WMW/WFW is ARB_WAVE_BASE + n - 1.
+ARB_POINTS = 8192
+ARB_MAX_CODE = 2 ** 14 - 1
+ARB_SLOTS = 64
+ARB_WAVE_BASE = 36
+# the upload of 16 kB takes about 1.5 s at 115200 baud
+ARB_TIMEOUT = 5
 
 # Output impedance of the AWG
 R_IN = 50.0
@@ -44,17 +64,27 @@ class FY6900(BaseAWG):
         self.channel_on = [False, False]
         self.r_load = [50, 50]
         self.v_out_coeff = [1, 1]
+        # ack handling and delay get learned in connect()
+        self.use_ack = False
+        self.cmd_delay = SLEEP_TIME
+        # last command sent per register (e.g. "WMN") to drop redundant writes
+        self.last_sent = {}
+
+    def open_port(self):
+        return serial.Serial(
+            self.port,
+            BAUD_RATE,
+            BITS,
+            PARITY,
+            STOP_BITS,
+            timeout=self.timeout
+        )
 
     def connect(self):   
         try:
-            self.ser = serial.Serial(
-                self.port,
-                BAUD_RATE,
-                BITS,
-                PARITY,
-                STOP_BITS,
-                timeout=self.timeout
-            )
+            self.ser = self.open_port()
+            self.last_sent = {}
+            self.learn_timing()
             return True  
         except serial.SerialException as e:
             print(f"Failed to connect to AWG on {self.port}: {e}")
@@ -65,22 +95,112 @@ class FY6900(BaseAWG):
     
     def disconnect(self):
         self.ser.close()
+
+    def reconnect(self):
+        """
+        Reopens the port, e.g. after the USB connection dropped.
+        The outputs are switched back to the state they had.
+        """
+        try:
+            self.ser.close()
+        except Exception:
+            pass
+        if not self.connect():
+            return False
+        self.enable_output(1, self.channel_on[0])
+        self.enable_output(2, self.channel_on[1])
+        return True
+
+    def ping(self):
+        """cheap health check, units that don't answer only get their port checked"""
+        if self.ser is None or not self.ser.is_open:
+            return False
+        if not self.use_ack:
+            return True
+        try:
+            return self.query("UMO") != ""
+        except Exception:
+            return False
         
+    def learn_timing(self):
+        """
+        Times a harmless query to find out if the unit answers and how fast, waiting PROBE_TIMEOUT at most.
+        If the answer ends with LF, commands wait for the acknowledgement instead of sleeping.
+        If it comes without LF the acknowledgement can't be detected, send_command sleeps
+        a delay learned from the time to the first byte instead. A silent unit gets SLEEP_TIME.
+        """
+        self.ser.reset_input_buffer()
+        timeout = self.ser.timeout
+        self.ser.timeout = PROBE_TIMEOUT
+        try:
+            start = time.perf_counter()
+            self.ser.write(("UMO" + EOL).encode())
+            ans = self.ser.read(1)
+            first_byte = time.perf_counter() - start
+            if ans and not ans.endswith(EOL.encode()):
+                ans += self.ser.read_until(expected=EOL.encode())
+            elapsed = time.perf_counter() - start
+        finally:
+            self.ser.timeout = timeout
+        if ans.endswith(EOL.encode()):
+            self.use_ack = True
+            self.cmd_delay = min(max(elapsed * DELAY_MARGIN, MIN_SLEEP_TIME), SLEEP_TIME)
+            self.ser.timeout = ACK_TIMEOUT
+        elif ans:
+            self.use_ack = False
+            self.cmd_delay = min(max(first_byte * DELAY_MARGIN, MIN_SLEEP_TIME), SLEEP_TIME)
+        else:
+            self.use_ack = False
+            self.cmd_delay = SLEEP_TIME
+
+    @traced("awg.send_command")
     def send_command(self, cmd):
-        self.ser.write(cmd.encode())
-        self.ser.write(EOL.encode())
-        #print(cmd.encode())
-        #print(EOL.encode())
-        time.sleep(SLEEP_TIME)
+        """
+        Sends a command and waits until the unit acknowledged it.
+        If the acknowledgement does not arrive the learned delay is used from then on.
+        """
+        try:
+            self.ser.write((cmd + EOL).encode())
+        except serial.SerialException as e:
+            print(f"AWG connection lost ({e}), reconnecting to {self.port}")
+            if not self.reconnect():
+                raise
+            self.ser.write((cmd + EOL).encode())
+        if self.use_ack:
+            ack = self.ser.read_until(expected=EOL.encode())
+            if ack.endswith(EOL.encode()):
+                return
+            print(f"AWG did not acknowledge {cmd}, falling back to {self.cmd_delay}s delay")
+            self.use_ack = False
+        time.sleep(self.cmd_delay)
+
+    def send_setting(self, cmd):
+        """
+        Sends a setting command unless the same value was already sent to this register.
+        Registers are the 3 letter command prefixes, e.g. WMN or WFF.
+        """
+        register = cmd[:3]
+        if self.last_sent.get(register) == cmd:
+            return
+        self.send_command(cmd)
+        self.last_sent[register] = cmd
+
+    def invalidate(self):
+        """Forget the sent settings, e.g. after the unit was changed by hand."""
+        self.last_sent = {}
         
     def initialize(self):
         self.channel_on = [False, False]
-        self.connect()
+        if self.ser is None or not self.ser.is_open:
+            self.connect()
         self.enable_output()
     
+    def query(self, cmd):
+        self.ser.write((cmd + EOL).encode())
+        return self.ser.read_until(expected=EOL.encode()).decode().strip()
+
     def get_id(self):
-        self.send_command("UID")
-        ans = self.ser.read_until(expected=b'\n').decode().strip()
+        ans = self.query("UID")
         return ans or "[no response]"
 
     def enable_output(self, channel=None, on=False):
@@ -95,6 +215,7 @@ class FY6900(BaseAWG):
             WFN0 means second channel wave output set to off
 
         Separate commands are thus needed to set the channels for the FY6900.
+        Channels whose state did not change are not sent again.
         """
         if channel is not None and channel not in CHANNELS:
             raise UnknownChannelError(CHANNELS_ERROR)
@@ -109,9 +230,9 @@ class FY6900(BaseAWG):
         
         # The FY6900 uses separate commands to enable each channel.
         cmd = "WMN%s" % (ch1)
-        self.send_command(cmd)
+        self.send_setting(cmd)
         cmd = "WFN%s" % (ch2)
-        self.send_command(cmd)
+        self.send_setting(cmd)
 
     def set_frequency(self, channel, freq):
         """
@@ -135,12 +256,12 @@ class FY6900(BaseAWG):
         # Channel 1
         if channel in (0, 1) or channel is None:
             cmd = "WMF%s" % freq_str
-            self.send_command(cmd)
+            self.send_setting(cmd)
         
         # Channel 2
         if channel in (0, 2) :
             cmd = "WFF%s" % freq_str
-            self.send_command(cmd)
+            self.send_setting(cmd)
         
         
     def set_phase(self, phase):
@@ -156,7 +277,7 @@ class FY6900(BaseAWG):
             phase += 360
 
         cmd = "WFP%s" % (phase)
-        self.send_command(cmd)
+        self.send_setting(cmd)
 
     def set_wave_type(self, channel, wave_type):
         """
@@ -175,12 +296,12 @@ class FY6900(BaseAWG):
         # Channel 1
         if channel in (0, 1) or channel is None:
             cmd = "WMW00"
-            self.send_command(cmd)
+            self.send_setting(cmd)
         
         # Channel 2
         if channel in (0, 2) or channel is None:
             cmd = "WFW00"
-            self.send_command(cmd)
+            self.send_setting(cmd)
         
     def set_amplitude(self, channel, amplitude):
         """
@@ -203,12 +324,12 @@ class FY6900(BaseAWG):
         # Channel 1
         if channel in (0, 1) or channel is None:
             cmd = "WMA%s" % amp_str
-            self.send_command(cmd)
+            self.send_setting(cmd)
         
         # Channel 2
         if channel in (0, 2) or channel is None:
             cmd = "WFA%s" % amp_str
-            self.send_command(cmd)
+            self.send_setting(cmd)
     
     def set_offset(self, channel, offset):
         """
@@ -226,13 +347,79 @@ class FY6900(BaseAWG):
         # Channel 1
         if channel in (0, 1) or channel is None:
             cmd = "WMO%s" % offset
-            self.send_command(cmd)
+            self.send_setting(cmd)
         
         # Channel 2
         if channel in (0, 2) or channel is None:
             cmd = "WFO%s" % offset
-            self.send_command(cmd)
+            self.send_setting(cmd)
         
+    @traced("awg.upload_arbitrary")
+    def upload_arbitrary(self, channel, samples, slot=1):
+        """
+        Uploads one period of samples (scaled to -1..1) to arbitrary slot 1..64 and selects it on channel.
+        Other lengths than 8192 points are resampled.
+
+        Protocol:
+            DDS_WAVE<slot>  the unit answers W when it is ready for the data
+            8192 x 2 bytes  little endian 14 bit codes, the unit answers HN when they are stored
+        """
+        if channel is not None and channel not in CHANNELS:
+            raise UnknownChannelError(CHANNELS_ERROR)
+        if not 1 <= slot <= ARB_SLOTS:
+            raise ValueError(f"Arbitrary slot can be 1 to {ARB_SLOTS}.")
+        samples = np.asarray(samples, dtype=float)
+        if samples.size != ARB_POINTS:
+            x = np.arange(ARB_POINTS) * samples.size / ARB_POINTS
+            samples = np.interp(x, np.arange(samples.size), samples, period=samples.size)
+        codes = np.round((np.clip(samples, -1, 1) + 1) / 2 * ARB_MAX_CODE).astype("<u2")
+
+        timeout = self.ser.timeout
+        self.ser.timeout = ARB_TIMEOUT
+        try:
+            ans = self.query(f"DDS_WAVE{slot}")
+            if ans != "W":
+                raise IOError(f"AWG is not ready for arbitrary data: {ans!r}")
+            self.ser.write(codes.tobytes())
+            ans = self.ser.read_until(expected=EOL.encode()).decode().strip()
+            if ans != "HN":
+                raise IOError(f"AWG did not store arbitrary data: {ans!r}")
+        finally:
+            self.ser.timeout = timeout
+
+        # selected again even if it already was, so the new data is output
+        wave = "%02d" % (ARB_WAVE_BASE + slot - 1)
+        for register, channels in (("WMW", (0, 1, None)), ("WFW", (0, 2, None))):
+            if channel in channels:
+                self.send_command(register + wave)
+                self.last_sent[register] = register + wave
+
+    def start_sweep(self, channel, start_freq, stop_freq, duration, log=True):
+        """
+        Starts the internal frequency sweep, the FY6900 only sweeps channel 1.
+
+        Commands:
+            SOB0            sweep object frequency
+            SMO1 / SMO0     log / linear sweep
+            SST1000.000000  start frequency in Hz
+            SEN9000.000000  end frequency in Hz
+            STI2.00         sweep time in seconds
+            SBE1            begin the sweep, SBE0 stops it
+        """
+        if channel not in (None, 0, 1):
+            raise UnknownChannelError("The FY6900 can only sweep channel 1.")
+        self.send_setting("SOB0")
+        self.send_setting("SMO%d" % (1 if log else 0))
+        self.send_setting("SST%.6f" % start_freq)
+        self.send_setting("SEN%.6f" % stop_freq)
+        self.send_setting("STI%.2f" % duration)
+        self.send_command("SBE1")
+        # the sweep changes the output frequency, WMF has to be sent again later
+        self.last_sent.pop("WMF", None)
+
+    def stop_sweep(self):
+        self.send_command("SBE0")
+
     def set_load_impedance(self, channel, z):
         """
         Sets load impedance connected to each channel. Default value is 50 Ohm.
@@ -0,0 +1,156 @@
+'''
+Created on 18.10.26
+
+@author: Dennis Rathgeb
+
+Benchmark of a sweep against the simulated instruments.
+Times BodePlotter.run and the /bode/start stream end to end and counts the
+commands sent to the instruments.
+
+usage: python benchmark.py --points 50 --samples 5 --mode meas
+       python benchmark.py --imports
+'''
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import simulation
+from simulation.model import Bench, SecondOrderModel
+from bode import BodePlotter
+
+
+def sim_setup(args):
+    bench = Bench(SecondOrderModel(f0=args.f0, q=args.q, kind=args.kind), seed=0, settle_time=args.settle_time)
+    scope_latency = {"*": args.scope_latency}
+    awg_latency = {"*": args.awg_latency}
+    return simulation.make_instruments(bench, scope_latency, awg_latency)
+
+
+def sweep_params(args):
+    return {
+        "start_freq": args.start,
+        "stop_freq": args.stop,
+        "num_points": args.points,
+        "n_samples": args.samples,
+        "mode": args.mode,
+        "sweep": args.sweep,
+        "sampling": args.sampling,
+        "autorange": args.autorange,
+        "sweep_time": args.sweep_time,
+    }
+
+
+def command_counts(awg, scope):
+    scope_cmds = scope.scope.commands
+    awg_cmds = awg.ser.commands
+    return sum(scope_cmds.values()), sum(awg_cmds.values()), scope_cmds.most_common(5)
+
+
+def bench_run(args):
+    awg, scope, _ = sim_setup(args)
+    bode = BodePlotter(awg, scope)
+    bode.set_params(sweep_params(args))
+    scope.scope.commands.clear()
+    awg.ser.commands.clear()
+    start = time.perf_counter()
+    freq, gain, phase = bode.run()
+    elapsed = time.perf_counter() - start
+    return elapsed, len(freq), command_counts(awg, scope)
+
+
+def bench_stream(args):
+    from fastapi.testclient import TestClient
+    import main
+    from archive import SweepArchive
+
+    awg, scope, _ = sim_setup(args)
+    main.awg, main.scope = awg, scope
+    main.bode = BodePlotter(awg, scope)
+    main.bode.set_params(sweep_params(args))
+    with tempfile.TemporaryDirectory() as tmp:
+        main.archive = SweepArchive(tmp)
+        client = TestClient(main.app)
+        scope.scope.commands.clear()
+        awg.ser.commands.clear()
+        start = time.perf_counter()
+        n_points = 0
+        with client.stream("GET", "/bode/start") as response:
+            for line in response.iter_lines():
+                if line.startswith("data:"):
+                    n_points += 1
+        elapsed = time.perf_counter() - start
+    return elapsed, n_points, command_counts(awg, scope)
+
+
+# modules the API server should not import at startup
+HEAVY_MODULES = ("matplotlib", "pyvisa", "serial", "awgdrivers.fy6900")
+IMPORT_SCRIPT = '''
+import json, sys, time
+start = time.perf_counter()
+import main
+elapsed = time.perf_counter() - start
+print(json.dumps({"elapsed": elapsed, "loaded": [m for m in %r if m in sys.modules]}))
+'''
+
+
+def bench_imports(repeat=5):
+    """import time of main in fresh interpreters, returns the best time and the heavy modules loaded"""
+    best = float("inf")
+    loaded = []
+    for _ in range(repeat):
+        out = subprocess.run([sys.executable, "-c", IMPORT_SCRIPT % (HEAVY_MODULES,)],
+                             cwd=os.path.dirname(os.path.abspath(__file__)),
+                             capture_output=True, text=True, check=True).stdout
+        result = json.loads(out.strip().splitlines()[-1])
+        best = min(best, result["elapsed"])
+        loaded = result["loaded"]
+    return best, loaded
+
+
+def report(name, result):
+    elapsed, n_points, (n_scope, n_awg, top) = result
+    per_point = elapsed / n_points if n_points else float("nan")
+    print(f"{name:<12} {elapsed:8.3f} s  {n_points:4d} points  {per_point * 1e3:8.1f} ms/point  "
+          f"scope cmds: {n_scope:6d}  awg cmds: {n_awg:5d}")
+    print(f"{'':<12} most used scope commands: {top}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark a Bode sweep on simulated instruments.")
+    parser.add_argument("--start", type=float, default=100)
+    parser.add_argument("--stop", type=float, default=30e3)
+    parser.add_argument("--points", type=int, default=50)
+    parser.add_argument("--samples", type=int, default=5)
+    parser.add_argument("--mode", default="meas", choices=("meas", "waveform", "broadband", "hwsweep"))
+    parser.add_argument("--sweep", default="log", choices=("log", "adaptive"))
+    parser.add_argument("--sampling", default="fixed", choices=("fixed", "adaptive", "scope"))
+    parser.add_argument("--autorange", action="store_true")
+    parser.add_argument("--sweep-time", type=float, default=1.0, help="AWG sweep duration in hwsweep mode")
+    parser.add_argument("--f0", type=float, default=10e3, help="corner frequency of the simulated DUT")
+    parser.add_argument("--q", type=float, default=0.707)
+    parser.add_argument("--kind", default="lowpass", choices=("lowpass", "highpass", "bandpass"))
+    parser.add_argument("--settle-time", type=float, default=0.0, help="settling time constant of the simulated DUT")
+    parser.add_argument("--scope-latency", type=float, default=0.001, help="seconds per SCPI command")
+    parser.add_argument("--awg-latency", type=float, default=0.01, help="seconds per AWG command")
+    parser.add_argument("--only", choices=("run", "stream"), help="run only one of the benchmarks")
+    parser.add_argument("--imports", action="store_true", help="only time the import of the API server")
+    args = parser.parse_args()
+
+    if args.imports:
+        elapsed, loaded = bench_imports()
+        print(f"import main  {elapsed * 1e3:8.1f} ms  heavy modules loaded: {loaded or 'none'}")
+        return
+
+    if args.only in (None, "run"):
+        report("run()", bench_run(args))
+    if args.only in (None, "stream"):
+        report("/bode/start", bench_stream(args))
+
+
+if __name__ == "__main__":
+    main()
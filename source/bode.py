@@ -7,10 +7,21 @@ Created on 30.3.25
 import sys, time
 
 import numpy as np
-import matplotlib.pyplot as plt
 
 
 from awgdrivers.constants import SINE
+import dsp
+import adaptive
+import broadband
+import hwsweep
+from sample_stats import StreamingStats, angle_diff
+from calibration import Calibration, CalibrationCache
+from checkpoint import SweepCheckpoint
+from settling import SettleModel
+from autorange import AutoRanger
+from oscillatordrivers.sds8xx import CODES_PER_DIV, N_DIV_H
+import oscillatordrivers.constants as scope_constants
+from tracing import traced, tracer
 
 AWG_CHANNEL = 1
 AWG_AMPLITUDE = 1.0
@@ -18,6 +29,37 @@ AWG_OFFSET = 0.0
 AWG_PHASE = 0.0
 AWG_WAVE_TYPE = SINE
 AWG_OUTPUT_IMPEDANCE = 50.0   
+WAVEFORM_POINTS = 1000
+# number of points of the coarse grid an adaptive sweep starts with
+ADAPTIVE_START_POINTS = 10
+# minimum number of samples before adaptive sampling may stop
+MIN_ADAPTIVE_SAMPLES = 2
+# broadband mode: arbitrary slot of the multisine, captures to find the vertical range,
+# peak ADC code of a clipped channel and the peak the channels are scaled to
+ARB_SLOT = 1
+MAX_RANGING_CAPTURES = 4
+CLIP_CODE = 127
+TARGET_PEAK_CODE = 80
+# hwsweep mode: samples per period of the stop frequency and upper limit of the record length
+SWEEP_SAMPLES_PER_CYCLE = 8
+MAX_SWEEP_POINTS = 2000000
+# the capture is longer than one sweep, so every frequency is passed completely at least once
+SWEEP_RECORD_MARGIN = 1.25
+# the AWG sweeps this factor beyond start and stop, the grid ends are away from the sweep restart
+SWEEP_EXTEND = 1.2
+# samples per cycle of the highest swept frequency the capped record must still give (2x Nyquist)
+MIN_SWEEP_SAMPLES_PER_CYCLE = 4
+# C2 amplitude in ADC codes a swept point needs, smaller ones are mostly quantization (SNR about 20 dB at 4)
+MIN_SWEEP_CODES = 4
+# failed points in a row with instruments that could not be recovered, the sweep stops then
+# and can be resumed from its checkpoint
+MAX_CONSECUTIVE_ERRORS = 3
+# seconds at least between two acquisitions of the scope, it also needs time to process one
+MIN_ACQ_PERIOD = 0.02
+# measurements of one sample, queried in one round trip
+SAMPLE_ITEMS = (("C1", "RMS"), ("C2", "RMS"), ("C1-C2", "PHA"))
+# measurement items for sampling "scope": C1 RMS, C2 RMS, C1-C2 phase, C1 frequency
+SCOPE_STAT_ITEMS = (("RMS", "C1", None), ("RMS", "C2", None), ("PHA", "C1", "C2"), ("FREQ", "C1", None))
 class BodePlotter:
     def __init__(self, awg, scope):
         self.awg = awg
@@ -28,8 +70,35 @@ class BodePlotter:
         self.stop_freq = 100e3
         self.num_points = 20
         self.amplitude = AWG_AMPLITUDE
+        self.mode = "meas"
+        self.sweep = "log"
+        self.max_gain_error = 0.5
+        self.max_phase_error = 5.0
+        self.sampling = "fixed"
+        self.target_gain_err = 0.002
+        self.target_phase_err = 0.2
         self.frequencies = None
         self.scope_timebase = None
+        self.vdiv = None
+        # sample statistics of the last reduced point
+        self.last_stats = None
+        # raw samples (rms1, rms2, phase) of the last reduced point, only kept by fixed sampling
+        self.last_samples = None
+        # fixture calibration, the cache is optional
+        self.calibration_cache = None
+        self.calibration = None
+        self.autorange = False
+        self.ranger = AutoRanger()
+        # duration of the AWG sweep in hwsweep mode, seconds
+        self.sweep_time = 1.0
+        # planned points and results of the running point by point sweep
+        self.checkpoint = None
+        # True from resume_run until the next run, a plain run starts the checkpoint over
+        self.resumed = False
+        self.consecutive_errors = 0
+        # learned wait after a frequency step, main shares one that is kept in a file
+        self.settle_model = SettleModel()
+        self.point_set_at = time.monotonic()
 
     def set_params(self, params: dict):
         self.start_freq = params.get("start_freq", self.start_freq)
@@ -38,6 +107,15 @@ class BodePlotter:
         self.n_samples = params.get("n_samples", self.n_samples)
         self.amplitude = params.get("amplitude", self.amplitude)
         self.tolerance = params.get("tolerance", self.tolerance)
+        self.mode = params.get("mode", self.mode)
+        self.sweep = params.get("sweep", self.sweep)
+        self.max_gain_error = params.get("max_gain_error", self.max_gain_error)
+        self.max_phase_error = params.get("max_phase_error", self.max_phase_error)
+        self.sampling = params.get("sampling", self.sampling)
+        self.target_gain_err = params.get("target_gain_err", self.target_gain_err)
+        self.target_phase_err = params.get("target_phase_err", self.target_phase_err)
+        self.autorange = params.get("autorange", self.autorange)
+        self.sweep_time = params.get("sweep_time", self.sweep_time)
 
     def get_params(self) -> dict:
         return {
@@ -46,7 +124,16 @@ class BodePlotter:
             "num_points": self.num_points,
             "n_samples": self.n_samples,
             "amplitude": self.amplitude,
-            "tolerance": self.tolerance
+            "tolerance": self.tolerance,
+            "mode": self.mode,
+            "sweep": self.sweep,
+            "max_gain_error": self.max_gain_error,
+            "max_phase_error": self.max_phase_error,
+            "sampling": self.sampling,
+            "target_gain_err": self.target_gain_err,
+            "target_phase_err": self.target_phase_err,
+            "autorange": self.autorange,
+            "sweep_time": self.sweep_time
         }
     
     def setup_awg(self):
@@ -65,36 +152,171 @@ class BodePlotter:
 
     def filter_outliers(self, data):
         """filters outliers in samples using median and threshold"""  
+        data = np.asarray(data)
         median = np.median(data)
-        return [x for x in data if abs(x - median) < self.tolerance * median]
+        return data[np.abs(data - median) < self.tolerance * median].tolist()
 
     def filter_phase_outliers(self, data):
         """filters phase outliers in samples uses wrapp aroung calc to get the shortest distance"""
+        data = np.asarray(data)
         median = np.median(data)
-        def angle_diff(a, b):
-            """Return signed shortest distance between two angles in degrees."""
-            diff = (a - b + 180) % 360 - 180
-            return abs(diff)
-        return [x for x in data if angle_diff(x, median) < (self.tolerance * 180)]
+        return data[np.abs(angle_diff(data, median)) < (self.tolerance * 180)].tolist()
 
-    def collect_data_sample(self, freq, timebase):
-        freq_meas = 0.0
-        gain = 0.0
-        phase = 0.0
-        
+    def set_point(self, freq, timebase):
+        """sets the stimulus frequency and the matching timebase"""
+        tracer.set_point(freq)
         self.awg.set_frequency(1, int(freq))
         self.scope.set_timebase(timebase)
+        self.point_set_at = time.monotonic()
+
+    @traced("bode.acquire_point")
+    def acquire_point(self, freq):
+        """
+        Collects the raw data of the current point from the scope.
+        Only talks to the scope, the result is processed by reduce_point.
+        """
+        self.wait_settled(freq)
+        if self.autorange:
+            self.apply_autorange(freq)
+        if self.mode == "waveform":
+            waveforms, dt = self.scope.capture_waveforms(channels=(1, 2), n_points=WAVEFORM_POINTS)
+            raw = waveforms, dt, dict(self.vdiv)
+        elif self.sampling == "adaptive":
+            raw = self.acquire_adaptive(freq)
+        elif self.sampling == "scope":
+            raw = self.acquire_scope_stats()
+        else:
+            raw = self.acquire_fixed(freq)
+        if self.autorange:
+            self.update_autorange(freq, raw)
+        return raw
+
+    def apply_autorange(self, freq):
+        """sets the VDIV predicted for freq from the measured points on both channels"""
+        for ch in (1, 2):
+            vdiv = self.ranger.next_vdiv(ch, self.vdiv[ch], freq)
+            if vdiv is not None:
+                self.scope.set_vdiv(ch, vdiv)
+                self.vdiv[ch] = vdiv
+
+    def update_autorange(self, freq, raw):
+        if self.mode == "waveform":
+            waveforms, dt, vdiv = raw
+            rms = {ch: np.std(waveforms[ch]) * vdiv[ch] / CODES_PER_DIV for ch in (1, 2)}
+        elif self.sampling == "adaptive":
+            rms = {1: raw[0].median, 2: raw[1].median}
+        elif self.sampling == "scope":
+            rms = {1: raw[0]["mean"], 2: raw[1]["mean"]}
+        else:
+            rms = {1: np.median(raw[0]), 2: np.median(raw[1])}
+        for ch, value in rms.items():
+            self.ranger.update(ch, freq, value)
+
+    def wait_settled(self, freq):
+        """waits the settle time learned for freq, counted from the frequency step"""
+        remaining = self.settle_model.predict(freq) - (time.monotonic() - self.point_set_at)
+        if remaining > 0:
+            time.sleep(remaining)
 
+    def settle_detector(self, freq):
+        return self.settle_model.detector(freq)
+
+    def read_settled(self, detector):
+        """one reading rms1, rms2, phase, returns the readings the detector keeps"""
+        meas = self.scope.query_measurements(SAMPLE_ITEMS)
+        reading = (meas["C1"]["RMS"], meas["C2"]["RMS"], meas["C1-C2"]["PHA"])
+        duplicates = detector.duplicates
+        kept = detector.add(reading, time.monotonic() - self.point_set_at)
+        if detector.duplicates > duplicates:
+            # same acquisition as the reading before, reading again before the next one is wasted
+            time.sleep(max(N_DIV_H * self.scope.get_timebase(), MIN_ACQ_PERIOD))
+        return kept
+
+    def acquire_fixed(self, freq):
         # Get data from scope with avaraging
         s_rms1 = []
         s_rms2 = []
         s_phase = []
-        #collect samples
-        for i in range(self.n_samples):
-            s_rms1.append(self.scope.query_rms(1))  
-            s_rms2.append(self.scope.query_rms(2))
-            s_phase.append(self.scope.query_pha(1, 2)) 
-        
+        #collect samples, the ones before the DUT settled are dropped
+        detector = self.settle_detector(freq)
+        while len(s_phase) < self.n_samples:
+            for rms1, rms2, pha in self.read_settled(detector):
+                s_rms1.append(rms1)
+                s_rms2.append(rms2)
+                s_phase.append(pha)
+        self.settle_model.update(freq, detector)
+        freq_meas = self.scope.query_freq(1)
+        return s_rms1, s_rms2, s_phase, freq_meas
+
+    def acquire_adaptive(self, freq):
+        """
+        Samples until the standard error of gain and phase reaches the targets,
+        at most n_samples times. Outliers are filtered while streaming.
+        """
+        s_rms1 = StreamingStats(self.tolerance)
+        s_rms2 = StreamingStats(self.tolerance)
+        s_phase = StreamingStats(self.tolerance, circular=True)
+        detector = self.settle_detector(freq)
+        n = 0
+        while n < self.n_samples:
+            for rms1, rms2, pha in self.read_settled(detector):
+                s_rms1.add(rms1)
+                s_rms2.add(rms2)
+                s_phase.add(pha)
+                n += 1
+            if n >= MIN_ADAPTIVE_SAMPLES and self.converged(s_rms1, s_rms2, s_phase):
+                break
+        self.settle_model.update(freq, detector)
+        freq_meas = self.scope.query_freq(1)
+        return s_rms1, s_rms2, s_phase, freq_meas
+
+    def acquire_scope_stats(self):
+        """
+        Lets the scope average n_samples acquisitions with its measurement statistics.
+        Returns the statistics of C1 RMS, C2 RMS, phase and frequency.
+        """
+        self.scope.setup_statistics(SCOPE_STAT_ITEMS)
+        return self.scope.measure_statistics(len(SCOPE_STAT_ITEMS), self.n_samples)
+
+    def converged(self, s_rms1, s_rms2, s_phase):
+        if s_rms1.mean <= 0 or s_rms2.mean <= 0:
+            return False
+        # relative standard error of the ratio rms2/rms1
+        gain_err = np.hypot(s_rms1.stderr / s_rms1.mean, s_rms2.stderr / s_rms2.mean)
+        return gain_err <= self.target_gain_err and s_phase.stderr <= self.target_phase_err
+
+    @traced("bode.reduce_point")
+    def reduce_point(self, freq, raw):
+        """filters and averages the raw data of a point, returns freq_meas, gain, phase"""
+        freq_meas, gain, phase = self.reduce_samples(freq, raw)
+        if self.calibration is not None and freq_meas > 0:
+            gain, phase = self.calibration.apply(freq_meas, gain, phase)
+            gain, phase = float(gain), float(phase)
+        return freq_meas, gain, phase
+
+    def reduce_samples(self, freq, raw):
+        self.last_samples = None
+        if self.mode == "waveform":
+            return self.reduce_waveform_sample(freq, raw)
+        if self.sampling == "adaptive":
+            s_rms1, s_rms2, s_phase, freq_meas = raw
+            self.last_stats = None
+            if s_rms1.mean <= 0:
+                print("for freq %d no signal on channel 1" % freq)
+                return 0.0, 0.0, 0.0
+            gain = s_rms2.mean / s_rms1.mean
+            self.last_stats = self.point_stats(min(s_rms1.count, s_rms2.count, s_phase.count), gain,
+                                               s_rms1.std / s_rms1.mean, s_rms2.std / s_rms2.mean, s_phase.std)
+            return freq_meas, gain, s_phase.value()
+        if self.sampling == "scope":
+            return self.reduce_scope_stats(freq, raw)
+        self.last_stats = None
+        freq_meas = 0.0
+        gain = 0.0
+        phase = 0.0
+        s_rms1, s_rms2, s_phase, s_freq = raw
+        self.last_samples = (s_rms1, s_rms2, s_phase)
+
         # Apply filtering
         filtered_rms1 = self.filter_outliers(s_rms1)  
         filtered_rms2 = self.filter_outliers(s_rms2)
@@ -111,40 +333,435 @@ class BodePlotter:
             else:
                 gain = (filtered_rms2[0] / filtered_rms1[0])
                 phase = (filtered_phase[0])
-            freq_meas = (self.scope.query_freq(1))
+            freq_meas = s_freq
+            self.last_stats = self.point_stats(
+                min(len(filtered_rms1), len(filtered_rms2), len(filtered_phase)), gain,
+                self.rel_std(filtered_rms1), self.rel_std(filtered_rms2),
+                np.std(filtered_phase, ddof=1) if len(filtered_phase) > 1 else 0.0)
         else:
             print("for freq %d too much noise: length  rms1:%d, rms2:%d, phase:%d" % (freq, len(filtered_rms1), len(filtered_rms2), len(filtered_phase)))
         return freq_meas, gain, phase
 
-    def setup_run(self):  
+    def reduce_scope_stats(self, freq, raw):
+        """
+        Gain and phase from the means of the scope statistics.
+        The scope averages the phase linearly, close to +-180 degrees the mean can be off.
+        """
+        rms1, rms2, pha, s_freq = raw
+        self.last_stats = None
+        if not (rms1["mean"] > 0 and rms2["mean"] > 0 and pha["count"] > 0):
+            print("for freq %d no valid scope statistics" % freq)
+            return 0.0, 0.0, 0.0
+        gain = rms2["mean"] / rms1["mean"]
+        self.last_stats = self.point_stats(min(rms1["count"], rms2["count"], pha["count"]), gain,
+                                           rms1["stdev"] / rms1["mean"], rms2["stdev"] / rms2["mean"],
+                                           pha["stdev"])
+        freq_meas = s_freq["mean"] if s_freq["count"] > 0 else float(freq)
+        return freq_meas, gain, pha["mean"]
+
+    def reduce_waveform_sample(self, freq, raw):
+        """
+        Fits gain and phase at the stimulus frequency from C1 and C2 of one acquisition.
+        The stimulus frequency is known, so it is returned as measured frequency.
+        """
+        waveforms, dt, vdiv = raw
+        gain, phase = dsp.gain_phase(waveforms[1], waveforms[2], dt, freq)
+        # raw ADC codes of both channels are scaled by their own VDIV
+        gain = gain * vdiv[2] / vdiv[1]
+        if gain <= 0:
+            self.last_stats = None
+            print("for freq %d no signal in waveform capture" % freq)
+            return 0.0, 0.0, 0.0
+        self.last_stats = self.point_stats(1, gain, 0.0, 0.0, 0.0)
+        return float(freq), gain, phase
+
+    @staticmethod
+    def rel_std(data):
+        mean = np.mean(data)
+        if len(data) < 2 or mean == 0:
+            return 0.0
+        return np.std(data, ddof=1) / mean
+
+    @staticmethod
+    def point_stats(n, gain, rms1_rel_std, rms2_rel_std, phase_std):
+        """sample count and standard deviation of gain and phase (degrees) of a point"""
+        return {
+            "n": int(n),
+            "gain_std": float(gain * np.hypot(rms1_rel_std, rms2_rel_std)),
+            "phase_std": float(phase_std),
+        }
+
+    def collect_data_sample(self, freq, timebase):
+        self.set_point(freq, timebase)
+        raw = self.acquire_point(freq)
+        return self.reduce_point(freq, raw)
+
+    def measure_point(self, index, freq, timebase):
+        """measures point index of the checkpoint, an instrument error fails the point instead of the sweep"""
+        try:
+            result = self.collect_data_sample(freq, timebase)
+        except Exception as e:
+            self.point_failed(index, freq, e)
+            return 0.0, 0.0, 0.0
+        return self.point_done(index, result)
+
+    def point_done(self, index, result):
+        self.consecutive_errors = 0
+        if result[0] > 0:
+            self.checkpoint.record(index, result, self.last_stats, self.vdiv)
+        else:
+            self.checkpoint.fail(index, "no valid measurement")
+        return result
+
+    def point_failed(self, index, freq, error, recover=True):
+        """
+        Records the failed point and reconnects the instruments if they stopped answering.
+        Raises after MAX_CONSECUTIVE_ERRORS failed recoveries in a row, the instruments are gone then.
+        """
+        print("for freq %d measurement failed: %s" % (freq, error))
+        self.checkpoint.fail(index, error)
+        if not recover or self.recover_instruments():
+            return
+        self.consecutive_errors += 1
+        if self.consecutive_errors >= MAX_CONSECUTIVE_ERRORS:
+            raise RuntimeError(f"Instruments not answering after {self.consecutive_errors} failed points, "
+                               f"the sweep can be resumed after reconnecting: {error}") from error
+
+    def recover_instruments(self):
+        """reconnects the instruments that don't answer, True if both answer afterwards"""
+        try:
+            if not self.scope.ping():
+                if not self.scope.reconnect():
+                    return False
+                # a power cycled scope lost its settings
+                for ch, volts_per_div in self.vdiv.items():
+                    self.scope.set_vdiv(ch, volts_per_div)
+            if not self.awg.ping():
+                if not self.awg.reconnect():
+                    return False
+                self.setup_awg()
+            return True
+        except Exception as e:
+            print(f"Reconnecting the instruments failed: {e}")
+            return False
+
+    def setup_run(self, use_calibration=True):  
         """
         Perform a Bode plot using the AWG and scope.
+        If there is a calibration for these parameters its timebases and the V/div of C1 are used.
         """
+        if self.mode == "hwsweep":
+            self.check_hwsweep()
         self.setup_awg()
         time.sleep(0.2)  
-        self.scope.auto_setup()
+        self.load_calibration(use_calibration)
+        self.checkpoint = None
+        self.resumed = False
+        self.last_samples = None
+        self.consecutive_errors = 0
+        if self.mode in ("broadband", "hwsweep"):
+            # multisine and sweep are ranged by capture_ranged, ASET would only see the sine
+            self.vdiv = {ch: self.scope.get_vdiv(ch) for ch in (1, 2)}
+        elif self.calibration is not None and self.autorange:
+            # the auto ranger finds C2 on the first points
+            self.vdiv = {ch: self.scope.get_vdiv(ch) for ch in (1, 2)}
+        else:
+            self.scope.auto_setup()
+            self.vdiv = {ch: self.scope.get_vdiv(ch) for ch in (1, 2)}
+        if self.calibration is not None and 1 in self.calibration.vdiv:
+            # C1 sees the same stimulus as in the calibration run, C2 depends on the DUT
+            self.vdiv[1] = self.calibration.vdiv[1]
+            self.scope.set_vdiv(1, self.vdiv[1])
+        self.start_acquisition()
+        self.ranger.reset()
+        if self.mode in ("broadband", "hwsweep"):
+            self.frequencies = []
+            self.scope_timebase = []
+            return
 
-        # Set up frequency sweep
-        self.frequencies = np.logspace(np.log10(self.start_freq), np.log10(self.stop_freq), self.num_points)
+        # Set up frequency sweep, an adaptive sweep starts on a coarse grid and refines it
+        num_points = self.num_points
+        if self.sweep == "adaptive":
+            num_points = min(ADAPTIVE_START_POINTS, self.num_points)
+        self.frequencies = np.logspace(np.log10(self.start_freq), np.log10(self.stop_freq), num_points)
         # set up timebase sweeping
-        self.scope_timebase = (1 / (self.frequencies*2)) #show 1/2 period per divisions on the screen
-        self.scope_timebase= [self.scope.clamp_timebase(tb) for tb in self.scope_timebase]
+        if self.calibration is not None and len(self.calibration.timebase) == num_points:
+            self.scope_timebase = list(self.calibration.timebase)
+        else:
+            self.scope_timebase = [self.timebase_for(f) for f in self.frequencies]
+        self.new_checkpoint()
+
+    def new_checkpoint(self):
+        """plans the points of the current grid again, nothing measured yet"""
+        self.checkpoint = SweepCheckpoint(self.get_params(), self.vdiv, self.frequencies, self.scope_timebase)
+
+    def start_acquisition(self):
+        """
+        The meas mode reads the scope's measurements, they only update while it acquires.
+        A waveform, broadband or hwsweep run before leaves the scope stopped on its last single acquisition.
+        """
+        if self.mode == "meas":
+            self.scope.run_auto()
+
+    def load_calibration(self, use_calibration=True):
+        self.calibration = None
+        if use_calibration and self.calibration_cache is not None:
+            self.calibration = self.calibration_cache.get(self.calibration_key())
+
+    def resume_run(self, checkpoint):
+        """
+        Continues the sweep of a checkpoint: its parameters and scope settings are restored
+        instead of an auto setup, only the points without a result are measured.
+        """
+        self.set_params(checkpoint.params)
+        self.setup_awg()
+        time.sleep(0.2)
+        self.load_calibration()
+        self.vdiv = dict(checkpoint.vdiv)
+        for ch, volts_per_div in self.vdiv.items():
+            self.scope.set_vdiv(ch, volts_per_div)
+        self.start_acquisition()
+        self.ranger.reset()
+        checkpoint.reset_attempts()
+        self.checkpoint = checkpoint
+        self.resumed = True
+        self.consecutive_errors = 0
+        self.frequencies = np.array([p["freq"] for p in checkpoint.points])
+        self.scope_timebase = [p["timebase"] for p in checkpoint.points]
+
+    def calibration_key(self):
+        return CalibrationCache.key(self.get_params(), getattr(self.scope, "idn", None))
+
+    def record_calibration(self):
+        """
+        Records a reference sweep (fixture without DUT) and stores it in the calibration cache.
+        Later sweeps with the same parameters are corrected by it.
+        """
+        self.setup_run(use_calibration=False)
+        freq, gain, phase = self.run()
+        if not freq:
+            raise ValueError("Calibration sweep returned no valid points.")
+        cal = Calibration(freq, gain, phase, self.vdiv, self.scope_timebase)
+        self.calibration_cache.put(self.calibration_key(), cal)
+        self.calibration = cal
+        return cal
+
+    def timebase_for(self, freq):
+        #show 1/2 period per divisions on the screen
+        return self.scope.clamp_timebase(1 / (freq * 2))
+
+    def sweep_points(self):
+        """
+        Generator of (freq_meas, gain, phase) in measurement order.
+        For an adaptive sweep the points are not sorted by frequency.
+        """
+        if self.mode == "broadband":
+            yield from self.broadband_points()
+            return
+        if self.mode == "hwsweep":
+            yield from self.hwsweep_points()
+            return
+        for batch in self.point_batches():
+            for index, f, tb in batch:
+                yield self.measure_point(index, f, tb)
+
+    def point_batches(self):
+        """
+        Generator of lists of (index, freq, timebase) of the checkpoint to measure next.
+        A batch has to be measured (point_done/point_failed) before the next one is asked for,
+        the adaptive refinement and the retries depend on its results.
+        """
+        try:
+            yield self.checkpoint.todo()
+            if self.sweep == "adaptive":
+                yield from self.refine_batches()
+            # failed points get another chance at the end
+            retry = self.checkpoint.retry()
+            while retry:
+                yield retry
+                retry = self.checkpoint.retry()
+            self.checkpoint.finish()
+        finally:
+            # the settle times learned from the points are written once per sweep
+            self.settle_model.save()
+
+    def refine_batches(self):
+        """adds points to the adaptive sweep, a resumed sweep's results count as well"""
+        # refine until the error target or the point budget is reached
+        while len(self.checkpoint.points) < self.num_points:
+            valid = sorted((f, g, p) for f, (fm, g, p), _ in self.checkpoint.done())
+            if len(valid) < 3:
+                break
+            freq, gain, phase = zip(*valid)
+            planned = {p["freq"] for p in self.checkpoint.points}
+            new_freqs = adaptive.refine(freq, gain, phase, self.max_gain_error,
+                                        self.max_phase_error, self.num_points - len(self.checkpoint.points))
+            new_freqs = [f for f in new_freqs if float(f) not in planned]
+            if not new_freqs:
+                break
+            batch = []
+            for f in new_freqs:
+                tb = self.timebase_for(f)
+                batch.append((self.checkpoint.add(f, tb), f, tb))
+            yield batch
+
+    def broadband_points(self):
+        """
+        Generator of (freq, gain, phase) measured with one multisine per decade.
+        The sweep settings for sampling and adaptive refinement don't apply.
+        """
+        for f0, harmonics in broadband.plan(self.start_freq, self.stop_freq, self.num_points):
+            self.set_multisine(f0, harmonics)
+            waveforms, dt = self.capture_broadband(f0, harmonics)
+            yield from self.spectrum_points(*self.reduce_broadband(f0, harmonics, waveforms, dt, self.vdiv))
+
+    def set_multisine(self, f0, harmonics):
+        tracer.set_point(f0)
+        self.awg.upload_arbitrary(AWG_CHANNEL, broadband.multisine(harmonics, broadband.ARB_POINTS), slot=ARB_SLOT)
+        self.awg.set_frequency(AWG_CHANNEL, f0)
+
+    def reduce_broadband(self, f0, harmonics, waveforms, dt, vdiv):
+        """freq, gain and phase arrays of the harmonics of one capture taken with vdiv"""
+        h = dsp.cross_spectrum(waveforms[1], waveforms[2], dt, f0, harmonics)
+        freq = harmonics * f0
+        # raw ADC codes of both channels are scaled by their own VDIV
+        gain = np.abs(h) * vdiv[2] / vdiv[1]
+        phase = np.degrees(np.angle(h))
+        if self.calibration is not None:
+            gain, phase = self.calibration.apply(freq, gain, phase)
+        return freq, gain, phase
+
+    def spectrum_points(self, freq, gain, phase):
+        """yields the points of a broadband or hwsweep capture, (0, 0, 0) for the ones without a valid gain"""
+        for f, g, p in zip(freq, gain, phase):
+            self.last_stats = self.point_stats(1, g, 0.0, 0.0, 0.0)
+            if np.isfinite(g) and g > 0:
+                yield float(f), float(g), float(p)
+            else:
+                yield 0.0, 0.0, 0.0
+
+    def capture_broadband(self, f0, harmonics):
+        """captures C1 and C2 over at least MIN_PERIODS periods of f0, fast enough for the highest tone"""
+        tracer.set_point(f0)
+        timebase = self.timebase_covering(broadband.MIN_PERIODS / f0)
+        n_points = int(10 * timebase * f0 * max(harmonics) * broadband.SAMPLES_PER_TONE)
+        return self.capture_ranged(timebase, n_points)
+
+    @staticmethod
+    def timebase_covering(duration):
+        """shortest timebase whose screen shows at least duration seconds"""
+        wanted = duration / 10
+        return min([tb for tb in scope_constants.VALID_TIMEBASERANGES if tb >= wanted],
+                   default=max(scope_constants.VALID_TIMEBASERANGES))
+
+    def capture_ranged(self, timebase, n_points):
+        """
+        Captures C1 and C2 with n_points each.
+        The channels are re-ranged from the captured peaks until neither clips nor is too small.
+        """
+        self.scope.set_timebase(timebase)
+        for _ in range(MAX_RANGING_CAPTURES):
+            waveforms, dt = self.scope.capture_waveforms(channels=(1, 2), n_points=n_points)
+            changed = False
+            for ch in (1, 2):
+                peak = int(np.max(np.abs(waveforms[ch].astype(np.int16))))
+                if peak >= CLIP_CODE:
+                    wanted = self.vdiv[ch] * 4
+                else:
+                    wanted = max(peak, 1) * self.vdiv[ch] / TARGET_PEAK_CODE
+                fitting = [v for v in scope_constants.VALID_VDIVRANGES if v >= wanted]
+                vdiv = min(fitting) if fitting else max(scope_constants.VALID_VDIVRANGES)
+                # only change for clipping or a peak of less than a third of the target
+                if vdiv != self.vdiv[ch] and (peak >= CLIP_CODE or peak < TARGET_PEAK_CODE / 3):
+                    self.scope.set_vdiv(ch, vdiv)
+                    self.vdiv[ch] = vdiv
+                    changed = True
+            if not changed:
+                break
+        return waveforms, dt
+
+    def hwsweep_record(self):
+        """timebase and points per channel of the capture of one AWG sweep"""
+        timebase = self.timebase_covering(self.sweep_time * SWEEP_RECORD_MARGIN)
+        f2 = self.stop_freq * SWEEP_EXTEND
+        return timebase, min(int(10 * timebase * f2 * SWEEP_SAMPLES_PER_CYCLE), MAX_SWEEP_POINTS)
+
+    def check_hwsweep(self):
+        """raises ValueError if one capture can't hold the whole sweep or can't sample stop_freq"""
+        longest = 10 * max(scope_constants.VALID_TIMEBASERANGES)
+        if self.sweep_time * SWEEP_RECORD_MARGIN > longest:
+            raise ValueError(f"sweep_time {self.sweep_time} s does not fit on the longest screen of {longest} s, "
+                             f"at most {longest / SWEEP_RECORD_MARGIN:g} s")
+        timebase, n_points = self.hwsweep_record()
+        samples_per_cycle = n_points / (10 * timebase * self.stop_freq * SWEEP_EXTEND)
+        if samples_per_cycle < MIN_SWEEP_SAMPLES_PER_CYCLE:
+            raise ValueError(f"{n_points} samples in {10 * timebase:g} s can't sample {self.stop_freq:g} Hz, "
+                             f"lower stop_freq or sweep_time")
+
+    def hwsweep_points(self):
+        """
+        Generator of (freq, gain, phase) on the log grid, all from one capture of the AWG's own sweep.
+        The capture is longer than one sweep of sweep_time seconds.
+        """
+        waveforms, dt = self.capture_hwsweep()
+        yield from self.spectrum_points(*self.reduce_hwsweep(waveforms, dt, self.vdiv))
+
+    def capture_hwsweep(self):
+        """starts the AWG's sweep and captures it"""
+        tracer.set_point(self.start_freq)
+        timebase, n_points = self.hwsweep_record()
+        self.awg.start_sweep(AWG_CHANNEL, self.start_freq / SWEEP_EXTEND, self.stop_freq * SWEEP_EXTEND,
+                             self.sweep_time, log=True)
+        try:
+            return self.capture_ranged(timebase, n_points)
+        finally:
+            self.awg.stop_sweep()
+
+    def reduce_hwsweep(self, waveforms, dt, vdiv):
+        """freq, gain and phase arrays on the log grid from the capture of a sweep taken with vdiv"""
+        f1 = self.start_freq / SWEEP_EXTEND
+        f2 = self.stop_freq * SWEEP_EXTEND
+        freq = np.logspace(np.log10(self.start_freq), np.log10(self.stop_freq), self.num_points)
+        h, amplitude = hwsweep.demodulate(waveforms[1], waveforms[2], dt, f1, f2, self.sweep_time, freq)
+        # C2 only a few codes high is mostly quantization, the sweep can't measure it
+        h = np.where(amplitude >= MIN_SWEEP_CODES, h, np.nan)
+        gain = np.abs(h) * vdiv[2] / vdiv[1]
+        phase = np.degrees(np.angle(h))
+        if self.calibration is not None:
+            gain, phase = self.calibration.apply(freq, gain, phase)
+        return freq, gain, phase
 
-        
     def run(self):
         freq_meas = []
         gain = []
         phase = []
+        point_mode = self.mode not in ("broadband", "hwsweep")
         if(self.frequencies is None or self.scope_timebase is None):
             self.setup_run()
-        for f,tb in zip(self.frequencies, self.scope_timebase):
-            f,g,p  = self.collect_data_sample(f, tb)
+        elif point_mode and self.checkpoint is None:
+            # the last setup was for broadband or hwsweep, there is no grid for this mode
+            self.setup_run()
+        elif point_mode and not self.resumed and self.checkpoint.started():
+            # a run after a finished or aborted one measures the whole grid again,
+            # only a checkpoint passed to resume_run is continued
+            self.new_checkpoint()
+        self.resumed = False
+        if point_mode:
+            # the points a resumed checkpoint already has belong to the result
+            for _, (f, g, p), _ in self.checkpoint.done():
+                freq_meas.append(f)
+                gain.append(g)
+                phase.append(p)
+        for f,g,p in self.sweep_points():
             if f > 0:
                 freq_meas.append(f)
                 gain.append(g)
                 phase.append(p)
             else:
                 print("skipping freq %d" % f)
+        # retried and refined points come after the others
+        if freq_meas:
+            freq_meas, gain, phase = (list(x) for x in zip(*sorted(zip(freq_meas, gain, phase))))
         return freq_meas, gain, phase
 
     def plot(self, freq, gain, phase):
@@ -152,6 +769,7 @@ class BodePlotter:
         Plot the Bode plot using Matplotlib.
         """
         # Plot gain in log space
+        import matplotlib.pyplot as plt
         plt.figure()
         plt.subplot(2, 1, 1)
         plt.semilogx(freq, 20 * np.log10(gain), label="Gain (dB)")
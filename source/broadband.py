@@ -0,0 +1,54 @@
+'''
+Created on 18.10.26
+
+@author: Dennis Rathgeb
+
+Multisine stimulus for broadband measurements.
+Each decade is measured with one arbitrary waveform whose period contains tones at
+log spaced harmonics of the repetition rate, so one acquisition gives all points of the decade.
+'''
+
+import math
+
+import numpy as np
+
+# points of one period of the multisine, what the FY6900 stores per slot
+ARB_POINTS = 8192
+# tones of a decade are the harmonics HARMONIC_MIN..10 * HARMONIC_MIN of the repetition rate
+HARMONIC_MIN = 10
+# periods of the repetition rate a capture should contain at least
+MIN_PERIODS = 4
+# samples per period of the highest tone in a capture
+SAMPLES_PER_TONE = 8
+
+
+def multisine(harmonics, n_points):
+    """
+    One period of equal amplitude tones at the harmonics, scaled to -1..1.
+    Schroeder phases keep the crest factor low, so each tone gets a useful amplitude.
+    """
+    k = np.asarray(harmonics)
+    m = np.arange(len(k))
+    phases = -np.pi * m * (m + 1) / len(k)
+    t = np.arange(n_points) / n_points
+    x = np.cos(2 * np.pi * np.outer(t, k) + phases).sum(axis=1)
+    return x / np.abs(x).max()
+
+
+def plan(start_freq, stop_freq, num_points):
+    """
+    Splits start..stop into decades, returns a list of (repetition rate, harmonics).
+    The points are distributed over the decades by their log width.
+    The repetition rate is a whole number of Hz, the AWG can't set anything finer.
+    """
+    decades = math.log10(stop_freq / start_freq)
+    blocks = []
+    f_lo = start_freq
+    while f_lo < stop_freq * (1 - 1e-9):
+        f_hi = min(f_lo * 10, stop_freq)
+        f0 = max(1, round(f_lo / HARMONIC_MIN))
+        n_tones = max(2, round(num_points * math.log10(f_hi / f_lo) / decades))
+        harmonics = np.unique(np.round(np.geomspace(f_lo / f0, f_hi / f0, n_tones)).astype(int))
+        blocks.append((f0, harmonics))
+        f_lo = f_hi
+    return blocks
@@ -0,0 +1,120 @@
+'''
+Created on 18.10.26
+
+@author: Dennis Rathgeb
+
+Calibration of the measurement fixture.
+A reference (through) sweep is recorded once, later sweeps are divided by it.
+The scope settings of the reference sweep are stored as well, a later sweep with matching
+parameters reuses its timebases and the V/div of C1. C2 sees the DUT instead of the through
+connection, it is ranged again.
+'''
+
+import json
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from params import params_hash
+from sample_stats import angle_diff
+
+# parameters that change the stimulus or the scope settings of a sweep
+CALIBRATION_PARAMS = ("start_freq", "stop_freq", "num_points", "amplitude", "sweep", "mode", "autorange")
+MAX_CALIBRATIONS = 32
+
+
+class Calibration:
+    '''
+    Reference response of the fixture and the scope settings it was measured with.
+    '''
+    def __init__(self, freq, gain, phase, vdiv, timebase):
+        order = np.argsort(freq)
+        self.freq = np.asarray(freq, dtype=float)[order]
+        self.gain = np.asarray(gain, dtype=float)[order]
+        self.phase = np.degrees(np.unwrap(np.radians(np.asarray(phase, dtype=float)[order])))
+        self.vdiv = {int(ch): v for ch, v in vdiv.items()}
+        self.timebase = list(timebase)
+
+    def correction(self, freq):
+        """reference gain and phase interpolated over log f, works on scalars and arrays"""
+        x = np.log10(freq)
+        xp = np.log10(self.freq)
+        return np.interp(x, xp, self.gain), np.interp(x, xp, self.phase)
+
+    def apply(self, freq, gain, phase):
+        """removes the fixture response from gain and phase, vectorized"""
+        ref_gain, ref_phase = self.correction(freq)
+        return np.asarray(gain) / ref_gain, angle_diff(np.asarray(phase) - ref_phase, 0)
+
+    def to_dict(self):
+        return {
+            "freq": self.freq.tolist(),
+            "gain": self.gain.tolist(),
+            "phase": self.phase.tolist(),
+            "vdiv": self.vdiv,
+            "timebase": self.timebase,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data["freq"], data["gain"], data["phase"], data["vdiv"], data["timebase"])
+
+
+class CalibrationCache:
+    '''
+    LRU cache of calibrations keyed by sweep parameters and scope IDN.
+    If a path is given the cache is kept in a json file.
+    '''
+    def __init__(self, path=None, max_entries=MAX_CALIBRATIONS):
+        self.path = path
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        # rigs and the main bench record and look up calibrations from their own threads
+        self.lock = threading.Lock()
+        if path and os.path.exists(path):
+            with open(path) as f:
+                for key, data in json.load(f).items():
+                    self.entries[key] = Calibration.from_dict(data)
+
+    @staticmethod
+    def key(params, idn):
+        relevant = {name: params.get(name) for name in CALIBRATION_PARAMS}
+        relevant["idn"] = idn
+        return params_hash(relevant)
+
+    def get(self, key):
+        with self.lock:
+            cal = self.entries.get(key)
+            if cal is not None:
+                self.entries.move_to_end(key)
+            return cal
+
+    def keys(self):
+        with self.lock:
+            return list(self.entries.keys())
+
+    def put(self, key, cal):
+        with self.lock:
+            self.entries[key] = cal
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+            self.save()
+
+    def invalidate(self, key=None):
+        """removes one calibration or all of them if key is None"""
+        with self.lock:
+            if key is None:
+                self.entries.clear()
+            else:
+                self.entries.pop(key, None)
+            self.save()
+
+    def save(self):
+        """writes the cache, called with the lock held"""
+        if not self.path:
+            return
+        with open(self.path, "w") as f:
+            json.dump({key: cal.to_dict() for key, cal in self.entries.items()}, f)
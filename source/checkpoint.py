@@ -0,0 +1,125 @@
+'''
+Created on 18.10.26
+
+@author: Dennis Rathgeb
+
+Checkpoint of a point by point sweep.
+Holds the parameters, the scope settings and every planned point with its result,
+so a sweep that stopped on an instrument error can be resumed where it was.
+The file is rewritten after every point, via a temporary file so a crash never leaves half of it.
+'''
+
+import json
+import os
+
+# a failed point is measured at most this often, the retries come after all other points
+MAX_ATTEMPTS = 3
+
+
+class SweepCheckpoint:
+    '''
+    Planned points of a sweep, each a dict with freq, timebase, result, stats, attempts and error.
+    result is (freq_meas, gain, phase) once the point was measured, None before.
+    '''
+    def __init__(self, params, vdiv, frequencies, timebase, path=None):
+        self.params = params
+        self.vdiv = {int(ch): v for ch, v in (vdiv or {}).items()}
+        self.points = [{"freq": float(f), "timebase": float(tb), "result": None, "stats": None,
+                        "attempts": 0, "error": None}
+                       for f, tb in zip(frequencies, timebase)]
+        self.complete = False
+        self.path = path
+
+    def attach(self, path):
+        """keeps the checkpoint in path from now on"""
+        self.path = path
+        self.save()
+
+    def save(self):
+        if not self.path:
+            return
+        tmp = self.path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(self.to_dict(), f)
+        os.replace(tmp, self.path)
+
+    def add(self, freq, timebase):
+        """adds a point to the plan (adaptive refinement), returns its index"""
+        self.points.append({"freq": float(freq), "timebase": float(timebase), "result": None, "stats": None,
+                            "attempts": 0, "error": None})
+        return len(self.points) - 1
+
+    def record(self, index, result, stats=None, vdiv=None):
+        point = self.points[index]
+        point["result"] = [float(x) for x in result]
+        point["stats"] = stats
+        point["attempts"] += 1
+        point["error"] = None
+        if vdiv:
+            self.vdiv = {int(ch): v for ch, v in vdiv.items()}
+        self.save()
+
+    def fail(self, index, error):
+        point = self.points[index]
+        point["attempts"] += 1
+        point["error"] = str(error)
+        self.save()
+
+    def started(self):
+        """True once any point was tried"""
+        return any(p["attempts"] > 0 for p in self.points)
+
+    def todo(self):
+        """(index, freq, timebase) of the points not tried yet, in plan order"""
+        return [(i, p["freq"], p["timebase"]) for i, p in enumerate(self.points)
+                if p["result"] is None and p["attempts"] == 0]
+
+    def retry(self):
+        """(index, freq, timebase) of the failed points that may be tried again"""
+        return [(i, p["freq"], p["timebase"]) for i, p in enumerate(self.points)
+                if p["result"] is None and 0 < p["attempts"] < MAX_ATTEMPTS]
+
+    def done(self):
+        """(freq, result, stats) of the measured points"""
+        return [(p["freq"], tuple(p["result"]), p["stats"]) for p in self.points if p["result"] is not None]
+
+    def failed(self):
+        return [p for p in self.points if p["result"] is None and p["attempts"] >= MAX_ATTEMPTS]
+
+    def reset_attempts(self):
+        """gives the unfinished points their attempts back, e.g. after the instruments were reconnected"""
+        for p in self.points:
+            if p["result"] is None:
+                p["attempts"] = 0
+        self.complete = False
+        self.save()
+
+    def finish(self):
+        """marks the sweep complete once no point is left to try"""
+        self.complete = not self.todo() and not self.retry()
+        self.save()
+
+    def summary(self):
+        return {
+            "points": len(self.points),
+            "done": sum(p["result"] is not None for p in self.points),
+            "failed": len(self.failed()),
+            "complete": self.complete,
+        }
+
+    def to_dict(self):
+        return {
+            "params": self.params,
+            "vdiv": self.vdiv,
+            "points": self.points,
+            "complete": self.complete,
+        }
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as f:
+            data = json.load(f)
+        checkpoint = cls(data["params"], data["vdiv"], [], [], path)
+        checkpoint.points = data["points"]
+        checkpoint.complete = data["complete"]
+        return checkpoint
@@ -0,0 +1,59 @@
+'''
+Created on 18.10.26
+
+@author: Dennis Rathgeb
+
+Signal processing helpers that work on raw waveform captures of the scope.
+'''
+
+import numpy as np
+
+
+def sine_fit(samples, dt, freq):
+    """
+    Least squares fit of a sine with known frequency (3 parameter fit).
+    Unlike a single bin DFT this does not need an integer number of periods
+    in the record, which we never get because of the clamped timebases.
+    Returns the complex amplitude (phasor) of the fitted sine.
+    """
+    samples = np.asarray(samples, dtype=float)
+    t = np.arange(samples.size) * dt
+    w = 2 * np.pi * freq * t
+    basis = np.column_stack((np.cos(w), np.sin(w), np.ones_like(w)))
+    (a, b, _), *_ = np.linalg.lstsq(basis, samples, rcond=None)
+    # a*cos(wt) + b*sin(wt) = Re{(a - jb) * e^(jwt)}
+    return complex(a, -b)
+
+
+def gain_phase(x, y, dt, freq):
+    """
+    Gain and phase (degrees) of y relative to x at freq.
+    Both records have to come from the same acquisition.
+    """
+    px = sine_fit(x, dt, freq)
+    py = sine_fit(y, dt, freq)
+    if px == 0:
+        return 0.0, 0.0
+    h = py / px
+    return abs(h), float(np.degrees(np.angle(h)))
+
+
+def cross_spectrum(x, y, dt, f0, harmonics):
+    """
+    Transfer function y/x at the harmonics of a periodic stimulus with repetition rate f0.
+    The records are cut to the longest whole number of periods, then tone k is at
+    FFT bin k * periods and does not leak into the bins of the other tones.
+    Returns the complex response per harmonic.
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    period = 1 / (f0 * dt)
+    periods = int(len(x) / period)
+    if periods < 1:
+        raise ValueError("Record is shorter than one period of the stimulus.")
+    n = min(int(round(periods * period)), len(x))
+    bins = np.asarray(harmonics) * periods
+    X = np.fft.rfft(x[:n] - x[:n].mean())[bins]
+    Y = np.fft.rfft(y[:n] - y[:n].mean())[bins]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return Y * np.conj(X) / (np.abs(X) ** 2)
@@ -0,0 +1,229 @@
+'''
+Created on 18.10.26
+
+@author: Dennis Rathgeb
+
+Rational fit of a measured frequency response with vector fitting
+(Gustavsen & Semlyen, relaxed pole relocation).
+The model H(s) = d + sum r_i / (s - p_i) is fitted to the complex response from gain
+and phase, so a sparse sweep gives an analytic curve that can be evaluated on any grid.
+Frequencies are scaled internally, poles and zeros are reported in Hz (s / 2pi).
+'''
+
+import numpy as np
+
+# pole relocation iterations per model order
+N_ITERATIONS = 20
+# highest number of poles tried by fit_auto
+MAX_ORDER = 8
+# an order is good enough if its error is within this factor of the best order
+ORDER_TOLERANCE = 1.5
+# points of the dense curve returned by fit_report
+CURVE_POINTS = 500
+
+
+class RationalModel:
+    def __init__(self, poles, residues, d, scale):
+        # poles and residues in the scaled s-plane, s_scaled = s / scale
+        self.poles = poles
+        self.residues = residues
+        self.d = d
+        self.scale = scale
+        self.rms_error = None
+        self.max_error = None
+
+    @property
+    def order(self):
+        return len(self.poles)
+
+    def response(self, freq):
+        """complex response at freq (Hz), vectorized"""
+        s = 2j * np.pi * np.asarray(freq, dtype=float)[..., None] / self.scale
+        return self.d + np.sum(self.residues / (s - self.poles), axis=-1)
+
+    def gain_phase(self, freq):
+        """gain and phase in degrees at freq (Hz)"""
+        h = self.response(freq)
+        return np.abs(h), np.degrees(np.angle(h))
+
+    def zeros(self):
+        """zeros in Hz (complex s / 2pi), from the numerator polynomial"""
+        numerator = self.d * np.poly(self.poles).astype(complex)
+        for i, r in enumerate(self.residues):
+            term = r * np.poly(np.delete(self.poles, i))
+            numerator[-len(term):] = numerator[-len(term):] + term
+        numerator = np.trim_zeros(np.real_if_close(numerator, tol=1e6), "f")
+        if len(numerator) < 2:
+            return np.array([], dtype=complex)
+        return np.roots(numerator) * self.scale / (2 * np.pi)
+
+    def curve(self, start_freq, stop_freq, n_points):
+        """dense log spaced curve of the model as dict of lists"""
+        freq = np.geomspace(start_freq, stop_freq, n_points)
+        gain, phase = self.gain_phase(freq)
+        return {"freq": freq.tolist(), "gain": gain.tolist(), "phase": phase.tolist()}
+
+    def to_dict(self):
+        poles = self.poles * self.scale / (2 * np.pi)
+        zeros = self.zeros()
+        return {
+            "order": self.order,
+            "poles": [[float(p.real), float(p.imag)] for p in poles],
+            "zeros": [[float(z.real), float(z.imag)] for z in zeros],
+            "rms_error": self.rms_error,
+            "max_error": self.max_error,
+        }
+
+
+def starting_poles(order, w_min, w_max):
+    """weakly damped complex pairs (and one real pole for odd orders) spread log over the range"""
+    n_pairs = order // 2
+    poles = []
+    for beta in np.geomspace(w_min, w_max, max(n_pairs, 1))[:n_pairs]:
+        poles += [complex(-beta / 100, beta), complex(-beta / 100, -beta)]
+    if order % 2:
+        poles.append(complex(-np.sqrt(w_min * w_max), 0))
+    return np.array(poles)
+
+
+def basis(s, poles):
+    """
+    Real basis functions of the partial fractions, one column per pole.
+    A complex pair p, p* gives 1/(s-p) + 1/(s-p*) and j/(s-p) - j/(s-p*).
+    """
+    columns = []
+    i = 0
+    while i < len(poles):
+        p = poles[i]
+        if p.imag == 0:
+            columns.append(1 / (s - p))
+            i += 1
+        else:
+            columns.append(1 / (s - p) + 1 / (s - p.conjugate()))
+            columns.append(1j / (s - p) - 1j / (s - p.conjugate()))
+            i += 2
+    return np.column_stack(columns)
+
+
+def state_space(poles):
+    """A and b of the real state space form of the partial fractions of basis()"""
+    n = len(poles)
+    a = np.zeros((n, n))
+    b = np.zeros(n)
+    i = 0
+    while i < n:
+        p = poles[i]
+        if p.imag == 0:
+            a[i, i] = p.real
+            b[i] = 1
+            i += 1
+        else:
+            a[i:i + 2, i:i + 2] = [[p.real, p.imag], [-p.imag, p.real]]
+            b[i:i + 2] = [2, 0]
+            i += 2
+    return a, b
+
+
+def sort_poles(poles):
+    """real poles and pairs with positive imaginary part first, as basis() expects"""
+    result = []
+    for p in poles:
+        if abs(p.imag) < 1e-9 * max(abs(p), 1e-300):
+            result.append(complex(p.real, 0))
+        elif p.imag > 0:
+            result += [p, p.conjugate()]
+    return np.array(result)
+
+
+def solve(rows, rhs, weight):
+    """weighted least squares of complex rows, split into real and imaginary parts"""
+    rows = rows * weight[:, None]
+    rhs = rhs * weight
+    a = np.vstack((rows.real, rows.imag))
+    y = np.concatenate((rhs.real, rhs.imag))
+    return np.linalg.lstsq(a, y, rcond=None)[0]
+
+
+def vector_fit(freq, h, order, n_iterations=N_ITERATIONS):
+    """fits a model with order poles to the complex response h at freq (Hz)"""
+    freq = np.asarray(freq, dtype=float)
+    h = np.asarray(h, dtype=complex)
+    scale = 2 * np.pi * np.sqrt(freq.min() * freq.max())
+    s = 2j * np.pi * freq / scale
+    # relative error weighting, the stop band counts as much as the pass band
+    weight = 1 / np.maximum(np.abs(h), 1e-12)
+    poles = starting_poles(order, s.imag.min(), s.imag.max())
+
+    for _ in range(n_iterations):
+        phi = basis(s, poles)
+        # sigma(s) h(s) = sum c_i phi_i + d with sigma = 1 + sum ct_i phi_i
+        rows = np.hstack((phi, np.ones((len(s), 1)), -h[:, None] * phi))
+        x = solve(rows, h, weight)
+        ct = x[order + 1:]
+        a, b = state_space(poles)
+        new = np.linalg.eigvals(a - np.outer(b, ct))
+        # unstable poles are flipped into the left half plane
+        new = np.where(new.real > 0, -new.real + 1j * new.imag, new)
+        poles = sort_poles(new)
+        if len(poles) != order:
+            break
+
+    phi = basis(s, poles)
+    x = solve(np.hstack((phi, np.ones((len(s), 1)))), h, weight)
+    residues = np.zeros(len(poles), dtype=complex)
+    i = 0
+    while i < len(poles):
+        if poles[i].imag == 0:
+            residues[i] = x[i]
+            i += 1
+        else:
+            residues[i] = complex(x[i], x[i + 1])
+            residues[i + 1] = residues[i].conjugate()
+            i += 2
+    model = RationalModel(poles, residues, float(x[-1]), scale)
+    error = np.abs(model.response(freq) - h) * weight
+    model.rms_error = float(np.sqrt(np.mean(error ** 2)))
+    model.max_error = float(error.max())
+    return model
+
+
+def fit_auto(freq, gain, phase, max_order=MAX_ORDER):
+    """
+    Fits orders 1..max_order to gain and phase (degrees), returns the lowest order whose
+    relative rms error is within ORDER_TOLERANCE of the best one, and the errors per order.
+    At most a third of the points are used as poles, more would fit the noise.
+    """
+    freq = np.asarray(freq, dtype=float)
+    h = np.asarray(gain) * np.exp(1j * np.radians(phase))
+    max_order = max(1, min(max_order, len(freq) // 3))
+    models = {}
+    for order in range(1, max_order + 1):
+        try:
+            models[order] = vector_fit(freq, h, order)
+        except np.linalg.LinAlgError as e:
+            print(f"Fit of order {order} failed: {e}")
+    if not models:
+        raise ValueError("No model order could be fitted.")
+    best = min(model.rms_error for model in models.values())
+    chosen = min(order for order, model in models.items() if model.rms_error <= best * ORDER_TOLERANCE)
+    return models[chosen], {order: model.rms_error for order, model in models.items()}
+
+
+def fit_report(freq, gain, phase, max_order=MAX_ORDER, n_points=CURVE_POINTS):
+    """
+    Fits measured points and returns the model, the errors per order and a dense curve
+    over the measured range. Points of failed measurements (freq 0 or nan) are left out.
+    """
+    freq = np.asarray(freq, dtype=float)
+    gain = np.asarray(gain, dtype=float)
+    phase = np.asarray(phase, dtype=float)
+    valid = (freq > 0) & np.isfinite(gain) & np.isfinite(phase) & (gain > 0)
+    if np.count_nonzero(valid) < 3:
+        raise ValueError("At least 3 valid points are needed for a fit.")
+    freq, gain, phase = freq[valid], gain[valid], phase[valid]
+    model, errors = fit_auto(freq, gain, phase, max_order)
+    return {
+        "model": model.to_dict(),
+        "errors": errors,
+        "curve": model.curve(freq.min(), freq.max(), n_points),
+    }
@@ -0,0 +1,102 @@
+'''
+Created on 18.10.26
+
+@author: Dennis Rathgeb
+
+Demodulation of a capture taken while the AWG runs its own log frequency sweep.
+The sweep start is not synchronized with the scope, it is found by fitting the
+instantaneous frequency of C1 to the sweep law. Gain and phase are then averaged
+over a few cycles around the time the sweep passes each frequency of the grid.
+The sweep has to be slow compared to the settling time of the device under test.
+'''
+
+import numpy as np
+
+# cycles of the signal averaged per frequency point
+WINDOW_CYCLES = 8
+# C1 samples below this fraction of the median envelope are ignored for the sweep fit
+MIN_ENVELOPE = 0.3
+
+
+def analytic(x):
+    """analytic signal of x (Hilbert transform via FFT)"""
+    x = np.asarray(x, dtype=float)
+    x = x - x.mean()
+    n = len(x)
+    spectrum = np.fft.fft(x)
+    weights = np.zeros(n)
+    weights[0] = 1
+    weights[1:(n + 1) // 2] = 2
+    if n % 2 == 0:
+        weights[n // 2] = 1
+    return np.fft.ifft(spectrum * weights)
+
+
+def sweep_frequency(t, f1, f2, duration, t0):
+    """frequency of a log sweep from f1 to f2 in duration that started at t0, the sweep repeats"""
+    return f1 * (f2 / f1) ** (np.mod(t - t0, duration) / duration)
+
+
+def fit_sweep_start(a1, dt, f1, f2, duration):
+    """
+    Start time of the sweep relative to the first sample.
+    Every sample with a usable envelope gives an estimate from its instantaneous frequency,
+    the estimates are averaged on the circle of the sweep period.
+    """
+    phase = np.unwrap(np.angle(a1))
+    inst_freq = np.diff(phase) / (2 * np.pi * dt)
+    envelope = np.abs(a1[1:])
+    valid = (envelope > MIN_ENVELOPE * np.median(envelope)) & (inst_freq >= f1) & (inst_freq <= f2)
+    if not np.any(valid):
+        raise ValueError("No usable sweep in C1.")
+    t = (np.arange(len(inst_freq)) + 0.5) * dt
+    position = duration * np.log(inst_freq[valid] / f1) / np.log(f2 / f1)
+    angle = 2 * np.pi * (t[valid] - position) / duration
+    # the median of the estimates is robust against the noisy instantaneous frequency
+    center = np.angle(np.mean(np.exp(1j * angle)))
+    offset = np.median(np.angle(np.exp(1j * (angle - center))))
+    return np.mod((center + offset) * duration / (2 * np.pi), duration)
+
+
+def demodulate(x, y, dt, f1, f2, duration, freqs):
+    """
+    Complex response y/x at freqs from records x (C1) and y (C2) of a running log sweep
+    and the mean amplitude of y in the window of each frequency, in the units of y.
+    The windows are evaluated with cumulative sums, so all frequencies are handled at once.
+    Frequencies the record does not cover are nan.
+    """
+    a1 = analytic(x)
+    a2 = analytic(y)
+    n = len(a1)
+    t0 = fit_sweep_start(a1, dt, f1, f2, duration)
+
+    cross = np.concatenate(([0], np.cumsum(a2 * np.conj(a1))))
+    power = np.concatenate(([0], np.cumsum(np.abs(a1) ** 2)))
+    power2 = np.concatenate(([0], np.cumsum(np.abs(a2) ** 2)))
+
+    freqs = np.asarray(freqs, dtype=float)
+    h_cross = np.zeros(len(freqs), dtype=complex)
+    h_power = np.zeros(len(freqs))
+    y_power = np.zeros(len(freqs))
+    count = np.zeros(len(freqs))
+    # times the sweep passes freqs, one for every sweep that can be in the record
+    position = duration * np.log(freqs / f1) / np.log(f2 / f1)
+    half = WINDOW_CYCLES / (2 * freqs * dt)
+    first = np.floor((0 - t0) / duration) - 1
+    for k in range(int(first), int(first) + int(n * dt / duration) + 3):
+        begin = (t0 + k * duration) / dt
+        restart = begin + duration / dt
+        center = begin + position / dt
+        # windows are cut at the ends of the record and of the sweep, at least half of one is needed
+        start = np.maximum(np.round(center - half), max(np.ceil(begin), 0)).astype(int)
+        stop = np.minimum(np.round(center + half), min(np.floor(restart), n)).astype(int)
+        ok = stop - start >= half
+        start, stop = start[ok], stop[ok]
+        # summing before dividing weights every pass by its window length
+        h_cross[ok] += cross[stop] - cross[start]
+        h_power[ok] += power[stop] - power[start]
+        y_power[ok] += power2[stop] - power2[start]
+        count[ok] += stop - start
+    with np.errstate(divide="ignore", invalid="ignore"):
+        # the magnitude of the analytic signal is the amplitude of the sine
+        return np.where(h_power > 0, h_cross / h_power, np.nan), np.sqrt(y_power / count)
@@ -1,7 +1,9 @@
-import time
+import asyncio
+import json
+import os
+import threading
 import numpy as np
-import serial.tools.list_ports
-from fastapi import FastAPI, Body
+from fastapi import FastAPI, Body, HTTPException, WebSocket, WebSocketDisconnect
 from fastapi.responses import StreamingResponse, JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel, Field
@@ -10,16 +12,50 @@ from awg_factory import awg_factory
 from oscillatordrivers.sds8xx import SDS8XX
 from awgdrivers.constants import SINE
 from bode import BodePlotter
-from params import BodeSettings, PortRequest
+from async_bode import AsyncSweep
+from archive import SweepArchive
+from calibration import CalibrationCache
+from checkpoint import SweepCheckpoint
+from fitting import fit_report
+from params import BodeSettings, FitRequest, GoldenRequest, MaskRequest, PortRequest, RigRequest
+from production import GoldenMask, MaskStore, run_test
+from sample_stats import reduce_batch
+from rigs import Rig, RigRegistry
+from session import SessionManager
+from settling import SettleModel
+from streaming import SweepBroadcast, encode_binary, encode_json, point_dict
+from tracing import tracer
 
 DEFAULT_AWG = "FY6900"
 DEFAULT_PORT = "COM13"
 DEFAULT_BAUD_RATE = None
+# directory of the archive and the state files, set BODE_DATA_DIR to keep them elsewhere
+DATA_DIR = os.environ.get("BODE_DATA_DIR", ".")
+ARCHIVE_DIR = "archive"
+CALIBRATION_FILE = "calibration.json"
+SESSION_FILE = "session.json"
+MASK_FILE = "masks.json"
+SETTLE_FILE = "settling.json"
      
 # --- AWG, Scope & Bodeplotter instances---
 awg = None
 scope = None
 bode = None
+rigs = RigRegistry()
+# stores backed by files in DATA_DIR, created by open_stores at startup so importing main touches no files
+archive = None
+calibration_cache = None
+sessions = None
+masks = None
+settle_model = None
+# running sweep of the main bench, shared by all clients
+broadcast = None
+# held by the sweep, production test or calibration using the main bench
+bench_lock = threading.Lock()
+# True while a production test runs on the main bench
+testing = False
+# True while a calibration sweep is recorded on the main bench
+calibrating = False
 
 # --- FastAPI app ---
 app = FastAPI()
@@ -31,6 +67,49 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+def bench_busy():
+    """True while the main bench sweeps, tests or records a calibration"""
+    return bench_lock.locked()
+
+def open_stores(data_dir=DATA_DIR):
+    """creates the archive and loads the state files from data_dir"""
+    global archive, calibration_cache, sessions, masks, settle_model
+    os.makedirs(data_dir, exist_ok=True)
+    archive = SweepArchive(os.path.join(data_dir, ARCHIVE_DIR))
+    calibration_cache = CalibrationCache(os.path.join(data_dir, CALIBRATION_FILE))
+    sessions = SessionManager(os.path.join(data_dir, SESSION_FILE))
+    masks = MaskStore(os.path.join(data_dir, MASK_FILE))
+    settle_model = SettleModel(os.path.join(data_dir, SETTLE_FILE))
+    # no health checks while the main bench is busy
+    sessions.bench_lock = bench_lock
+
+def update_bode():
+    """creates the BodePlotter once both instruments are connected, keeps its settings on reconnects"""
+    global bode
+    if awg is None or scope is None or not scope.is_connected():
+        return
+    if bode is None:
+        bode = BodePlotter(awg, scope)
+        bode.calibration_cache = calibration_cache
+        bode.settle_model = settle_model
+    else:
+        bode.awg, bode.scope = awg, scope
+
+async def restore_session():
+    global awg, scope
+    loop = asyncio.get_running_loop()
+    restored_awg, restored_scope = await loop.run_in_executor(None, sessions.restore)
+    # instruments connected by hand in the meantime win
+    awg = awg or restored_awg
+    scope = scope or restored_scope
+    update_bode()
+    await sessions.monitor()
+
+@app.on_event("startup")
+async def startup():
+    open_stores()
+    app.state.session_task = asyncio.create_task(restore_session())
+
 # --- API Endpoints ---
 
 @app.get("/")
@@ -54,6 +133,7 @@ def get_status():
 #--- AWG Endpoints ---
 @app.get("/ports")
 def list_serial_ports():
+    import serial.tools.list_ports
     ports = serial.tools.list_ports.comports()
     return {"ports": [port.device for port in ports]}
 
@@ -61,20 +141,13 @@ def list_serial_ports():
 
 @app.post("/connect/awg")
 def connect_awg(data: PortRequest):
-    global awg, bode, scope
-    port = data.port
+    global awg
     try:
-        awg_class = awg_factory.get_class_by_name(DEFAULT_AWG)
-        awg = awg_class(port, DEFAULT_BAUD_RATE)
-        if not awg.connect():
+        connected = sessions.connect_awg(data.port, DEFAULT_AWG, DEFAULT_BAUD_RATE)
+        if connected is None:
             return {"status": "failed", "device": "awg"}
-
-        awg.initialize()
-
-        # Create BodePlotter if both connected
-        if scope and scope.is_connected():
-            bode = BodePlotter(awg, scope)
-
+        awg = connected
+        update_bode()
         return {"status": "connected", "device": "awg"}
 
     except Exception as e:
@@ -83,18 +156,23 @@ def connect_awg(data: PortRequest):
 #---- SCOPE Endpoints ---
 @app.post("/connect/scope")
 def connect_scope():
-    global scope, bode, awg
-
-    scope = SDS8XX()
-    if not scope.connect():
+    global scope
+    connected = sessions.connect_scope()
+    if connected is None:
         return {"status": "not_found", "device": "scope"}
-
-    # Create BodePlotter if both connected
-    if awg and hasattr(awg, "ser") and awg.ser.is_open:
-        bode = BodePlotter(awg, scope)
-
+    scope = connected
+    update_bode()
     return {"status": "connected", "device": "scope"}
 
+@app.post("/resync")
+def resync_instruments():
+    """forget remembered instrument settings after they were changed by hand"""
+    if scope:
+        scope.invalidate()
+    if awg:
+        awg.invalidate()
+    return {"status": "ok"}
+
 #---- BODE Endpoints ---
 @app.get("/bode/params")
 def get_params():
@@ -105,19 +183,366 @@ def update_config(settings: BodeSettings):
     bode.set_params(settings.dict())
     return {"status": "ok", "updated": bode.get_params()}
 
+async def produce_sweep(sweep_broadcast, resume_id=None):
+    """
+    measures the sweep and publishes the points, independent of any client.
+    With resume_id the checkpointed run is continued, its points are published first.
+    """
+    sweep = AsyncSweep(bode)
+    run = None
+    error = None
+    try:
+        if resume_id is None:
+            await sweep.setup()
+            run = archive.create_run(bode.get_params(), scope.idn)
+            if bode.checkpoint is not None:
+                bode.checkpoint.attach(run.checkpoint_path)
+        else:
+            checkpoint = SweepCheckpoint.load(archive.checkpoint_path(resume_id))
+            await sweep.resume(checkpoint)
+            run = archive.open_run(resume_id)
+            for _, (freq, gain, phase), _ in checkpoint.done():
+                sweep_broadcast.publish(freq, gain, phase)
+        async for freq, gain, phase in sweep.points():
+            if freq > 0:
+                run.append(freq, gain, phase, bode.last_stats, bode.last_samples)
+                sweep_broadcast.publish(freq, gain, phase)
+    except Exception as e:
+        print(f"Sweep failed: {e}")
+        error = str(e)
+    finally:
+        if run is not None:
+            run.close()
+        sweep.close()
+        sweep_broadcast.finish(error)
+
+def join_sweep(resume_id=None):
+    """running sweep of the main bench, starts one if there is none"""
+    global broadcast
+    if testing:
+        raise HTTPException(status_code=409, detail="A production test is running")
+    if calibrating:
+        raise HTTPException(status_code=409, detail="A calibration is recorded")
+    if broadcast is None or broadcast.done:
+        if not bench_lock.acquire(blocking=False):
+            raise HTTPException(status_code=409, detail="The bench is busy")
+        broadcast = SweepBroadcast(bode.get_params())
+        broadcast.task = asyncio.create_task(produce_sweep(broadcast, resume_id))
+        broadcast.task.add_done_callback(lambda _: bench_lock.release())
+    return broadcast
+
+@app.post("/bode/resume/{run_id}")
+async def resume_bode_plot(run_id: str):
+    """continues an interrupted sweep of the archive, follow it with /bode/stream"""
+    if bench_busy():
+        raise HTTPException(status_code=409, detail="A sweep is running")
+    try:
+        path = archive.checkpoint_path(run_id)
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"Unknown run {run_id}")
+    if path is None:
+        raise HTTPException(status_code=400, detail=f"Run {run_id} has no checkpoint")
+    checkpoint = SweepCheckpoint.load(path)
+    # a complete run can still be resumed to retry its failed points
+    if checkpoint.complete and not checkpoint.failed():
+        raise HTTPException(status_code=400, detail=f"Run {run_id} is complete")
+    join_sweep(run_id)
+    return {"status": "resumed", "run_id": run_id, **checkpoint.summary()}
+
 @app.get("/bode/start")
-def start_bode_plot():
-    bode.setup_run()
+async def start_bode_plot():
+    sweep_broadcast = join_sweep()
 
-    def stream():
-        for f, tb in zip(bode.frequencies, bode.scope_timebase):
-            freq, gain, phase = bode.collect_data_sample(f, tb)
-            if freq > 0:
-                yield f"data: {{" \
-                      f"\"freq\": {freq}, " \
-                      f"\"gain\": {gain}, " \
-                      f"\"phase\": {phase}" \
-                      f"}}\n\n"
-            time.sleep(0.05)
+    async def stream():
+        async for frame in sweep_broadcast.frames():
+            for point in frame:
+                yield f"data: {json.dumps(point_dict(point))}\n\n"
 
     return StreamingResponse(stream(), media_type="text/event-stream")
+
+@app.get("/bode/stream")
+async def stream_bode_plot(batch: int = 1):
+    """like /bode/start but sends frames of at least batch points"""
+    sweep_broadcast = join_sweep()
+
+    async def stream():
+        async for frame in sweep_broadcast.frames(max(1, batch)):
+            yield f"data: {encode_json(frame)}\n\n"
+        yield f"event: done\ndata: {json.dumps({'error': sweep_broadcast.error})}\n\n"
+
+    return StreamingResponse(stream(), media_type="text/event-stream")
+
+@app.websocket("/bode/ws")
+async def bode_websocket(websocket: WebSocket, batch: int = 1, binary: bool = True):
+    """
+    Frames of the running sweep, binary frames are float32 triples freq, gain, phase.
+    The last message is a text message {"done": true, "error": ...}.
+    While a production test or calibration runs the socket is closed with code 1013 (try again later).
+    """
+    await websocket.accept()
+    try:
+        sweep_broadcast = join_sweep()
+    except HTTPException:
+        await websocket.close(code=1013, reason="The bench is busy")
+        return
+    try:
+        async for frame in sweep_broadcast.frames(max(1, batch)):
+            if binary:
+                await websocket.send_bytes(encode_binary(frame))
+            else:
+                await websocket.send_text(encode_json(frame))
+        await websocket.send_text(json.dumps({"done": True, "error": sweep_broadcast.error}))
+        await websocket.close()
+    except WebSocketDisconnect:
+        pass
+
+#---- CALIBRATION Endpoints ---
+@app.get("/calibration")
+def list_calibrations():
+    return {"calibrations": calibration_cache.keys(),
+            "current": bode.calibration_key() if bode else None}
+
+@app.post("/calibration/record")
+def record_calibration():
+    global calibrating
+    if not bench_lock.acquire(blocking=False):
+        raise HTTPException(status_code=409, detail="The bench is busy")
+    calibrating = True
+    try:
+        cal = bode.record_calibration()
+    except Exception as e:
+        return {"status": "error", "detail": str(e)}
+    finally:
+        calibrating = False
+        bench_lock.release()
+    return {"status": "ok", "key": bode.calibration_key(), "points": len(cal.freq)}
+
+@app.delete("/calibration")
+def clear_calibrations():
+    calibration_cache.invalidate()
+    return {"status": "ok"}
+
+@app.delete("/calibration/{key}")
+def delete_calibration(key: str):
+    calibration_cache.invalidate(key)
+    return {"status": "ok"}
+
+#---- SETTLING Endpoints ---
+@app.get("/settling")
+def get_settling():
+    """learned wait after a frequency step per band (lower band edge in Hz: seconds)"""
+    return {"settle_times": settle_model.to_dict()}
+
+@app.delete("/settling")
+def reset_settling():
+    settle_model.reset()
+    return {"status": "ok"}
+
+#---- RIG Endpoints ---
+@app.get("/rigs")
+def list_rigs():
+    return {"rigs": rigs.list()}
+
+@app.post("/rigs")
+def add_rig(data: RigRequest):
+    if rigs.get(data.name):
+        return {"status": "error", "detail": f"Rig {data.name} already exists"}
+    # the main bench and the other rigs keep their instruments
+    main_port = getattr(awg, "port", None) or (sessions.state["awg"] or {}).get("port")
+    if data.awg_port == main_port or data.awg_port in rigs.used_awg_ports():
+        raise HTTPException(status_code=409, detail=f"AWG port {data.awg_port} is already in use")
+    main_resource = getattr(scope, "resource", None) or (sessions.state["scope"] or {}).get("resource")
+    exclude = rigs.used_scopes() + [main_resource]
+    if data.scope_resource is not None and data.scope_resource in exclude:
+        raise HTTPException(status_code=409, detail=f"Scope {data.scope_resource} is already in use")
+    try:
+        awg_class = awg_factory.get_class_by_name(data.awg_model)
+        rig_awg = awg_class(data.awg_port, DEFAULT_BAUD_RATE)
+        if not rig_awg.connect():
+            return {"status": "failed", "device": "awg"}
+        rig_awg.initialize()
+
+        rig_scope = SDS8XX()
+        if not rig_scope.connect(resource=data.scope_resource, exclude=exclude,
+                                 known_idn=sessions.state["idn"]):
+            rig_awg.disconnect()
+            return {"status": "not_found", "device": "scope"}
+
+        rigs.add(Rig(data.name, rig_awg, rig_scope, archive, calibration_cache, settle_model))
+    except Exception as e:
+        return {"status": "error", "detail": str(e)}
+    return {"status": "connected", "rig": data.name}
+
+@app.delete("/rigs/{name}")
+def remove_rig(name: str):
+    if rigs.remove(name) is None:
+        raise HTTPException(status_code=404, detail=f"Unknown rig {name}")
+    return {"status": "ok"}
+
+@app.get("/rigs/{name}")
+def get_rig(name: str):
+    rig = rigs.get(name)
+    if rig is None:
+        raise HTTPException(status_code=404, detail=f"Unknown rig {name}")
+    return rig.info()
+
+@app.post("/rigs/{name}/jobs")
+def submit_rig_job(name: str, settings: BodeSettings):
+    rig = rigs.get(name)
+    if rig is None:
+        raise HTTPException(status_code=404, detail=f"Unknown rig {name}")
+    job = rig.submit(settings.dict())
+    return {"status": "queued", "job": job["id"]}
+
+@app.get("/rigs/{name}/jobs/{job_id}/stream")
+async def stream_rig_job(name: str, job_id: int, batch: int = 1):
+    rig = rigs.get(name)
+    job = rig.get_job(job_id) if rig else None
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown job {job_id} on rig {name}")
+
+    async def stream():
+        async for frame in job["broadcast"].frames(max(1, batch)):
+            if batch > 1:
+                yield f"data: {encode_json(frame)}\n\n"
+            else:
+                for point in frame:
+                    yield f"data: {json.dumps(point_dict(point))}\n\n"
+
+    return StreamingResponse(stream(), media_type="text/event-stream")
+
+#---- METRICS Endpoints ---
+@app.get("/metrics")
+def get_metrics():
+    return tracer.metrics()
+
+@app.post("/metrics/enable")
+def enable_metrics(on: bool = True):
+    tracer.enabled = on
+    return {"status": "ok", "enabled": tracer.enabled}
+
+@app.post("/metrics/reset")
+def reset_metrics():
+    tracer.reset()
+    return {"status": "ok"}
+
+@app.get("/metrics/trace")
+def get_trace():
+    """timeline in Chrome trace format, open in chrome://tracing or ui.perfetto.dev"""
+    return JSONResponse(tracer.chrome_trace(),
+                        headers={"Content-Disposition": "attachment; filename=bode_trace.json"})
+
+#---- ARCHIVE Endpoints ---
+@app.get("/archive/runs")
+def list_runs(device: str = None, date: str = None, param_hash: str = None):
+    return {"runs": archive.list_runs(device=device, date=date, param_hash=param_hash)}
+
+@app.get("/archive/runs/{run_id}")
+def get_run(run_id: str):
+    try:
+        run = archive.load_run(run_id)
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"Unknown run {run_id}")
+    run["columns"] = {col: values.tolist() for col, values in run["columns"].items()}
+    path = archive.checkpoint_path(run_id)
+    if path is not None:
+        run["checkpoint"] = SweepCheckpoint.load(path).summary()
+    return run
+
+@app.get("/archive/runs/{run_id}/fit")
+def fit_run(run_id: str, max_order: int = 8, points: int = 500):
+    try:
+        run = archive.load_run(run_id)
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"Unknown run {run_id}")
+    columns = run["columns"]
+    try:
+        return fit_report(columns["freq"], columns["gain"], columns["phase"], max_order, points)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/archive/runs/{run_id}/reprocess")
+def reprocess_run(run_id: str, tolerance: float = 0.2):
+    """
+    Reduces the raw samples of a run again with another outlier tolerance.
+    Gain and phase are without the fixture calibration, points without inliers are null.
+    """
+    try:
+        samples = archive.load_samples(run_id)
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"Unknown run {run_id}")
+    if samples is None:
+        raise HTTPException(status_code=400, detail=f"Run {run_id} has no raw samples")
+    freq, rms1, rms2, phase = samples
+    result = reduce_batch(rms1, rms2, phase, tolerance)
+    result["freq"] = freq
+    return {key: [None if np.isnan(x) else float(x) for x in values] for key, values in result.items()}
+
+#---- PRODUCTION TEST Endpoints ---
+@app.get("/masks")
+def list_masks():
+    return {"masks": masks.list()}
+
+@app.get("/masks/{name}")
+def get_mask(name: str):
+    mask = masks.get(name)
+    if mask is None:
+        raise HTTPException(status_code=404, detail=f"Unknown mask {name}")
+    return mask.to_dict()
+
+@app.post("/masks")
+def add_mask(data: MaskRequest):
+    lengths = {len(data.freq), len(data.gain_lower), len(data.gain_upper), len(data.phase_lower), len(data.phase_upper)}
+    if len(lengths) != 1 or len(data.freq) < 2:
+        raise HTTPException(status_code=400, detail="All limits need the same number (>= 2) of points")
+    masks.put(GoldenMask(data.name, data.freq, data.gain_lower, data.gain_upper,
+                         data.phase_lower, data.phase_upper, data.params))
+    return {"status": "ok", "masks": masks.list()}
+
+@app.post("/masks/golden")
+def add_golden_mask(data: GoldenRequest):
+    """mask around an archived sweep of a golden unit, tested with the same parameters"""
+    try:
+        run = archive.load_run(data.run_id)
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"Unknown run {data.run_id}")
+    columns = run["columns"]
+    if len(columns["freq"]) < 2:
+        raise HTTPException(status_code=400, detail=f"Run {data.run_id} has less than 2 points")
+    masks.put(GoldenMask.from_golden(data.name, columns["freq"], columns["gain"], columns["phase"],
+                                     data.gain_tol_db, data.phase_tol, run["params"]))
+    return {"status": "ok", "masks": masks.list()}
+
+@app.delete("/masks/{name}")
+def delete_mask(name: str):
+    masks.remove(name)
+    return {"status": "ok"}
+
+@app.post("/test/{name}")
+async def production_test(name: str, abort_on_fail: bool = True):
+    """sweeps the unit on the main bench against a mask and returns the verdict"""
+    global testing
+    mask = masks.get(name)
+    if mask is None:
+        raise HTTPException(status_code=404, detail=f"Unknown mask {name}")
+    if bode is None:
+        raise HTTPException(status_code=400, detail="AWG and scope are not connected")
+    if not bench_lock.acquire(blocking=False):
+        raise HTTPException(status_code=409, detail="The bench is busy")
+    testing = True
+    try:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, run_test, bode, mask, abort_on_fail)
+    finally:
+        testing = False
+        bench_lock.release()
+
+#---- FIT Endpoint ---
+@app.post("/fit")
+def fit_points(data: FitRequest):
+    if not len(data.freq) == len(data.gain) == len(data.phase):
+        raise HTTPException(status_code=400, detail="freq, gain and phase must have the same length")
+    try:
+        return fit_report(data.freq, data.gain, data.phase, data.max_order, data.points)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
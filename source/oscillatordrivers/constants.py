@@ -9,4 +9,12 @@ VALID_TIMEBASERANGES = [
     1e-3, 2e-3, 5e-3,
     10e-3, 20e-3, 50e-3,
     0.1, 0.2, 0.5, 1.0
-]
\ No newline at end of file
+]
+
+VALID_VDIVRANGES = [
+    500e-6,
+    1e-3, 2e-3, 5e-3,
+    10e-3, 20e-3, 50e-3,
+    0.1, 0.2, 0.5,
+    1.0, 2.0, 5.0, 10.0
+]
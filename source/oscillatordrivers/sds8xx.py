@@ -1,81 +1,198 @@
-import pyvisa
+import re
 import time
 import numpy as np
-import matplotlib.pyplot as plt
 
 import oscillatordrivers.constants as constants
+from tracing import traced, tracer
 
 MAX_TIMEOUT = 10000
+# time the scope needs to finish ASET
+AUTO_SETUP_DELAY = 6
 N_DIV_H = 10
 N_DIV_V = 8
+# ADC codes per vertical division in the 8-bit waveform data
+CODES_PER_DIV = 25
+# seconds to wait for a single acquisition and between two INR? polls
+ACQ_TIMEOUT = 5
+ACQ_POLL = 0.002
+# bytes per read of a waveform block and bytes read to find its header
+BLOCK_CHUNK = 1 << 20
+HEADER_PEEK = 16
+# the response header before the block marker is longer with CHDR LONG, give up after this many bytes
+MAX_HEADER = 128
+# WF? ends the data block with two LF
+WF_TRAILER = b"\n\n"
+# seconds to wait for the measurement statistics to count enough acquisitions
+STAT_TIMEOUT = 10
+# keys of the :MEASure:ADVanced:P<n>:STATistics? ALL answer
+STAT_KEYS = {"CURRENT": "current", "MEAN": "mean", "MAXIMUM": "max", "MINIMUM": "min",
+             "STDEV": "stdev", "COUNT": "count"}
+# units of the PAVA/MEAD parameters, stripped from the values
+MEAS_UNITS = {"RMS": "V", "PKPK": "V", "FREQ": "Hz", "PHA": "°"}
 
 class SDS8XX:
-    def __init__(self):
-        self.rm = pyvisa.ResourceManager()
+    def __init__(self, rm=None):
+        """rm can be any VISA resource manager, e.g. the one of the simulator"""
+        if rm is None:
+            # pyvisa is only imported when a real scope is used
+            import pyvisa
+            rm = pyvisa.ResourceManager()
+        self.rm = rm
+        self.auto_setup_delay = AUTO_SETUP_DELAY
         self.scope = None
         self.idn = None
+        self.resource = None
+        # last command written per setting, to skip writes that change nothing
+        self.settings = {}
+        # timebase we set and the sample rate read per timebase, saves TDIV?/SARA? queries
+        self.timebase = None
+        self.sample_rates = {}
         
 
-    def connect(self):
+    def connect(self, resource=None, exclude=(), known_idn=None):
+        """
+        Connects to the first Siglent scope found via USB.
+        resource selects a specific VISA resource, resources in exclude are skipped
+        (e.g. scopes already used by another rig).
+        known_idn maps resources to the IDN they answered before. Resources known to be
+        something else are not opened again, newly probed ones are added.
+        """
         #print("Scanning USB-connected SIGLENT scopes...\n")
-        devices = self.rm.list_resources()
+        known_idn = known_idn if known_idn is not None else {}
+        devices = [resource] if resource else self.rm.list_resources()
         for res in devices:
-            if "USB" in res:
+            if "USB" in res and res not in exclude:
+                if not resource and res in known_idn and "Siglent" not in known_idn[res]:
+                    continue
                 try:
                     dev = self.rm.open_resource(res)
                     idn = dev.query("*IDN?").strip()
+                    known_idn[res] = idn
                     if "Siglent" in idn:
                         self.scope = dev
                         self.idn = idn
+                        self.resource = res
                         self.scope.timeout = MAX_TIMEOUT
+                        self.invalidate()
                         print(f"Connecting to: {self.idn}")
                         return True
+                    dev.close()
                 except Exception as e:
                     print(f"Could not connect to {res}: {e}")
 
         print("\nNo Siglent SDS8XX scope found via USB.")
         return False
 
+    def disconnect(self):
+        if self.scope:
+            self.scope.close()
+        self.scope = None
+
+    def reconnect(self):
+        """reopens the last resource, e.g. after the USB connection dropped"""
+        if self.scope:
+            try:
+                self.scope.close()
+            except Exception:
+                pass
+        self.scope = None
+        return self.resource is not None and self.connect(resource=self.resource)
+
+    def ping(self):
+        """cheap health check, False if the scope does not answer"""
+        try:
+            return self.scope is not None and "Siglent" in self.scope.query("*IDN?")
+        except Exception:
+            return False
+
     def is_connected(self):
         return self.scope is not None
 
 
     # ---- LL send/recieve/query stuff ----
+    @traced("scope.query")
     def query(self, command):
         if self.scope:
-            return self.scope.query(command).strip()
+            try:
+                return self.scope.query(command).strip()
+            except Exception as e:
+                self.recover(e)
+                return self.scope.query(command).strip()
         else:
             raise Exception("Scope not connected.")
 
+    @traced("scope.write")
     def write(self, command):
         if self.scope:
-            self.scope.write(command)
+            try:
+                self.scope.write(command)
+            except Exception as e:
+                self.recover(e)
+                self.scope.write(command)
         else:
             raise Exception("Scope not connected.")
 
+    def recover(self, error):
+        """reconnects after a failed transfer so it can be repeated once, raises error if that fails"""
+        print(f"Scope transfer failed ({error}), reconnecting to {self.resource}")
+        if not self.reconnect():
+            raise error
+
+    def write_setting(self, key, command):
+        """
+        Writes a setting unless the same command was already written for key.
+        The scope does not change its settings on its own, so the write would change nothing.
+        """
+        if self.settings.get(key) == command:
+            return
+        self.write(command)
+        self.settings[key] = command
+
+    def invalidate(self):
+        """Forget the written settings, e.g. after auto setup or changes on the front panel."""
+        self.settings = {}
+        self.timebase = None
+        self.sample_rates = {}
+
     # --- Basic channel Setup Commands ---
+    @traced("scope.auto_setup")
     def auto_setup(self):
         self.write("ASET")
-        time.sleep(6)
+        time.sleep(self.auto_setup_delay)
+        # auto setup changes vertical, timebase and trigger settings
+        self.invalidate()
 
     def set_vdiv(self, channel, volts_per_div):
-        self.write(f"C{channel}:VDIV {volts_per_div}")
+        self.write_setting(f"C{channel}:VDIV", f"C{channel}:VDIV {volts_per_div}")
+
+    def get_vdiv(self, channel):
+        string = self.query(f"C{channel}:VDIV?")
+        return float(string.split()[-1].replace("V", ""))
+
+    def get_offset(self, channel):
+        string = self.query(f"C{channel}:OFST?")
+        return float(string.split()[-1].replace("V", ""))
 
     def set_coupling(self, channel, mode):
         """mode: 'D1M' = DC, 'A1M' = AC, 'GND' = Ground"""
-        self.write(f"C{channel}:CPL {mode}")
+        self.write_setting(f"C{channel}:CPL", f"C{channel}:CPL {mode}")
 
     def set_probe_attenuation(self, channel, ratio):
         """10x or 1x"""
-        self.write(f"C{channel}:ATTN {ratio}")
+        self.write_setting(f"C{channel}:ATTN", f"C{channel}:ATTN {ratio}")
 
     # --- Time stuff ----
     def set_timebase(self, time_per_div):
-        self.write(f"TDIV {time_per_div}")
+        self.write_setting("TDIV", f"TDIV {time_per_div}")
+        self.timebase = float(time_per_div)
 
     def get_timebase(self):
+        if self.timebase is not None:
+            return self.timebase
         string = self.query("TDIV?")
-        return float(string.replace("S", ""))
+        # answer is "TDIV 5.00E-03S" or "5.00E-03S" depending on the header setting
+        self.timebase = float(string.split()[-1].replace("S", ""))
+        return self.timebase
         
 
     def get_bandwidth(self, channel=1):
@@ -84,22 +201,33 @@ class SDS8XX:
         return result
 
     def get_sample_rate(self):
+        """sample rate of the current timebase, only queried once per timebase"""
+        timebase = self.get_timebase()
+        if timebase in self.sample_rates:
+            return self.sample_rates[timebase]
         response = self.query("SARA?")
         parts = response.strip().split()
         if len(parts) >= 2:
             rate_str = parts[1].replace("Sa/s", "")
-            return float(rate_str)
+            self.sample_rates[timebase] = float(rate_str)
+            return self.sample_rates[timebase]
         else:
             raise ValueError(f"Unexpected SARA? response: {response}")
         
 
     # --- Trigger / Control ---
     def run_single(self):
-        self.write("TRMD SINGLE")
+        self.write_setting("TRMD", "TRMD SINGLE")
         self.write("ARM")
 
+    def run_auto(self):
+        """continuous acquisition, the measurements update again after a single acquisition"""
+        self.write_setting("TRMD", "TRMD AUTO")
+
     def stop(self):
         self.write("STOP")
+        # the trigger mode is no longer what was last written, TRMD has to be written again
+        self.settings.pop("TRMD", None)
 
     def arm(self):
         self.write("ARM")
@@ -116,11 +244,12 @@ class SDS8XX:
         - n_points: The number of points to capture in the waveform.
         - start: The starting point for the waveform capture.
         """
-        self.scope.write(f"WFSU SP,{sparcing},NP,{n_points},FP,{start}") 
+        self.write_setting("WFSU", f"WFSU SP,{sparcing},NP,{n_points},FP,{start}")
 
     def get_waveform(self, channel=1):
         self.scope.write(f"C{channel}:WF? DAT2")
     
+    @traced("scope.read_raw")
     def read_raw(self):
         raw = self.scope.read_raw()
         return raw
@@ -133,8 +262,9 @@ class SDS8XX:
         total_time = N_DIV_H * t_div
         return np.linspace(0, total_time, n_points)
 
-    def get_sparcing(self, n_points):
-        sample_rate = self.get_sample_rate()
+    def get_sparcing(self, n_points, sample_rate=None):
+        if sample_rate is None:
+            sample_rate = self.get_sample_rate()
         t_div = self.get_timebase()
         sparcing = int(t_div * N_DIV_H * sample_rate / n_points) 
         #print(f"samp rate: {sample_rate}")
@@ -142,15 +272,33 @@ class SDS8XX:
         #print(f"sparcing: {sparcing}") 
         return sparcing
 
-    def get_waveform_binary(self, channel=1, delay=0.5, n_points=1000):
-        if not self.scope:
-            raise RuntimeError("Scope not connected.")
+    def acquisition_done(self):
+        """True if a new acquisition finished since the last call (INR bit 0, cleared by reading)"""
+        return int(self.query("INR?").split()[-1]) & 1 == 1
 
+    @traced("scope.acquire_single")
+    def acquire_single(self, timeout=ACQ_TIMEOUT):
+        """
+        Takes a single acquisition and leaves the scope stopped on it.
+        Polls the INR register until the acquisition is done instead of sleeping a fixed time.
+        """
         self.stop()
+        self.acquisition_done()
         self.run_single()
-        self.arm()
         self.force_trigger()
-        time.sleep(delay)
+        # no need to ask before the record can be complete
+        time.sleep(N_DIV_H * self.get_timebase())
+        start = time.monotonic()
+        while not self.acquisition_done():
+            if time.monotonic() - start > timeout:
+                raise TimeoutError(f"No acquisition within {timeout} s.")
+            time.sleep(ACQ_POLL)
+
+    def get_waveform_binary(self, channel=1, timeout=ACQ_TIMEOUT, n_points=1000):
+        if not self.scope:
+            raise RuntimeError("Scope not connected.")
+
+        self.acquire_single(timeout)
 
         sparcing = self.get_sparcing(n_points)
 
@@ -162,28 +310,111 @@ class SDS8XX:
 
         return raw
 
+    def capture_waveforms(self, channels=(1, 2), timeout=ACQ_TIMEOUT, n_points=1000):
+        """
+        Reads the traces of several channels from one single acquisition.
+        Returns the parsed ADC codes per channel and the sample interval in seconds.
+        """
+        if not self.scope:
+            raise RuntimeError("Scope not connected.")
+
+        self.acquire_single(timeout)
+
+        sample_rate = self.get_sample_rate()
+        sparcing = max(self.get_sparcing(n_points, sample_rate), 1)
+        self.set_waveform(sparcing=sparcing, n_points=n_points)
+        dt = sparcing / sample_rate
+
+        waveforms = {}
+        for channel in channels:
+            self.get_waveform(channel=channel)
+            waveforms[channel] = self.read_block()
+        return waveforms, dt
+
+    def capture_record(self, channel=1, n_points=0, sparcing=1, out=None, consumer=None, chunk_size=BLOCK_CHUNK):
+        """
+        Reads a long record of one channel of the last acquisition, n_points=0 reads all points.
+        out and consumer are passed to read_block, e.g. a np.memmap to keep the record on disk.
+        Returns a Waveform, volts are only computed when asked for.
+        """
+        sample_rate = self.get_sample_rate()
+        self.set_waveform(sparcing=sparcing, n_points=n_points)
+        self.get_waveform(channel=channel)
+        codes = self.read_block(out=out, consumer=consumer, chunk_size=chunk_size)
+        return Waveform(codes, self.get_vdiv(channel), self.get_offset(channel), sparcing / sample_rate)
+
+    @traced("scope.read_block")
+    def read_block(self, out=None, dtype=np.int8, consumer=None, chunk_size=BLOCK_CHUNK):
+        """
+        Reads the IEEE 488.2 definite length block of a pending WF? answer chunk by chunk.
+        The payload goes straight into out, a preallocated or memory mapped array
+        (allocated if None), and is returned as view of dtype (int8 or int16) without a conversion copy.
+        consumer(data, start) is called with the typed samples of every chunk while reading,
+        start being the index of the first one.
+        """
+        head = bytes(self.scope.read_bytes(HEADER_PEEK))
+        # read on until the marker and its length digit are there
+        while b'#' not in head[:-1] and len(head) < MAX_HEADER:
+            more = bytes(self.scope.read_bytes(HEADER_PEEK))
+            if not more:
+                break
+            head += more
+        start_idx = head.find(b'#')
+        if start_idx == -1 or start_idx + 1 >= len(head):
+            raise ValueError("Invalid block header")
+        data_start = start_idx + 2 + int(head[start_idx + 1:start_idx + 2])
+        if len(head) < data_start:
+            head += bytes(self.scope.read_bytes(data_start - len(head)))
+        data_length = int(head[start_idx + 2:data_start])
+
+        if out is None:
+            out = np.empty(data_length, dtype=np.uint8)
+        buf = out.reshape(-1).view(np.uint8)
+        if buf.size < data_length:
+            raise ValueError(f"Buffer of {buf.size} bytes is too small for {data_length} bytes.")
+        data = buf[:data_length].view(dtype)
+        itemsize = data.itemsize
+
+        # the header read may already contain the first bytes of the payload
+        first = head[data_start:data_start + data_length]
+        buf[:len(first)] = np.frombuffer(first, dtype=np.uint8)
+        pos = len(first)
+        delivered = 0
+        while True:
+            complete = pos // itemsize
+            if consumer is not None and complete > delivered:
+                consumer(data[delivered:complete], delivered)
+                delivered = complete
+            if pos >= data_length:
+                break
+            # pyvisa has no readinto, every chunk is copied once into the buffer
+            chunk = self.scope.read_bytes(min(chunk_size, data_length - pos))
+            buf[pos:pos + len(chunk)] = np.frombuffer(chunk, dtype=np.uint8)
+            pos += len(chunk)
+        trailer = head[data_start + data_length:]
+        if len(trailer) < len(WF_TRAILER):
+            self.scope.read_bytes(len(WF_TRAILER) - len(trailer))
+        return data
+
     def parse_waveform_block(self, raw):
-        # Find start of block marker
-        start_idx = raw.find(b'#')
+        """ADC codes of a complete WF? answer as writable int8 array, raw is not referenced any more"""
+        # the block marker comes after the response header
+        start_idx = raw.find(b'#', 0, MAX_HEADER)
         if start_idx == -1:
             raise ValueError("Invalid block header")
 
         header_length = int(raw[start_idx + 1 : start_idx + 2])
         data_length = int(raw[start_idx + 2 : start_idx + 2 + header_length])
         data_start = start_idx + 2 + header_length
-        data_end = data_start + data_length
+        return np.frombuffer(raw, dtype=np.int8, count=data_length, offset=data_start).copy()
 
-        # Extract the waveform byte data
-        data_bytes = raw[data_start:data_end]
-        waveform = np.frombuffer(data_bytes, dtype=np.uint8) 
-        waveform = waveform.astype(np.int8)
-        return waveform
     def get_sample(self,channel=1,n_points=1000):
-        times = scope.get_relative_time_axis(n_points=n_points)
-        raw = scope.get_waveform_binary(channel=channel,n_points=n_points)
-        waveform = scope.parse_waveform_block(raw)
+        times = self.get_relative_time_axis(n_points=n_points)
+        raw = self.get_waveform_binary(channel=channel,n_points=n_points)
+        waveform = self.parse_waveform_block(raw)
         return [times, waveform]
     def plot_waveform(self, times, waveform):
+        import matplotlib.pyplot as plt
         plt.figure(figsize=(10, 4))
         plt.plot(times * 1e6, waveform)  # Time in microseconds
         plt.title("Captured Waveform")
@@ -194,6 +425,7 @@ class SDS8XX:
         plt.show()
         
 #--- Measurement stuff ---
+    @traced("scope.query_meas")
     def query_meas(self, max_attempts=100, delay=0.01, command="C1:PAVA? RMS", unit="V"):
         """
         Tries to query COMMAND value from C[channel] up to max_attempts.
@@ -203,18 +435,65 @@ class SDS8XX:
         for attempt in range(max_attempts):
             self.write(command)
             raw = self.read_raw()
-
-            response = raw.decode("utf-8", errors="ignore").strip()
-            parts = response.split(",")
-            if len(parts) == 2 and "****" not in parts[1]:
-                try:
-                    value = parts[1].replace(unit, "").strip()
-                    return float(value)
-                except ValueError:
-                    pass  # Fall through to retry
+            value = self.parse_meas(raw.decode("utf-8", errors="ignore").strip(), unit)
+            if value is not None:
+                if tracer.enabled:
+                    tracer.count_attempts(command, attempt + 1)
+                return value
             time.sleep(delay)
+        if tracer.enabled:
+            tracer.count_attempts(command, max_attempts)
         raise ValueError(f"Failed to get valid {command} value after {max_attempts} attempts.")
 
+    @staticmethod
+    def parse_meas(response, unit):
+        """value of a response like C1:PAVA RMS,1.23E-01V, None if it is **** or malformed"""
+        parts = response.split(",")
+        if len(parts) != 2 or "****" in parts[1]:
+            return None
+        try:
+            return float(parts[1].replace(unit, "").strip())
+        except ValueError:
+            return None
+
+    @staticmethod
+    def meas_command(source, parameter):
+        """PAVA? for a channel like C1, MEAD? for a channel pair like C1-C2"""
+        kind = "MEAD" if "-" in source else "PAVA"
+        return f"{source}:{kind}? {parameter}"
+
+    def query_measurements(self, items, max_attempts=100, delay=0.01):
+        """
+        Queries several measurements in one round trip, items are (source, parameter)
+        like ("C1", "RMS") or ("C1-C2", "PHA"). The commands are joined with semicolons,
+        the scope answers them in one line. Fields that come back as **** are queried again,
+        the valid ones are kept. Returns {source: {parameter: value}}.
+        """
+        commands = [self.meas_command(source, parameter) for source, parameter in items]
+        values = [None] * len(items)
+        missing = list(range(len(items)))
+        for attempt in range(max_attempts):
+            self.write(";".join(commands[i] for i in missing))
+            parts = self.read_raw().decode("utf-8", errors="ignore").strip().split(";")
+            if len(parts) == len(missing):
+                for i, part in zip(missing, parts):
+                    values[i] = self.parse_meas(part.strip(), MEAS_UNITS[items[i][1]])
+            missing = [i for i in missing if values[i] is None]
+            if not missing:
+                if tracer.enabled:
+                    tracer.count_attempts("batch", attempt + 1)
+                break
+            time.sleep(delay)
+        else:
+            if tracer.enabled:
+                tracer.count_attempts("batch", max_attempts)
+            raise ValueError(f"Failed to get valid {', '.join(commands[i] for i in missing)} "
+                             f"values after {max_attempts} attempts.")
+        record = {}
+        for (source, parameter), value in zip(items, values):
+            record.setdefault(source, {})[parameter] = value
+        return record
+
     def query_rms(self, channel):
         cmd = f"C{channel}:PAVA? RMS"
         return self.query_meas(command=cmd, unit="V") 
@@ -231,8 +510,97 @@ class SDS8XX:
         cmd = f"C{channel1}-C{channel2}:MEAD? PHA"
         return self.query_meas(command=cmd, unit="°")
 
+    # --- Measurement statistics ---
+    def setup_statistics(self, items):
+        """
+        Configures the advanced measurement items P1..Pn and turns on their statistics.
+        items: list of (type, source1, source2), e.g. ("RMS", "C1", None) or ("PHA", "C1", "C2")
+        """
+        self.write_setting("MEAS", ":MEASure ON")
+        self.write_setting("MEAS:MODE", ":MEASure:MODE ADVanced")
+        self.write_setting("MEAS:LINE", f":MEASure:ADVanced:LINenumber {len(items)}")
+        for n, (kind, source1, source2) in enumerate(items, 1):
+            self.write_setting(f"P{n}", f":MEASure:ADVanced:P{n} ON")
+            self.write_setting(f"P{n}:SRC1", f":MEASure:ADVanced:P{n}:SOURce1 {source1}")
+            if source2:
+                self.write_setting(f"P{n}:SRC2", f":MEASure:ADVanced:P{n}:SOURce2 {source2}")
+            self.write_setting(f"P{n}:TYPE", f":MEASure:ADVanced:P{n}:TYPE {kind}")
+        self.write_setting("MEAS:STAT", ":MEASure:ADVanced:STATistics ON")
+
+    def reset_statistics(self):
+        self.write(":MEASure:ADVanced:STATistics:RESet")
+
+    def query_statistics(self, item):
+        """
+        Statistics of measurement item P<item> as dict with current, mean, max, min, stdev and count.
+        Invalid values (****) are nan.
+        """
+        parts = self.query(f":MEASure:ADVanced:P{item}:STATistics? ALL").split(",")
+        stats = {}
+        for key, value in zip(parts[::2], parts[1::2]):
+            key = STAT_KEYS.get(key.strip().split(":")[-1].upper())
+            if key is not None:
+                stats[key] = self.parse_value(value)
+        stats["count"] = int(stats["count"]) if stats.get("count", 0) > 0 else 0
+        return stats
+
+    @staticmethod
+    def parse_value(value):
+        """float of a measurement value with or without unit, nan for ****"""
+        match = re.match(r"\s*[-+]?(\d+\.?\d*|\.\d+)([eE][-+]?\d+)?", value)
+        return float(match.group(0)) if match else float("nan")
+
+    @traced("scope.measure_statistics")
+    def measure_statistics(self, n_items, count, timeout=STAT_TIMEOUT, delay=0.02):
+        """
+        Restarts the statistics and waits until they counted count acquisitions,
+        then returns the statistics of P1..Pn_items.
+        Every value of the statistics comes from its own acquisition, unlike repeated
+        PAVA? queries that can return the same measurement several times.
+        """
+        self.reset_statistics()
+        start = time.monotonic()
+        # all items are updated by the same acquisitions, polling the last one is enough
+        while True:
+            counted = self.parse_value(self.query(f":MEASure:ADVanced:P{n_items}:STATistics? COUNt").split(",")[-1])
+            if counted >= count:
+                break
+            elapsed = time.monotonic() - start
+            if elapsed > timeout:
+                raise ValueError(f"Measurement statistics counted {counted} of {count} acquisitions.")
+            # sleep about as long as the missing acquisitions take
+            wait = elapsed / counted * (count - counted) if counted > 0 else delay
+            time.sleep(max(wait, delay))
+        return [self.query_statistics(n) for n in range(1, n_items + 1)]
+
     def clamp_timebase(self, value, valid_options=constants.VALID_TIMEBASERANGES):
         valid = [tb for tb in valid_options if tb <= value]
         return max(valid) if valid else min(valid_options)
 
 
+class Waveform:
+    '''
+    ADC codes of one channel with the settings needed to convert them.
+    Volts are computed per request, the codes may be a view of a memory mapped file.
+    '''
+    def __init__(self, codes, vdiv, offset, dt, codes_per_div=CODES_PER_DIV):
+        self.codes = codes
+        self.vdiv = vdiv
+        self.offset = offset
+        self.dt = dt
+        self.codes_per_div = codes_per_div
+
+    def __len__(self):
+        return len(self.codes)
+
+    def volts(self, start=0, stop=None):
+        return self.codes[start:stop] * (self.vdiv / self.codes_per_div) - self.offset
+
+    def chunks(self, size=BLOCK_CHUNK):
+        """yields start index and volts of consecutive parts of the record"""
+        for start in range(0, len(self.codes), size):
+            yield start, self.volts(start, start + size)
+
+    def time(self, start=0, stop=None):
+        stop = len(self.codes) if stop is None else stop
+        return np.arange(start, stop) * self.dt
@@ -1,9 +1,18 @@
+import hashlib
+import json
+from typing import Literal, Optional
 from pydantic import BaseModel, Field
 
 MAX_AWG_FREQ = 99999999
 #model for awg connect request
 class PortRequest(BaseModel):
     port: str
+#model for adding a rig (AWG + scope pair)
+class RigRequest(BaseModel):
+    name: str
+    awg_port: str
+    awg_model: str = "FY6900"
+    scope_resource: Optional[str] = None
 #settings for the Bodeplotter
 class BodeSettings(BaseModel):
     start_freq: float = Field(..., gt=0, lt=MAX_AWG_FREQ)
@@ -12,3 +21,43 @@ class BodeSettings(BaseModel):
     n_samples: int = Field(..., gt=0, lt=100)
     amplitude: float = Field(..., ge=0.1, le=5.0)
     tolerance: float = Field(default=0.2, ge=0, le=1.0)
+    mode: Literal["meas", "waveform", "broadband", "hwsweep"] = "meas"
+    sweep: Literal["log", "adaptive"] = "log"
+    max_gain_error: float = Field(default=0.5, gt=0)
+    max_phase_error: float = Field(default=5.0, gt=0)
+    sampling: Literal["fixed", "adaptive", "scope"] = "fixed"
+    target_gain_err: float = Field(default=0.002, gt=0)
+    target_phase_err: float = Field(default=0.2, gt=0)
+    autorange: bool = False
+    sweep_time: float = Field(default=1.0, gt=0, lt=1000)
+
+#measured points to fit a rational model to
+class FitRequest(BaseModel):
+    freq: list[float]
+    gain: list[float]
+    phase: list[float]
+    max_order: int = Field(default=8, ge=1, le=20)
+    points: int = Field(default=500, gt=1, le=10000)
+
+#golden mask for production tests, gain limits as ratio, phase limits in degrees
+class MaskRequest(BaseModel):
+    name: str
+    freq: list[float]
+    gain_lower: list[float]
+    gain_upper: list[float]
+    phase_lower: list[float]
+    phase_upper: list[float]
+    params: Optional[dict] = None
+
+#golden mask from an archived run of a golden unit
+class GoldenRequest(BaseModel):
+    name: str
+    run_id: str
+    gain_tol_db: float = Field(default=1.0, gt=0)
+    phase_tol: float = Field(default=5.0, gt=0)
+
+
+def params_hash(params: dict) -> str:
+    """short stable hash of a get_params() snapshot"""
+    data = json.dumps(params, sort_keys=True, default=str)
+    return hashlib.sha1(data.encode()).hexdigest()[:12]
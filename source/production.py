@@ -0,0 +1,232 @@
+'''
+Created on 18.10.26
+
+@author: Dennis Rathgeb
+
+Pass/fail test of a unit against a golden mask, for end of line testing.
+A mask has lower and upper limits of gain and phase over frequency. Every point is checked
+as soon as it is measured: the test stops at the first point that is clearly outside,
+points close to a limit (relative to the band or to their own noise) are measured again
+with more samples, points well inside are not touched again.
+'''
+
+import json
+import os
+import time
+
+import numpy as np
+
+from sample_stats import angle_diff
+
+# a point is marginal if it is closer to a limit than this fraction of the half band
+MARGINAL_BAND = 0.1
+# or closer than this many standard deviations of its own samples
+UNCERTAINTY_SIGMAS = 3
+# marginal points are measured again at most this often, with more samples each time
+MAX_REMEASURE = 2
+REMEASURE_SAMPLE_FACTOR = 4
+
+PASS = "pass"
+MARGINAL = "marginal"
+FAIL = "fail"
+RANK = {PASS: 0, MARGINAL: 1, FAIL: 2}
+
+
+class GoldenMask:
+    '''
+    Gain limits (linear ratio like the measured gain) and phase limits (degrees) over frequency.
+    The limits are interpolated over log f, gain in dB. params are the sweep settings to test with.
+    '''
+    def __init__(self, name, freq, gain_lower, gain_upper, phase_lower, phase_upper, params=None):
+        order = np.argsort(freq)
+        self.name = name
+        self.freq = np.asarray(freq, dtype=float)[order]
+        self.gain_lower = np.asarray(gain_lower, dtype=float)[order]
+        self.gain_upper = np.asarray(gain_upper, dtype=float)[order]
+        self.phase_lower = np.asarray(phase_lower, dtype=float)[order]
+        self.phase_upper = np.asarray(phase_upper, dtype=float)[order]
+        self.params = params or {}
+
+    @classmethod
+    def from_golden(cls, name, freq, gain, phase, gain_tol_db, phase_tol, params=None):
+        """mask of +-gain_tol_db and +-phase_tol degrees around the response of a golden unit"""
+        order = np.argsort(freq)
+        freq = np.asarray(freq, dtype=float)[order]
+        gain = np.asarray(gain, dtype=float)[order]
+        phase = np.degrees(np.unwrap(np.radians(np.asarray(phase, dtype=float)[order])))
+        factor = 10 ** (gain_tol_db / 20)
+        return cls(name, freq, gain / factor, gain * factor, phase - phase_tol, phase + phase_tol, params)
+
+    def covers(self, freq):
+        return self.freq[0] <= freq <= self.freq[-1]
+
+    def limits(self, freq):
+        """gain limits in dB and phase limits in degrees at freq"""
+        x = np.log10(freq)
+        xp = np.log10(self.freq)
+        gain = (np.interp(x, xp, 20 * np.log10(self.gain_lower)), np.interp(x, xp, 20 * np.log10(self.gain_upper)))
+        phase = (np.interp(x, xp, self.phase_lower), np.interp(x, xp, self.phase_upper))
+        return gain, phase
+
+    def check(self, freq, gain, phase, stats=None):
+        """status of a point and its margin (1 in the middle of the band, 0 on a limit, < 0 outside)"""
+        (g_lo, g_hi), (p_lo, p_hi) = self.limits(freq)
+        stats = stats or {}
+        gain_db = 20 * np.log10(max(gain, 1e-12))
+        gain_std_db = 20 / np.log(10) * stats.get("gain_std", 0.0) / max(gain, 1e-12)
+        results = [
+            classify(gain_db - (g_lo + g_hi) / 2, (g_hi - g_lo) / 2, gain_std_db),
+            classify(angle_diff(phase, (p_lo + p_hi) / 2), (p_hi - p_lo) / 2, stats.get("phase_std", 0.0)),
+        ]
+        status = max((s for s, _ in results), key=RANK.get)
+        return status, min(m for _, m in results)
+
+    def to_dict(self):
+        return {
+            "name": self.name,
+            "freq": self.freq.tolist(),
+            "gain_lower": self.gain_lower.tolist(),
+            "gain_upper": self.gain_upper.tolist(),
+            "phase_lower": self.phase_lower.tolist(),
+            "phase_upper": self.phase_upper.tolist(),
+            "params": self.params,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data["name"], data["freq"], data["gain_lower"], data["gain_upper"],
+                   data["phase_lower"], data["phase_upper"], data.get("params"))
+
+
+def classify(deviation, half_band, std):
+    """status and margin of a deviation from the band center"""
+    deviation = abs(float(deviation))
+    half_band = max(float(half_band), 1e-12)
+    uncertainty = UNCERTAINTY_SIGMAS * float(std or 0.0)
+    margin = (half_band - deviation) / half_band
+    if deviation > half_band + uncertainty:
+        return FAIL, margin
+    if deviation > half_band - max(uncertainty, MARGINAL_BAND * half_band):
+        return MARGINAL, margin
+    return PASS, margin
+
+
+class MaskStore:
+    '''
+    Golden masks by name, kept in a json file if a path is given.
+    '''
+    def __init__(self, path=None):
+        self.path = path
+        self.masks = {}
+        if path and os.path.exists(path):
+            with open(path) as f:
+                for name, data in json.load(f).items():
+                    self.masks[name] = GoldenMask.from_dict(data)
+
+    def get(self, name):
+        return self.masks.get(name)
+
+    def put(self, mask):
+        self.masks[mask.name] = mask
+        self.save()
+
+    def remove(self, name):
+        self.masks.pop(name, None)
+        self.save()
+
+    def list(self):
+        return [{"name": m.name, "start_freq": float(m.freq[0]), "stop_freq": float(m.freq[-1]),
+                 "points": len(m.freq), "params": m.params} for m in self.masks.values()]
+
+    def save(self):
+        if not self.path:
+            return
+        with open(self.path, "w") as f:
+            json.dump({name: mask.to_dict() for name, mask in self.masks.items()}, f)
+
+
+def remeasure(bode, freq):
+    """
+    Measures freq again with REMEASURE_SAMPLE_FACTOR times the samples.
+    Like BodePlotter.measure_point an instrument error doesn't end the test: the instruments
+    are reconnected and None is returned, the point counts as unmeasured then.
+    """
+    n_samples = bode.n_samples
+    bode.n_samples = n_samples * REMEASURE_SAMPLE_FACTOR
+    try:
+        return bode.collect_data_sample(freq, bode.timebase_for(freq))
+    except Exception as e:
+        print("for freq %d remeasurement failed: %s" % (freq, e))
+        if not bode.recover_instruments():
+            raise RuntimeError(f"Instruments not answering after remeasuring {freq:g} Hz: {e}") from e
+        return None
+    finally:
+        bode.n_samples = n_samples
+
+
+def run_test(bode, mask, abort_on_fail=True):
+    """
+    Sweeps with the mask's parameters and checks each point as it arrives.
+    Returns the verdict: pass only if every measured point passes and no point inside
+    the mask failed to measure. An error that ends the sweep fails the test, it is in the verdict.
+    """
+    started = time.perf_counter()
+    bode.set_params(mask.params)
+    bode.setup_run()
+    # broadband and hwsweep measure all points in one capture, they can't repeat a single one
+    can_remeasure = bode.mode not in ("broadband", "hwsweep")
+    points = []
+    unmeasured = []
+    failed_at = None
+    error = None
+    generator = bode.sweep_points()
+    try:
+        for f, g, p in generator:
+            if f <= 0 or not mask.covers(f):
+                continue
+            status, margin = mask.check(f, g, p, bode.last_stats)
+            n_remeasured = 0
+            while status == MARGINAL and can_remeasure and n_remeasured < MAX_REMEASURE:
+                result = remeasure(bode, f)
+                n_remeasured += 1
+                if result is None:
+                    # the instruments failed on this point, its marginal reading decides nothing
+                    unmeasured.append(f)
+                    break
+                f_new, g_new, p_new = result
+                if f_new <= 0:
+                    continue
+                f, g, p = f_new, g_new, p_new
+                status, margin = mask.check(f, g, p, bode.last_stats)
+            if unmeasured and unmeasured[-1] == f:
+                continue
+            if status == MARGINAL:
+                # still marginal with the best estimate, only the limits decide now
+                status = PASS if margin >= 0 else FAIL
+            points.append({"freq": f, "gain": g, "phase": p, "status": status,
+                           "margin": float(margin), "remeasured": n_remeasured})
+            if status == FAIL and failed_at is None:
+                failed_at = f
+                if abort_on_fail:
+                    break
+    except Exception as e:
+        print(f"Production test failed: {e}")
+        error = str(e)
+    finally:
+        generator.close()
+
+    if failed_at is None and bode.checkpoint is not None:
+        unmeasured += [p["freq"] for p in bode.checkpoint.failed() if mask.covers(p["freq"])]
+    return {
+        "mask": mask.name,
+        "verdict": PASS if failed_at is None and error is None and not unmeasured and points else FAIL,
+        "aborted": (failed_at is not None and abort_on_fail) or error is not None,
+        "failed_at": failed_at,
+        "error": error,
+        "unmeasured": sorted(unmeasured),
+        "n_points": len(points),
+        "n_remeasured": sum(p["remeasured"] > 0 for p in points),
+        "min_margin": min((p["margin"] for p in points), default=None),
+        "duration": time.perf_counter() - started,
+        "points": points,
+    }
@@ -0,0 +1,154 @@
+'''
+Created on 18.10.26
+
+@author: Dennis Rathgeb
+
+Registry of several benches (AWG + scope pairs) driven from one server.
+Every rig owns its BodePlotter and a worker thread that runs the queued sweep jobs
+one after another, so the rigs measure in parallel.
+'''
+
+import itertools
+import queue
+import threading
+import time
+from collections import deque
+
+from bode import BodePlotter
+from streaming import SweepBroadcast
+
+# finished jobs kept per rig for status and streaming
+MAX_JOB_HISTORY = 20
+
+
+class Rig:
+    def __init__(self, name, awg, scope, archive=None, calibration_cache=None, settle_model=None):
+        self.name = name
+        self.awg = awg
+        self.scope = scope
+        self.archive = archive
+        self.bode = BodePlotter(awg, scope)
+        self.bode.calibration_cache = calibration_cache
+        if settle_model is not None:
+            self.bode.settle_model = settle_model
+        self.jobs = queue.Queue()
+        self.history = deque(maxlen=MAX_JOB_HISTORY)
+        self.current = None
+        self.job_ids = itertools.count(1)
+        self.thread = threading.Thread(target=self.worker, name=f"rig-{name}", daemon=True)
+        self.thread.start()
+
+    def submit(self, params):
+        """queues a sweep with the given parameters, returns the job"""
+        job = {
+            "id": next(self.job_ids),
+            "status": "queued",
+            "params": params,
+            "broadcast": SweepBroadcast(params),
+            "error": None,
+            "run_id": None,
+            "queued": time.time(),
+        }
+        self.history.append(job)
+        self.jobs.put(job)
+        return job
+
+    def get_job(self, job_id):
+        for job in self.history:
+            if job["id"] == job_id:
+                return job
+        return None
+
+    def worker(self):
+        while True:
+            job = self.jobs.get()
+            if job is None:
+                break
+            self.current = job
+            job["status"] = "running"
+            try:
+                self.run_job(job)
+                job["status"] = "done"
+            except Exception as e:
+                print(f"Rig {self.name}: job {job['id']} failed: {e}")
+                job["status"] = "failed"
+                job["error"] = str(e)
+            finally:
+                job["broadcast"].finish(job["error"])
+                self.current = None
+        self.awg.disconnect()
+        self.scope.disconnect()
+
+    def run_job(self, job):
+        self.bode.set_params(job["params"])
+        self.bode.setup_run()
+        run = None
+        if self.archive is not None:
+            run = self.archive.create_run(self.bode.get_params(), self.scope.idn)
+            job["run_id"] = run.run_id
+            if self.bode.checkpoint is not None:
+                self.bode.checkpoint.attach(run.checkpoint_path)
+        try:
+            for freq, gain, phase in self.bode.sweep_points():
+                if freq > 0:
+                    job["broadcast"].publish(freq, gain, phase)
+                    if run is not None:
+                        run.append(freq, gain, phase, self.bode.last_stats, self.bode.last_samples)
+        finally:
+            if run is not None:
+                run.close()
+
+    def stop(self):
+        """
+        Stops the worker after the running job, queued jobs are dropped.
+        The instruments are disconnected when the worker is done.
+        """
+        while not self.jobs.empty():
+            job = self.jobs.get_nowait()
+            if job is not None:
+                job["status"] = "cancelled"
+                job["broadcast"].finish()
+        self.jobs.put(None)
+
+    def info(self):
+        return {
+            "name": self.name,
+            "scope": self.scope.idn,
+            "awg_port": getattr(self.awg, "port", None),
+            "status": "running" if self.current else "idle",
+            "current_job": self.current["id"] if self.current else None,
+            "queued": self.jobs.qsize(),
+            "jobs": [dict({key: job[key] for key in ("id", "status", "error", "run_id")},
+                          n_points=len(job["broadcast"].points)) for job in self.history],
+        }
+
+
+class RigRegistry:
+    def __init__(self):
+        self.rigs = {}
+        self.lock = threading.Lock()
+
+    def add(self, rig):
+        with self.lock:
+            if rig.name in self.rigs:
+                raise ValueError(f"Rig {rig.name} already exists.")
+            self.rigs[rig.name] = rig
+
+    def get(self, name):
+        return self.rigs.get(name)
+
+    def remove(self, name):
+        with self.lock:
+            rig = self.rigs.pop(name, None)
+        if rig is not None:
+            rig.stop()
+        return rig
+
+    def used_scopes(self):
+        return [rig.scope.resource for rig in self.rigs.values()]
+
+    def used_awg_ports(self):
+        return [getattr(rig.awg, "port", None) for rig in self.rigs.values()]
+
+    def list(self):
+        return [rig.info() for rig in self.rigs.values()]
@@ -0,0 +1,140 @@
+'''
+Created on 18.10.26
+
+@author: Dennis Rathgeb
+
+Statistics for averaging samples, one by one while measuring
+or vectorized for many points at once.
+'''
+
+import math
+import warnings
+from collections import deque
+
+import numpy as np
+
+
+def angle_diff(a, b):
+    """Return signed shortest distance between two angles in degrees."""
+    return (a - b + 180) % 360 - 180
+
+
+# samples a StreamingStats filters again on every add, more than n_samples allows
+STATS_WINDOW = 100
+# samples further than MAD_LIMIT robust standard deviations (1.4826 * MAD) from the median are outliers
+MAD_LIMIT = 3.5
+# below this many samples the MAD is no usable scale, only the tolerance applies
+MIN_MAD_SAMPLES = 5
+
+
+class StreamingStats:
+    '''
+    Median and mean/std of the inliers of a sample stream.
+    The last STATS_WINDOW samples are filtered again on every add: a sample is an inlier
+    if it is within tolerance of their median (the rule of BodePlotter.filter_outliers)
+    and within MAD_LIMIT robust standard deviations of it, so an outlier among the
+    first samples does not stay in the mean. Without any inlier the median is the mean.
+    For circular data (phase in degrees) the tolerance is relative to 180 degrees
+    and samples are unwrapped against the median of the ones before.
+    '''
+    def __init__(self, tolerance, circular=False, window=STATS_WINDOW):
+        self.tolerance = tolerance
+        self.circular = circular
+        self.samples = deque(maxlen=window)
+        self.median = 0.0
+        self.count = 0
+        self.mean = 0.0
+        self.std = 0.0
+
+    @property
+    def stderr(self):
+        if self.count == 0:
+            return math.inf
+        return self.std / math.sqrt(self.count)
+
+    def add(self, x):
+        """adds a sample, returns True if it is an inlier"""
+        if self.circular and self.samples:
+            x = self.median + angle_diff(x, self.median)
+        self.samples.append(x)
+        data = np.array(self.samples)
+        self.median = float(np.median(data))
+        dev = data - self.median
+        if self.circular:
+            dev = angle_diff(dev, 0)
+            mask = np.abs(dev) < self.tolerance * 180
+        else:
+            mask = np.abs(dev) < self.tolerance * abs(self.median)
+        if len(data) >= MIN_MAD_SAMPLES:
+            scale = 1.4826 * np.median(np.abs(dev))
+            if scale > 0:
+                mask &= np.abs(dev) <= MAD_LIMIT * scale
+        inliers = data[mask]
+        self.count = len(inliers)
+        self.mean = float(inliers.mean()) if self.count else self.median
+        self.std = float(inliers.std(ddof=1)) if self.count > 1 else 0.0
+        return bool(mask[-1])
+
+    def value(self):
+        """mean of the inliers, wrapped back to +-180 degrees for circular data"""
+        if self.circular:
+            return angle_diff(self.mean, 0)
+        return self.mean
+
+
+def reduce_batch(rms1, rms2, phase, tolerance):
+    """
+    Filters outliers and averages many points in one vectorized pass.
+    rms1, rms2 and phase are 2-D arrays (points x samples), missing samples are NaN.
+    RMS samples are filtered against the median like BodePlotter.filter_outliers.
+    Phase uses circular statistics: samples are filtered against the circular mean
+    and averaged as unit vectors, so values around +-180 degrees don't cancel out.
+    Returns a dict of 1-D arrays, points without inliers get NaN.
+    """
+    rms1 = np.asarray(rms1, dtype=float)
+    rms2 = np.asarray(rms2, dtype=float)
+    phase = np.asarray(phase, dtype=float)
+
+    def filtered_mean(x):
+        with warnings.catch_warnings():
+            # points without any sample are expected
+            warnings.simplefilter("ignore", RuntimeWarning)
+            median = np.nanmedian(x, axis=1, keepdims=True)
+        mask = np.abs(x - median) < tolerance * np.abs(median)
+        count = mask.sum(axis=1)
+        values = np.where(mask, x, 0.0)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean = values.sum(axis=1) / count
+            var = (np.where(mask, x - mean[:, None], 0.0) ** 2).sum(axis=1) / (count - 1)
+        return mean, np.sqrt(np.where(count > 1, var, 0.0)), count
+
+    m1, std1, n1 = filtered_mean(rms1)
+    m2, std2, n2 = filtered_mean(rms2)
+
+    rad = np.radians(phase)
+    valid = ~np.isnan(rad)
+    s = np.where(valid, np.sin(rad), 0.0)
+    c = np.where(valid, np.cos(rad), 0.0)
+    center = np.degrees(np.arctan2(s.sum(axis=1), c.sum(axis=1)))
+    mask = valid & (np.abs(angle_diff(phase, center[:, None])) < tolerance * 180)
+    n_phase = mask.sum(axis=1)
+    sin_sum = np.where(mask, s, 0.0).sum(axis=1)
+    cos_sum = np.where(mask, c, 0.0).sum(axis=1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        r = np.hypot(sin_sum, cos_sum) / n_phase
+        phase_std = np.degrees(np.sqrt(np.maximum(-2 * np.log(np.clip(r, 1e-12, 1.0)), 0.0)))
+        gain = m2 / m1
+        gain_std = gain * np.hypot(std1 / m1, std2 / m2)
+    phase_mean = np.degrees(np.arctan2(sin_sum, cos_sum))
+
+    count = np.minimum(np.minimum(n1, n2), n_phase)
+    empty = count == 0
+    return {
+        "gain": np.where(empty, np.nan, gain),
+        "phase": np.where(empty, np.nan, phase_mean),
+        "rms1": m1,
+        "rms2": m2,
+        "count": count,
+        "gain_std": np.where(empty, np.nan, gain_std),
+        "phase_std": np.where(empty, np.nan, phase_std),
+    }
@@ -0,0 +1,122 @@
+'''
+Created on 18.10.26
+
+@author: Dennis Rathgeb
+
+Session manager for the AWG and scope of the main bench.
+Remembers the IDN of every probed VISA resource and the last used ports in a json file,
+so the instruments can be reopened at startup without scanning all USB resources.
+A background health check reconnects them after a USB drop. Instruments of rigs are not
+checked here, their sweeps reconnect them when a point fails (BodePlotter.recover_instruments).
+'''
+
+import asyncio
+import json
+import os
+import threading
+
+from awg_factory import awg_factory
+from oscillatordrivers.sds8xx import SDS8XX
+
+# seconds between two health checks
+HEALTH_INTERVAL = 5.0
+
+
+class SessionManager:
+    def __init__(self, path=None):
+        self.path = path
+        self.state = {"scope": None, "awg": None, "idn": {}}
+        if path and os.path.exists(path):
+            with open(path) as f:
+                self.state.update(json.load(f))
+        self.awg = None
+        self.scope = None
+        self.lock = threading.Lock()
+        # held while the main bench sweeps, tests or calibrates, health checks are skipped then
+        self.bench_lock = threading.Lock()
+
+    def save(self):
+        if not self.path:
+            return
+        with open(self.path, "w") as f:
+            json.dump(self.state, f, indent=1)
+
+    def connect_scope(self, resource=None, scan=True):
+        """
+        Returns the open scope if it still answers, otherwise opens resource,
+        the last used scope or the first one found by a scan. None if there is none.
+        """
+        with self.lock:
+            if self.scope is not None and self.scope.ping():
+                return self.scope
+            if self.scope is not None:
+                self.scope.disconnect()
+                self.scope = None
+            scope = SDS8XX()
+            last = resource or (self.state["scope"] or {}).get("resource")
+            connected = last is not None and scope.connect(resource=last, known_idn=self.state["idn"])
+            if not connected and scan and resource is None:
+                connected = scope.connect(known_idn=self.state["idn"])
+            if not connected:
+                self.save()
+                return None
+            self.scope = scope
+            self.state["scope"] = {"resource": scope.resource, "idn": scope.idn}
+            self.save()
+            return scope
+
+    def connect_awg(self, port=None, model=None, baud_rate=None):
+        """
+        Returns the open AWG if it is on the same port and still answers,
+        otherwise opens port (default the last used one). None if that fails.
+        """
+        last = self.state["awg"] or {}
+        port = port or last.get("port")
+        model = model or last.get("model")
+        if port is None or model is None:
+            return None
+        with self.lock:
+            if self.awg is not None and getattr(self.awg, "port", None) == port and self.awg.ping():
+                return self.awg
+            if self.awg is not None:
+                try:
+                    self.awg.disconnect()
+                except Exception:
+                    pass
+                self.awg = None
+            awg = awg_factory.get_class_by_name(model)(port, baud_rate)
+            if not awg.connect():
+                return None
+            awg.initialize()
+            self.awg = awg
+            self.state["awg"] = {"port": port, "model": model}
+            self.save()
+            return awg
+
+    def restore(self):
+        """reopens the instruments of the last session, returns awg, scope (None if not available)"""
+        awg = self.connect_awg() if self.state["awg"] else None
+        scope = self.connect_scope(scan=False) if self.state["scope"] else None
+        return awg, scope
+
+    def check(self):
+        """health check of the open instruments, reconnects the ones that stopped answering"""
+        if not self.bench_lock.acquire(blocking=False):
+            return
+        try:
+            with self.lock:
+                for name, device in (("scope", self.scope), ("awg", self.awg)):
+                    if device is not None and not device.ping():
+                        print(f"{name} does not answer, reconnecting")
+                        try:
+                            device.reconnect()
+                        except Exception as e:
+                            print(f"Reconnecting {name} failed: {e}")
+        finally:
+            self.bench_lock.release()
+
+    async def monitor(self, interval=HEALTH_INTERVAL):
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(interval)
+            await loop.run_in_executor(None, self.check)
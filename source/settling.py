@@ -0,0 +1,182 @@
+'''
+Created on 18.10.26
+
+@author: Dennis Rathgeb
+
+Settling of the device under test after a frequency step.
+SettleDetector watches the readings of a point and drops them until two successive ones agree,
+SettleModel learns per frequency band how long that took, so later sweeps wait about that long
+before the first reading instead of padding every point with a fixed delay.
+The model is shared by the main bench and the rigs and written once per sweep.
+'''
+
+import json
+import math
+import os
+import threading
+
+from sample_stats import angle_diff
+
+# successive readings agree if gain changed less than this (relative) and phase less than this (degrees)
+SETTLE_GAIN_TOL = 0.01
+SETTLE_PHASE_TOL = 1.0
+# readings dropped at most, after that everything is kept (noisy points never agree)
+MAX_SETTLE_READINGS = 8
+# readings of the scope per point at most while not settled, repeated ones included
+MAX_SETTLE_READS = 32
+# seconds after the step after which everything is kept, e.g. if the scope repeats one acquisition
+SETTLE_TIMEOUT = 2.0
+# frequency bands of the model
+BINS_PER_DECADE = 5
+# the wait of a band shrinks by this factor every time its point was settled at the first reading
+SHRINK = 0.95
+# span of the detector while a band has no learned wait yet, see SettleDetector
+LEARN_SPAN = 0.5
+# with a learned wait every this many points of a band are checked with LEARN_SPAN,
+# only such a check can show the wait is longer than needed
+VERIFY_EVERY = 4
+# waits below this are dropped, longer ones are capped
+MIN_SETTLE_TIME = 1e-3
+MAX_SETTLE_TIME = 10.0
+
+
+class SettleDetector:
+    '''
+    Filter for the readings (rms1, rms2, phase) of one point.
+    A reading is held back until a later one confirms it, once one is confirmed
+    it is kept with all readings after it and so is everything that follows.
+    Successive readings of a slow transient differ only a little, with span > 0 the confirming
+    reading has to come at least span times the age of the held one later.
+    Identical readings come from the same acquisition and confirm nothing.
+    '''
+    def __init__(self, span=0.0, gain_tol=SETTLE_GAIN_TOL, phase_tol=SETTLE_PHASE_TOL,
+                 max_readings=MAX_SETTLE_READINGS, timeout=SETTLE_TIMEOUT, max_reads=MAX_SETTLE_READS):
+        self.span = span
+        self.gain_tol = gain_tol
+        self.phase_tol = phase_tol
+        self.max_readings = max_readings
+        self.timeout = timeout
+        self.max_reads = max_reads
+        self.reads = 0
+        # readings not confirmed yet, (reading, seconds after the frequency step)
+        self.held = []
+        self.settled = False
+        self.gave_up = False
+        self.discarded = 0
+        self.duplicates = 0
+        # seconds after the frequency step of the first kept reading
+        self.settle_time = None
+
+    def add(self, reading, elapsed):
+        """returns the readings that are kept now, elapsed is the time since the frequency step"""
+        if self.settled or self.gave_up:
+            return [reading]
+        self.reads += 1
+        if self.held and tuple(self.held[-1][0]) == tuple(reading):
+            self.duplicates += 1
+        else:
+            self.held.append((reading, elapsed))
+        while len(self.held) > 1 and elapsed >= self.held[0][1] * (1 + self.span):
+            if self.agree(self.held[0][0], reading):
+                self.settled = True
+                self.settle_time = self.held[0][1]
+                return self.release()
+            self.held.pop(0)
+            self.discarded += 1
+        if self.discarded >= self.max_readings or elapsed >= self.timeout or self.reads >= self.max_reads:
+            self.gave_up = True
+            return self.release()
+        return []
+
+    def release(self):
+        kept = [r for r, _ in self.held]
+        self.held = []
+        return kept
+
+    def agree(self, a, b):
+        rms1_a, rms2_a, phase_a = a
+        rms1_b, rms2_b, phase_b = b
+        if rms1_a <= 0 or rms1_b <= 0:
+            return False
+        gain_a = rms2_a / rms1_a
+        gain_b = rms2_b / rms1_b
+        return (abs(gain_b - gain_a) <= self.gain_tol * max(abs(gain_a), 1e-12)
+                and abs(angle_diff(phase_b, phase_a)) <= self.phase_tol)
+
+
+class SettleModel:
+    '''
+    Wait before the first reading per frequency band, learned from the detector.
+    If a path is given the model is kept in a json file and reused by later sweeps,
+    save writes it if it changed since the last save.
+    '''
+    def __init__(self, path=None):
+        self.path = path
+        self.bins = {}
+        # points per band since the model was loaded, for VERIFY_EVERY
+        self.points = {}
+        self.dirty = False
+        # rigs sweep in parallel threads with the same model
+        self.lock = threading.Lock()
+        if path and os.path.exists(path):
+            with open(path) as f:
+                self.bins = {int(b): t for b, t in json.load(f).items()}
+
+    @staticmethod
+    def bin(freq):
+        return math.floor(math.log10(freq) * BINS_PER_DECADE)
+
+    def predict(self, freq):
+        """seconds to wait after setting freq, 0 for bands not seen yet"""
+        return self.bins.get(self.bin(freq), 0.0)
+
+    def detector(self, freq):
+        """
+        Detector for the next point at freq. Without a learned wait it compares readings further apart,
+        successive ones of a slow transient would agree too early. With one the first readings
+        should be settled already, only every VERIFY_EVERY-th point checks that with the span.
+        """
+        b = self.bin(freq)
+        with self.lock:
+            n = self.points.get(b, 0)
+            self.points[b] = n + 1
+            verify = b not in self.bins or n % VERIFY_EVERY == VERIFY_EVERY - 1
+        return SettleDetector(span=LEARN_SPAN if verify else 0.0)
+
+    def update(self, freq, detector):
+        """learns from the detector of a point measured at freq"""
+        if detector.gave_up:
+            return
+        b = self.bin(freq)
+        with self.lock:
+            wait = self.bins.get(b, 0.0)
+            if detector.discarded == 0:
+                # a detector without span can't tell settled from slowly moving readings
+                if detector.span > 0:
+                    wait *= SHRINK
+            elif detector.settle_time is not None:
+                wait = max(wait, detector.settle_time)
+            wait = min(wait, MAX_SETTLE_TIME)
+            if wait < MIN_SETTLE_TIME:
+                self.bins.pop(b, None)
+            else:
+                self.bins[b] = wait
+            self.dirty = True
+
+    def reset(self):
+        with self.lock:
+            self.bins.clear()
+            self.dirty = True
+        self.save()
+
+    def to_dict(self):
+        """wait per band, keyed by the lower band edge in Hz"""
+        return {f"{10 ** (b / BINS_PER_DECADE):.6g}": t for b, t in sorted(self.bins.items())}
+
+    def save(self):
+        with self.lock:
+            if not self.path or not self.dirty:
+                return
+            with open(self.path, "w") as f:
+                json.dump({str(b): t for b, t in self.bins.items()}, f)
+            self.dirty = False
@@ -0,0 +1,23 @@
+'''
+Simulated SDS8XX and FY6900 for running and benchmarking sweeps without hardware.
+'''
+
+from oscillatordrivers.sds8xx import SDS8XX
+from simulation.model import Bench, SecondOrderModel
+from simulation.fake_visa import SimResourceManager
+from simulation.fake_serial import SimFY6900
+
+# the real ASET delay is 6 s, the simulator only waits this long
+SIM_AUTO_SETUP_DELAY = 0.1
+
+
+def make_instruments(bench=None, scope_latency=None, awg_latency=None):
+    """connected simulated AWG and scope sharing one bench, returns awg, scope, bench"""
+    bench = bench or Bench()
+    awg = SimFY6900(bench, awg_latency)
+    awg.connect()
+    awg.initialize()
+    scope = SDS8XX(rm=SimResourceManager(bench, scope_latency))
+    scope.auto_setup_delay = SIM_AUTO_SETUP_DELAY
+    scope.connect()
+    return awg, scope, bench
@@ -0,0 +1,147 @@
+'''
+Created on 18.10.26
+
+@author: Dennis Rathgeb
+
+Simulated serial port of a FeelTech FY6900.
+Parses the W-commands of the FY6900 driver and updates the bench model.
+'''
+
+import time
+from collections import Counter
+
+import numpy as np
+
+from awgdrivers.fy6900 import FY6900, ARB_POINTS, ARB_MAX_CODE, ARB_WAVE_BASE
+
+SIM_MODEL = "FY6900-60M"
+SIM_UID = "SIM-FY6900-0001"
+# default latency per command in seconds until the unit answers, "*" is used for all others
+DEFAULT_LATENCY = {"*": 0.01}
+# bytes per second of the serial link, for the arbitrary waveform upload
+BYTES_PER_SECOND = 11520
+
+
+class SimSerial:
+    '''
+    Stand-in for serial.Serial. Answers arrive after the latency of their command.
+    '''
+    def __init__(self, bench, latency=None, timeout=1.0):
+        self.bench = bench
+        self.latency = dict(DEFAULT_LATENCY)
+        self.latency.update(latency or {})
+        self.timeout = timeout
+        self.is_open = True
+        self.buffer = b""
+        self.answers = []
+        self.commands = Counter()
+        # sweep registers sent so far, SBE1 starts the sweep with them
+        self.sweep_settings = {}
+        # slot of a running arbitrary upload, the next 2 * ARB_POINTS bytes are its data
+        self.arb_slot = None
+
+    def write(self, data):
+        self.buffer += data
+        while True:
+            if self.arb_slot is not None:
+                if len(self.buffer) < 2 * ARB_POINTS:
+                    break
+                payload, self.buffer = self.buffer[:2 * ARB_POINTS], self.buffer[2 * ARB_POINTS:]
+                codes = np.frombuffer(payload, dtype="<u2")
+                self.bench.arb[self.arb_slot] = codes / ARB_MAX_CODE * 2 - 1
+                self.arb_slot = None
+                self.answers.append((time.monotonic() + len(payload) / BYTES_PER_SECOND, b"HN\n"))
+                continue
+            if b"\n" not in self.buffer:
+                break
+            line, self.buffer = self.buffer.split(b"\n", 1)
+            cmd = line.decode().strip()
+            if not cmd:
+                continue
+            register = cmd[:3]
+            self.commands[register] += 1
+            ready = time.monotonic() + self.latency.get(register, self.latency["*"])
+            if cmd.startswith("DDS_WAVE"):
+                self.arb_slot = int(cmd[8:])
+                self.answers.append((ready, b"W\n"))
+                continue
+            self.answers.append((ready, (self.handle(cmd) + "\n").encode()))
+        return len(data)
+
+    def read_until(self, expected=b"\n"):
+        if not self.answers:
+            time.sleep(self.timeout)
+            return b""
+        ready, answer = self.answers.pop(0)
+        time.sleep(max(0.0, ready - time.monotonic()))
+        return answer
+
+    def read(self, size=1):
+        """first size bytes of the next answer, the rest stays for the next read"""
+        if not self.answers:
+            time.sleep(self.timeout)
+            return b""
+        ready, answer = self.answers.pop(0)
+        time.sleep(max(0.0, ready - time.monotonic()))
+        if len(answer) > size:
+            self.answers.insert(0, (ready, answer[size:]))
+        return answer[:size]
+
+    def reset_input_buffer(self):
+        self.answers = []
+
+    def close(self):
+        self.is_open = False
+
+    def handle(self, cmd):
+        """returns the answer line without LF, W-commands are answered with an empty line"""
+        register, value = cmd[:3], cmd[3:]
+        bench = self.bench
+        if register == "UMO":
+            return SIM_MODEL
+        if register == "UID":
+            return SIM_UID
+        if register == "RMF":
+            return f"{bench.freq:.6f}"
+        if register == "WMF":
+            # the driver sends the frequency in Hz
+            bench.freq = float(value)
+        elif register == "WMA":
+            bench.amplitude = float(value)
+        elif register == "WMO":
+            bench.offset = float(value)
+        elif register == "WMN":
+            bench.output_on = value == "1"
+        elif register in ("SST", "SEN", "STI", "SMO"):
+            self.sweep_settings[register] = float(value)
+        elif register == "SBE":
+            if value == "1":
+                bench.sweep = {
+                    "f1": self.sweep_settings.get("SST", 1000.0),
+                    "f2": self.sweep_settings.get("SEN", 10000.0),
+                    "duration": self.sweep_settings.get("STI", 1.0),
+                    "log": self.sweep_settings.get("SMO", 0) == 1,
+                    "start": time.monotonic(),
+                }
+            else:
+                bench.sweep = None
+        elif register == "WMW":
+            wave = int(value)
+            bench.wave = wave - ARB_WAVE_BASE + 1 if wave >= ARB_WAVE_BASE else 0
+        # WFW, WFP, WFN, ... don't change the simulated signal
+        return ""
+
+
+class SimFY6900(FY6900):
+    '''
+    FY6900 driver talking to the simulated serial port.
+    '''
+    SHORT_NAME = "FY6900-sim"
+
+    def __init__(self, bench, latency=None):
+        FY6900.__init__(self, "SIM")
+        self.bench = bench
+        self.latency = latency
+
+    def open_port(self):
+        return SimSerial(self.bench, self.latency, timeout=self.timeout)
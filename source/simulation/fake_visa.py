@@ -0,0 +1,268 @@
+'''
+Created on 18.10.26
+
+@author: Dennis Rathgeb
+
+Simulated VISA resource of a Siglent SDS8XX.
+Answers the SCPI commands the SDS8XX driver uses from the bench model.
+'''
+
+import time
+from collections import Counter
+
+import numpy as np
+
+from oscillatordrivers.sds8xx import N_DIV_H, N_DIV_V, CODES_PER_DIV
+
+SIM_RESOURCE = "USB0::0xF4EC::0x1011::SIM00001::INSTR"
+SIM_IDN = "Siglent Technologies,SDS824X HD,SIM00001,3.8.12.1.1.3.8"
+MAX_SAMPLE_RATE = 1e9
+MEMORY_DEPTH = 10e6
+# a measurement is updated once per acquisition, but not faster than this
+MIN_ACQ_PERIOD = 0.02
+# signals smaller than this (in divisions peak to peak) can't be measured
+MIN_MEAS_DIVS = 0.1
+# default latency per command keyword in seconds, "*" is used for all others
+DEFAULT_LATENCY = {"*": 0.001, "ASET": 0.5, "WF?": 0.005}
+
+
+class SimResourceManager:
+    '''
+    Stand-in for pyvisa.ResourceManager with one simulated scope.
+    '''
+    def __init__(self, bench, latency=None):
+        self.bench = bench
+        self.latency = latency
+
+    def list_resources(self):
+        return (SIM_RESOURCE,)
+
+    def open_resource(self, resource):
+        if resource != SIM_RESOURCE:
+            raise ValueError(f"Unknown resource {resource}")
+        return SimScopeResource(self.bench, self.latency)
+
+
+class SimScopeResource:
+    def __init__(self, bench, latency=None):
+        self.bench = bench
+        self.latency = dict(DEFAULT_LATENCY)
+        self.latency.update(latency or {})
+        self.timeout = 2000
+        self.pending = b""
+        self.vdiv = {1: 1.0, 2: 1.0}
+        self.tdiv = 1e-3
+        self.wfsu = {"SP": 0, "NP": 0, "FP": 0}
+        self.meas_cache = {}
+        # advanced measurement items P<n>: type and sources, statistics values and last acquisition
+        self.items = {}
+        self.stats = {}
+        self.stats_acq = None
+        # time a triggered single acquisition is complete, reported once by INR?
+        self.single_done = None
+        # time.monotonic of the last trigger, the captured waveform starts there
+        self.trigger_time = 0.0
+        # number of commands per keyword, for benchmarks
+        self.commands = Counter()
+
+    # --- pyvisa resource interface ---
+    def write(self, command):
+        if ";" in command:
+            self.write_joined(command)
+            return
+        keyword = self.keyword(command)
+        self.commands[keyword] += 1
+        time.sleep(self.latency.get(keyword, self.latency["*"]))
+        answer = self.handle(command.strip(), keyword)
+        if answer is not None:
+            self.pending = answer if isinstance(answer, bytes) else (answer + "\n").encode()
+
+    def write_joined(self, command):
+        """semicolon joined commands, one round trip, the answers come in one line joined by semicolons"""
+        parts = [c.strip() for c in command.split(";") if c.strip()]
+        keywords = [self.keyword(c) for c in parts]
+        self.commands.update(keywords)
+        time.sleep(max(self.latency.get(k, self.latency["*"]) for k in keywords))
+        answers = [self.handle(c, k) for c, k in zip(parts, keywords)]
+        answers = [a for a in answers if a is not None]
+        if answers:
+            self.pending = (";".join(answers) + "\n").encode()
+
+    def read_raw(self):
+        raw, self.pending = self.pending, b""
+        return raw
+
+    def read_bytes(self, count, chunk_size=None, break_on_termchar=False):
+        raw, self.pending = self.pending[:count], self.pending[count:]
+        return raw
+
+    def query(self, command):
+        self.write(command)
+        return self.read_raw().decode("utf-8", errors="ignore")
+
+    def close(self):
+        pass
+
+    # --- command handling ---
+    @staticmethod
+    def keyword(command):
+        head = command.strip().split()[0] if command.strip() else ""
+        return head.split(":")[-1].upper()
+
+    @staticmethod
+    def channel(command):
+        return int(command[1]) if command.startswith("C") else 1
+
+    def acquisition(self):
+        """index of the current acquisition, measurements only change between acquisitions"""
+        period = max(N_DIV_H * self.tdiv, MIN_ACQ_PERIOD)
+        return int(time.monotonic() / period)
+
+    def sample_rate(self):
+        return min(MAX_SAMPLE_RATE, MEMORY_DEPTH / (N_DIV_H * self.tdiv))
+
+    def handle(self, command, keyword):
+        args = command.split(None, 1)[1] if " " in command else ""
+        if keyword == "*IDN?":
+            return SIM_IDN
+        if command.upper().startswith(":MEAS"):
+            return self.measure_advanced(command, args)
+        if keyword == "ASET":
+            self.auto_setup()
+        elif keyword == "VDIV":
+            self.vdiv[self.channel(command)] = float(args)
+        elif keyword == "VDIV?":
+            ch = self.channel(command)
+            return f"C{ch}:VDIV {self.vdiv[ch]:.2E}V"
+        elif keyword == "OFST?":
+            return f"C{self.channel(command)}:OFST 0.00E+00V"
+        elif keyword == "TDIV":
+            self.tdiv = float(args)
+        elif keyword == "TDIV?":
+            return f"TDIV {self.tdiv:.2E}S"
+        elif keyword == "SARA?":
+            return f"SARA {self.sample_rate():.2E}Sa/s"
+        elif keyword == "WFSU":
+            parts = args.split(",")
+            self.wfsu.update({key: int(value) for key, value in zip(parts[::2], parts[1::2])})
+        elif keyword == "WF?":
+            return self.waveform(self.channel(command))
+        elif keyword == "PAVA?":
+            return self.measure(command, args)
+        elif keyword == "MEAD?":
+            return self.measure_delay(command, args)
+        elif keyword == "ARM":
+            self.single_done = None
+        elif keyword == "FRTR":
+            self.trigger_time = time.monotonic()
+            self.single_done = self.trigger_time + N_DIV_H * self.tdiv
+        elif keyword == "INR?":
+            done = self.single_done is not None and time.monotonic() >= self.single_done
+            if done:
+                self.single_done = None
+            return f"INR {1 if done else 0}"
+        # STOP, TRMD, CPL, ATTN, ... only change state we don't model
+        return None
+
+    def auto_setup(self):
+        """scales both channels like ASET would, the signal fills about 6 divisions"""
+        for ch in (1, 2):
+            peak, _ = self.bench.signal(ch)
+            self.vdiv[ch] = max(2 * peak / 6, 5e-4)
+        self.tdiv = 1 / (2 * self.bench.freq)
+
+    def visible(self, channel):
+        """False if the signal is too small or clipped for a valid measurement"""
+        peak, _ = self.bench.signal(channel)
+        divs = 2 * peak / self.vdiv[channel]
+        return MIN_MEAS_DIVS <= divs <= N_DIV_V * 1.05
+
+    def cached(self, key, func):
+        acq = self.acquisition()
+        if self.meas_cache.get(key, (None,))[0] != acq:
+            self.meas_cache[key] = (acq, func())
+        return self.meas_cache[key][1]
+
+    def measure(self, command, args):
+        ch = self.channel(command)
+        prefix = f"C{ch}:PAVA {args}"
+        if not self.visible(ch):
+            return f"{prefix},****"
+        if args == "RMS":
+            return f"{prefix},{self.cached(('RMS', ch), lambda: self.bench.rms(ch)):.6E}V"
+        if args == "PKPK":
+            return f"{prefix},{2 * np.sqrt(2) * self.cached(('RMS', ch), lambda: self.bench.rms(ch)):.6E}V"
+        if args == "FREQ":
+            return f"{prefix},{self.bench.freq:.6E}Hz"
+        return f"{prefix},****"
+
+    def measure_delay(self, command, args):
+        prefix = f"{command.split()[0][:-1]} {args}"
+        if args != "PHA" or not (self.visible(1) and self.visible(2)):
+            return f"{prefix},****"
+        return f"{prefix},{self.cached(('PHA',), lambda: self.bench.phase(1, 2)):.4f}°"
+
+    def measure_advanced(self, command, args):
+        """:MEASure:ADVanced items and their statistics, every acquisition adds one value"""
+        path = command.split()[0].upper().split(":")
+        item = next((int(p[1:]) for p in path if p.startswith("P") and p[1:].isdigit()), None)
+        if path[-1].startswith("STAT") and path[-1].endswith("?"):
+            self.update_stats()
+            return self.statistics(item, args.strip().upper())
+        if path[-1].startswith("RES"):
+            self.stats = {}
+            self.stats_acq = self.acquisition()
+        elif item is not None and path[-1].startswith("SOUR"):
+            self.items.setdefault(item, {})["src" + path[-1][-1]] = int(args.strip()[1:])
+        elif item is not None and path[-1] == "TYPE":
+            self.items.setdefault(item, {})["type"] = args.strip().upper()
+        return None
+
+    def item_value(self, item):
+        """one measurement of item, None if it can't be measured"""
+        spec = self.items.get(item, {})
+        kind, ch = spec.get("type"), spec.get("src1", 1)
+        if not self.visible(ch):
+            return None
+        if kind == "RMS":
+            return self.bench.rms(ch)
+        if kind == "FREQ":
+            return self.bench.freq
+        if kind == "PHA" and self.visible(spec.get("src2", 2)):
+            return self.bench.phase(ch, spec.get("src2", 2))
+        return None
+
+    def update_stats(self):
+        """adds the values of the acquisitions since the last update"""
+        acq = self.acquisition()
+        if self.stats_acq is None:
+            self.stats_acq = acq
+        new = min(acq - self.stats_acq, 1000)
+        self.stats_acq = acq
+        for item in self.items:
+            values = self.stats.setdefault(item, [])
+            for _ in range(new):
+                value = self.item_value(item)
+                if value is not None:
+                    values.append(value)
+
+    def statistics(self, item, field):
+        values = np.array(self.stats.get(item, []))
+        if field.startswith("COUN"):
+            return f"{len(values)}"
+        if not len(values):
+            return "CURRent,****,MEAN,****,MAXimum,****,MINimum,****,STDev,****,COUNt,0"
+        std = np.std(values, ddof=1) if len(values) > 1 else 0.0
+        return (f"CURRent,{values[-1]:.6E},MEAN,{values.mean():.6E},MAXimum,{values.max():.6E},"
+                f"MINimum,{values.min():.6E},STDev,{std:.6E},COUNt,{len(values)}")
+
+    def waveform(self, channel):
+        sample_rate = self.sample_rate()
+        n_total = int(sample_rate * N_DIV_H * self.tdiv)
+        sparcing = max(self.wfsu["SP"], 1)
+        n_points = self.wfsu["NP"] or n_total // sparcing
+        idx = self.wfsu["FP"] + np.arange(n_points) * sparcing
+        volts = self.bench.waveform(channel, self.trigger_time + idx / sample_rate)
+        codes = np.clip(np.round(volts / self.vdiv[channel] * CODES_PER_DIV), -128, 127).astype(np.int8)
+        data = codes.tobytes()
+        return f"C{channel}:WF DAT2,#9{len(data):09d}".encode() + data + b"\n\n"
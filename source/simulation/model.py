@@ -0,0 +1,153 @@
+'''
+Created on 18.10.26
+
+@author: Dennis Rathgeb
+
+Transfer function model and shared bench state of the simulator.
+'''
+
+import time
+
+import numpy as np
+
+
+class SecondOrderModel:
+    '''
+    Second order section as device under test.
+    kind is "lowpass", "highpass" or "bandpass".
+    '''
+    def __init__(self, f0=10e3, q=0.707, kind="lowpass", gain=1.0):
+        self.f0 = f0
+        self.q = q
+        self.kind = kind
+        self.gain = gain
+
+    def response(self, freq):
+        """complex response, works on scalars and arrays"""
+        s = 1j * np.asarray(freq, dtype=float) / self.f0
+        den = 1 + s / self.q + s ** 2
+        if self.kind == "highpass":
+            return self.gain * s ** 2 / den
+        if self.kind == "bandpass":
+            return self.gain * (s / self.q) / den
+        return self.gain / den
+
+
+class Bench:
+    '''
+    State shared by the simulated AWG and scope: the AWG output drives C1
+    directly and C2 through the model.
+    noise is the relative noise of RMS readings, noise_floor the absolute noise in volts
+    and phase_noise the noise of phase readings in degrees.
+    settle_time is the time constant (s) with which C2 follows a frequency step of a sine, 0 is instant.
+    '''
+    def __init__(self, model=None, noise=0.002, noise_floor=2e-4, phase_noise=0.2, seed=None, settle_time=0.0):
+        self.model = model or SecondOrderModel()
+        self.noise = noise
+        self.noise_floor = noise_floor
+        self.phase_noise = phase_noise
+        self.rng = np.random.default_rng(seed)
+        self.settle_time = settle_time
+        # response before the last frequency step and when it happened (time.monotonic)
+        self.step_from = None
+        self.step_at = 0.0
+        self._freq = 1000.0
+        # peak to peak volts like the FY6900 WMA command
+        self.amplitude = 1.0
+        self.offset = 0.0
+        self.output_on = False
+        # 0 is sine, n > 0 arbitrary slot n, one period scaled to -1..1 per slot
+        self.wave = 0
+        self.arb = {}
+        # running internal sweep: f1, f2, duration, log and start time (time.monotonic)
+        self.sweep = None
+
+    @property
+    def freq(self):
+        return self._freq
+
+    @freq.setter
+    def freq(self, value):
+        if self.settle_time > 0 and value != self._freq:
+            self.step_from = self.response()
+            self.step_at = time.monotonic()
+        self._freq = value
+
+    def response(self):
+        """response of the model at freq, still moving from the one before the last step while settling"""
+        h = self.model.response(self._freq)
+        if self.step_from is None:
+            return h
+        return h + (self.step_from - h) * np.exp(-(time.monotonic() - self.step_at) / self.settle_time)
+
+    def tones(self, channel):
+        """
+        harmonic numbers and complex peak amplitudes of a channel while an arbitrary wave is output,
+        only the harmonics that are not negligible
+        """
+        samples = self.arb.get(self.wave, np.zeros(2))
+        spectrum = np.fft.rfft(samples) / len(samples)
+        spectrum[1:] *= 2
+        k = np.flatnonzero(np.abs(spectrum[1:]) > 1e-4 * np.abs(spectrum).max()) + 1
+        c = self.amplitude / 2 * spectrum[k]
+        if not self.output_on:
+            c = c * 0
+        if channel == 2:
+            c = c * self.model.response(k * self.freq)
+        return k, c
+
+    def signal(self, channel):
+        """peak amplitude (V) and phase (rad) of a channel, for arbitrary waves the sine with the same RMS"""
+        if not self.output_on:
+            return 0.0, 0.0
+        if self.wave != 0:
+            _, c = self.tones(channel)
+            return float(np.sqrt(np.sum(np.abs(c) ** 2))), 0.0
+        peak = self.amplitude / 2
+        if channel == 1:
+            return peak, 0.0
+        h = self.response()
+        return peak * abs(h), float(np.angle(h))
+
+    def rms(self, channel):
+        peak, _ = self.signal(channel)
+        true_rms = peak / np.sqrt(2)
+        return abs(true_rms * (1 + self.rng.normal(0, self.noise)) + self.rng.normal(0, self.noise_floor))
+
+    def phase(self, channel1, channel2):
+        """phase of channel2 relative to channel1 in degrees"""
+        peak2, phase2 = self.signal(channel2)
+        _, phase1 = self.signal(channel1)
+        std = self.phase_noise + np.degrees(self.noise_floor / max(peak2, 1e-12))
+        value = np.degrees(phase2 - phase1) + self.rng.normal(0, min(std, 180))
+        return (value + 180) % 360 - 180
+
+    def sweep_phase(self, t):
+        """phase (rad) and frequency of the running sweep at the times t, the sweep repeats"""
+        f1, f2, duration = self.sweep["f1"], self.sweep["f2"], self.sweep["duration"]
+        tau = np.mod(t - self.sweep["start"], duration)
+        if self.sweep["log"]:
+            k = f2 / f1
+            freq = f1 * k ** (tau / duration)
+            phase = 2 * np.pi * f1 * duration / np.log(k) * (k ** (tau / duration) - 1)
+        else:
+            freq = f1 + (f2 - f1) * tau / duration
+            phase = 2 * np.pi * (f1 * tau + (f2 - f1) * tau ** 2 / (2 * duration))
+        return phase, freq
+
+    def waveform(self, channel, t):
+        """channel voltage at the times t (time.monotonic based while a sweep runs)"""
+        t = np.asarray(t, dtype=float)
+        if self.sweep is not None and self.output_on:
+            phase, freq = self.sweep_phase(t)
+            h = self.model.response(freq) if channel == 2 else np.ones(len(t))
+            v = self.amplitude / 2 * np.abs(h) * np.sin(phase + np.angle(h))
+            return v + self.rng.normal(0, self.noise_floor, size=np.shape(t))
+        if self.wave != 0:
+            v = np.zeros(t.shape)
+            for k, c in zip(*self.tones(channel)):
+                v += np.real(c * np.exp(2j * np.pi * k * self.freq * t))
+            return v + self.rng.normal(0, self.noise_floor, size=np.shape(t))
+        peak, phase = self.signal(channel)
+        v = peak * np.sin(2 * np.pi * self.freq * t + phase)
+        return v + self.rng.normal(0, self.noise_floor, size=np.shape(t))
@@ -0,0 +1,72 @@
+'''
+Created on 18.10.26
+
+@author: Dennis Rathgeb
+
+Fan-out of sweep results to any number of clients.
+The measurement loop only appends to the buffer and never waits for a client.
+Every subscriber reads from its own cursor, a slow subscriber gets all points
+it missed coalesced into its next frame.
+'''
+
+import asyncio
+import json
+import threading
+
+import numpy as np
+
+# how often subscribers look for new points in seconds
+POLL_INTERVAL = 0.02
+
+
+class SweepBroadcast:
+    def __init__(self, params=None):
+        self.params = params
+        self.points = []
+        self.done = False
+        self.error = None
+        # producer of the points, if it runs on the event loop
+        self.task = None
+        self.lock = threading.Lock()
+
+    def publish(self, freq, gain, phase):
+        with self.lock:
+            self.points.append((freq, gain, phase))
+
+    def finish(self, error=None):
+        with self.lock:
+            self.done = True
+            self.error = error
+
+    async def frames(self, batch=1, poll=POLL_INTERVAL):
+        """
+        Async generator of lists of (freq, gain, phase), from the first point of the sweep.
+        A frame has at least batch points, only the last one can be smaller.
+        """
+        cursor = 0
+        while True:
+            with self.lock:
+                n_points = len(self.points)
+                done = self.done
+            if n_points - cursor >= batch or (done and n_points > cursor):
+                frame = self.points[cursor:n_points]
+                cursor = n_points
+                yield frame
+            elif done:
+                break
+            else:
+                await asyncio.sleep(poll)
+
+
+def point_dict(point):
+    freq, gain, phase = point
+    return {"freq": freq, "gain": gain, "phase": phase}
+
+
+def encode_json(frame):
+    return json.dumps({"points": [point_dict(p) for p in frame]})
+
+
+def encode_binary(frame):
+    """frame as little endian float32 triples freq, gain, phase"""
+    return np.asarray(frame, dtype="<f4").reshape(-1, 3).tobytes()
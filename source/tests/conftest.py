@@ -0,0 +1,12 @@
+'''
+Created on 18.10.26
+
+@author: Dennis Rathgeb
+
+The tests run against the simulated instruments, the modules import each other from source/.
+'''
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,34 @@
+'''
+Created on 18.10.26
+
+@author: Dennis Rathgeb
+
+Runs created by several threads at once.
+'''
+
+import json
+import os
+import tempfile
+import threading
+
+from archive import INDEX_FILE, SweepArchive
+
+
+def test_concurrent_runs_are_all_indexed():
+    root = tempfile.mkdtemp()
+    archive = SweepArchive(root)
+
+    def create():
+        for _ in range(20):
+            archive.create_run({"num_points": 10}, "scope").close()
+
+    threads = [threading.Thread(target=create) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    with open(os.path.join(root, INDEX_FILE)) as f:
+        lines = [json.loads(line) for line in f]
+    assert len(lines) == 160
+    assert len(SweepArchive(root).list_runs(device="scope")) == 160
+    assert len(archive.list_runs()) == 160
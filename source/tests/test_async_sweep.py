@@ -0,0 +1,40 @@
+'''
+Created on 18.10.26
+
+@author: Dennis Rathgeb
+
+The async sweep measures the same as the blocking one, in every mode.
+'''
+
+import asyncio
+
+import numpy as np
+import pytest
+
+from async_bode import AsyncSweep
+from bode import BodePlotter
+from simulation import make_instruments
+from simulation.model import Bench, SecondOrderModel
+
+
+@pytest.mark.parametrize("params", [
+    {"sweep": "adaptive", "num_points": 16},
+    {"mode": "broadband", "num_points": 16},
+    {"mode": "hwsweep", "num_points": 16},
+])
+def test_async_sweep_matches_model(params):
+    bench = Bench(SecondOrderModel(f0=2e3, q=0.7), seed=3)
+    awg, scope, _ = make_instruments(bench)
+    bode = BodePlotter(awg, scope)
+    bode.set_params(dict({"start_freq": 200, "stop_freq": 2e4, "n_samples": 3}, **params))
+    freq, gain, phase = asyncio.run(AsyncSweep(bode).run())
+    assert len(freq) >= 10
+    h = bench.model.response(np.array(freq))
+    # deep in the stopband the noise of C2 dominates
+    strong = np.abs(h) > 0.05
+    assert np.max(np.abs(20 * np.log10(np.array(gain) / np.abs(h)))[strong]) < 1.0
+    assert np.max(np.abs(np.array(phase) - np.degrees(np.angle(h)))[strong]) < 3.0
+    if params.get("sweep") == "adaptive":
+        # the refinement ran through the checkpoint like the blocking sweep
+        assert bode.checkpoint.complete
+        assert len(bode.checkpoint.points) > 9
@@ -0,0 +1,24 @@
+'''
+Created on 18.10.26
+
+@author: Dennis Rathgeb
+
+Lazily registered AWG drivers.
+'''
+
+import pytest
+
+from awg_factory import AwgFactory
+
+
+def test_failed_import_keeps_the_driver_registered():
+    factory = AwgFactory()
+    factory.entry_points_loaded = True
+    factory.add_lazy_awg("broken", "no_such_awg_module:AWG")
+    for _ in range(2):
+        with pytest.raises(ImportError):
+            factory.get_class_by_name("broken")
+    assert "broken" in factory.names()
+    factory.add_lazy_awg("dummy", "awgdrivers.dummy_awg:DummyAWG")
+    assert factory.get_class_by_name("dummy").__name__ == "DummyAWG"
+    assert "dummy" not in factory.lazy_awgs
@@ -0,0 +1,36 @@
+'''
+Created on 18.10.26
+
+@author: Dennis Rathgeb
+
+Sweeps, calibrations, production tests and health checks share the main bench.
+'''
+
+import tempfile
+
+import pytest
+
+import main
+
+
+class CountingScope:
+    def __init__(self):
+        self.pings = 0
+
+    def ping(self):
+        self.pings += 1
+        return True
+
+
+def test_health_check_skips_busy_bench():
+    main.open_stores(tempfile.mkdtemp())
+    main.sessions.scope = CountingScope()
+    with main.bench_lock:
+        main.sessions.check()
+        assert main.sessions.scope.pings == 0
+        with pytest.raises(main.HTTPException) as e:
+            main.record_calibration()
+        assert e.value.status_code == 409
+    main.sessions.check()
+    assert main.sessions.scope.pings == 1
+    assert not main.bench_busy()
@@ -0,0 +1,35 @@
+'''
+Created on 18.10.26
+
+@author: Dennis Rathgeb
+
+Fixture calibration on the simulated bench.
+'''
+
+from bode import BodePlotter
+from calibration import CalibrationCache
+from simulation import make_instruments
+from simulation.model import Bench, SecondOrderModel
+
+
+def test_key_depends_on_mode_and_autorange():
+    params = {"start_freq": 100, "stop_freq": 1e4, "num_points": 10, "mode": "meas", "autorange": False}
+    key = CalibrationCache.key(params, "scope")
+    assert CalibrationCache.key(dict(params, mode="waveform"), "scope") != key
+    assert CalibrationCache.key(dict(params, autorange=True), "scope") != key
+
+
+def test_channel2_is_ranged_for_the_dut():
+    bench = Bench(SecondOrderModel(f0=1e5, gain=1.0), seed=1)
+    awg, scope, _ = make_instruments(bench)
+    bode = BodePlotter(awg, scope)
+    bode.calibration_cache = CalibrationCache()
+    bode.set_params({"start_freq": 100, "stop_freq": 1e3, "num_points": 3})
+    cal = bode.record_calibration()
+    # the DUT attenuates 20 dB more than the through connection
+    bench.model.gain = 0.1
+    bode.setup_run()
+    assert bode.calibration is cal
+    assert bode.vdiv[1] == cal.vdiv[1]
+    assert bode.vdiv[2] < cal.vdiv[2]
+    assert scope.get_vdiv(2) == bode.vdiv[2]
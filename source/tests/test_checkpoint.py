@@ -0,0 +1,58 @@
+'''
+Created on 18.10.26
+
+@author: Dennis Rathgeb
+
+Aborted and resumed point sweeps on the simulated bench.
+'''
+
+import pytest
+
+from bode import BodePlotter
+from simulation import make_instruments
+
+PARAMS = {"start_freq": 100, "stop_freq": 1e4, "num_points": 10, "n_samples": 2}
+
+
+def aborting_bode(good_points):
+    """BodePlotter whose scope stops answering after good_points points"""
+    awg, scope, bench = make_instruments()
+    bode = BodePlotter(awg, scope)
+    bode.set_params(PARAMS)
+    acquire = bode.acquire_point
+    state = {"points": 0, "dead": False}
+
+    def acquire_point(freq):
+        if state["points"] >= good_points and state["dead"]:
+            raise IOError("usb gone")
+        state["points"] += 1
+        return acquire(freq)
+
+    bode.acquire_point = acquire_point
+    scope.ping = lambda: not state["dead"]
+    scope.reconnect = lambda: not state["dead"]
+    return bode, state
+
+
+def test_run_after_abort_measures_the_whole_grid():
+    bode, state = aborting_bode(4)
+    state["dead"] = True
+    with pytest.raises(RuntimeError):
+        bode.run()
+    assert bode.checkpoint.summary()["done"] == 4
+    state["dead"] = False
+    freq, gain, phase = bode.run()
+    assert len(freq) == PARAMS["num_points"]
+    assert freq == sorted(freq)
+
+
+def test_resume_returns_measured_and_new_points():
+    bode, state = aborting_bode(4)
+    state["dead"] = True
+    with pytest.raises(RuntimeError):
+        bode.run()
+    state["dead"] = False
+    bode.resume_run(bode.checkpoint)
+    freq, gain, phase = bode.run()
+    assert len(freq) == PARAMS["num_points"]
+    assert bode.checkpoint.summary() == {"points": 10, "done": 10, "failed": 0, "complete": True}
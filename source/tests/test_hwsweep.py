@@ -0,0 +1,34 @@
+'''
+Created on 18.10.26
+
+@author: Dennis Rathgeb
+
+Sweep of the AWG captured in one record, on the simulated bench.
+'''
+
+import numpy as np
+
+from bode import BodePlotter
+from simulation import make_instruments
+from simulation.model import Bench, SecondOrderModel
+
+
+def test_stopband_points_are_rejected():
+    bench = Bench(SecondOrderModel(f0=3e3, q=2), seed=1)
+    awg, scope, _ = make_instruments(bench)
+    bode = BodePlotter(awg, scope)
+    bode.set_params({"start_freq": 100, "stop_freq": 1e5, "num_points": 30, "mode": "hwsweep"})
+    bode.setup_run()
+    grid = np.logspace(2, 5, 30)
+    points = list(bode.sweep_points())
+    assert len(points) == len(grid)
+    for f, (freq, gain, phase) in zip(grid, points):
+        h = bench.model.response(f)
+        if abs(h) < 0.02:
+            # deep stopband, C2 is only a few codes
+            assert (freq, gain, phase) == (0.0, 0.0, 0.0)
+        elif freq > 0:
+            assert abs(20 * np.log10(gain / abs(h))) < 1.0
+            assert abs((phase - np.degrees(np.angle(h)) + 180) % 360 - 180) < 2.0
+    # the passband is measured
+    assert all(p[0] > 0 for f, p in zip(grid, points) if f < 5e3)
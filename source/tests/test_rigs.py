@@ -0,0 +1,26 @@
+'''
+Created on 18.10.26
+
+@author: Dennis Rathgeb
+
+A rig must not take the instruments of the main bench.
+'''
+
+import tempfile
+
+import pytest
+
+import main
+
+
+def test_rig_rejects_main_instruments():
+    main.open_stores(tempfile.mkdtemp())
+    main.sessions.state["awg"] = {"port": "/dev/ttyUSB0", "model": "FY6900"}
+    main.sessions.state["scope"] = {"resource": "USB0::1::INSTR", "idn": "Siglent"}
+    with pytest.raises(main.HTTPException) as e:
+        main.add_rig(main.RigRequest(name="r", awg_port="/dev/ttyUSB0"))
+    assert e.value.status_code == 409
+    with pytest.raises(main.HTTPException) as e:
+        main.add_rig(main.RigRequest(name="r", awg_port="/dev/ttyUSB1", scope_resource="USB0::1::INSTR"))
+    assert e.value.status_code == 409
+    assert main.rigs.get("r") is None
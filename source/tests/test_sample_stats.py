@@ -0,0 +1,32 @@
+'''
+Created on 18.10.26
+
+@author: Dennis Rathgeb
+
+Outlier filtering of streamed samples.
+'''
+
+import numpy as np
+
+from sample_stats import StreamingStats
+
+
+def test_first_sample_outlier_is_dropped():
+    rng = np.random.default_rng(0)
+    stats = StreamingStats(0.2)
+    stats.add(1.15)
+    for x in 1.0 + rng.normal(0, 0.002, 20):
+        stats.add(x)
+    # within the tolerance of 20 % but far outside the spread of the others
+    assert stats.count == 20
+    assert abs(stats.value() - 1.0) < 0.002
+
+
+def test_phase_outlier_first_around_180():
+    rng = np.random.default_rng(1)
+    stats = StreamingStats(0.2, circular=True)
+    stats.add(150.0)
+    for x in 179.0 + rng.normal(0, 0.5, 20):
+        stats.add((x + 180) % 360 - 180)
+    assert stats.count == 20
+    assert abs(stats.value() - 179.0) < 0.5
@@ -0,0 +1,19 @@
+'''
+Created on 18.10.26
+
+@author: Dennis Rathgeb
+
+Parsing of WF? answers.
+'''
+
+from simulation import make_instruments
+
+
+def test_waveform_block_owns_its_codes():
+    _, scope, _ = make_instruments()
+    raw = bytearray(b"C1:WF DAT2,#9000000004" + bytes([1, 2, 0xFF, 0x80]) + b"\n\n")
+    codes = scope.parse_waveform_block(raw)
+    assert codes.tolist() == [1, 2, -1, -128]
+    assert codes.flags.writeable
+    raw[22] = 9
+    assert codes[0] == 1
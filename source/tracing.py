@@ -0,0 +1,136 @@
+'''
+Created on 18.10.26
+
+@author: Dennis Rathgeb
+
+Lightweight tracing of instrument commands.
+Records the duration of every traced call and the number of attempts query_meas
+needed per frequency point. The timeline can be exported as Chrome trace JSON
+(chrome://tracing or https://ui.perfetto.dev).
+Tracing is off by default, a disabled traced call only costs one attribute check.
+The current point is kept per thread, sweeps of several rigs run in their own threads.
+'''
+
+import functools
+import os
+import threading
+import time
+from collections import Counter, deque
+
+MAX_EVENTS = 100000
+
+
+class Tracer:
+    def __init__(self, max_events=MAX_EVENTS):
+        self.enabled = False
+        self.lock = threading.Lock()
+        self.events = deque(maxlen=max_events)
+        self.stats = {}
+        self.attempts = {}
+        self.local = threading.local()
+        self.t0 = time.perf_counter()
+
+    def reset(self):
+        with self.lock:
+            self.events.clear()
+            self.stats = {}
+            self.attempts = {}
+            self.local = threading.local()
+            self.t0 = time.perf_counter()
+
+    @property
+    def point(self):
+        """frequency point of the calling thread"""
+        return getattr(self.local, "point", None)
+
+    def set_point(self, freq):
+        """frequency point the following calls of this thread belong to"""
+        if self.enabled:
+            self.local.point = int(freq)
+            self.instant("point", {"freq": self.local.point})
+
+    def record(self, name, start, duration, args=None):
+        with self.lock:
+            self.events.append((name, start, duration, threading.get_ident(), args))
+            stat = self.stats.setdefault(name, [0, 0.0, 0.0])
+            stat[0] += 1
+            stat[1] += duration
+            stat[2] = max(stat[2], duration)
+
+    def instant(self, name, args=None):
+        """marker on the timeline, not counted in the command statistics"""
+        with self.lock:
+            self.events.append((name, time.perf_counter(), 0.0, threading.get_ident(), args))
+
+    def count_attempts(self, command, attempts):
+        """attempts query_meas needed for command at the current point"""
+        with self.lock:
+            self.attempts.setdefault(self.point, Counter())[attempts] += 1
+        if attempts > 1:
+            self.instant("retry", {"cmd": command, "attempts": attempts})
+
+    def metrics(self):
+        with self.lock:
+            commands = {
+                name: {
+                    "count": count,
+                    "total_s": total,
+                    "mean_ms": total / count * 1e3,
+                    "max_ms": peak * 1e3,
+                }
+                for name, (count, total, peak) in self.stats.items()
+            }
+            histogram = Counter()
+            for counter in self.attempts.values():
+                histogram.update(counter)
+            return {
+                "enabled": self.enabled,
+                "commands": commands,
+                "attempts": dict(sorted(histogram.items())),
+                "attempts_per_point": {str(point): dict(sorted(counter.items()))
+                                       for point, counter in self.attempts.items()},
+            }
+
+    def chrome_trace(self):
+        pid = os.getpid()
+        with self.lock:
+            events = list(self.events)
+        trace = []
+        for name, start, duration, tid, args in events:
+            event = {
+                "name": name,
+                "cat": name.split(".")[0],
+                "ts": (start - self.t0) * 1e6,
+                "pid": pid,
+                "tid": tid,
+                "args": args or {},
+            }
+            if duration > 0:
+                event.update(ph="X", dur=duration * 1e6)
+            else:
+                event.update(ph="i", s="t")
+            trace.append(event)
+        return {"traceEvents": trace, "displayTimeUnit": "ms"}
+
+
+tracer = Tracer()
+
+
+def traced(name):
+    """
+    Decorator recording the duration of a method call.
+    A string first argument (the command) is stored with the event.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not tracer.enabled:
+                return func(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                cmd = args[1] if len(args) > 1 and isinstance(args[1], str) else None
+                tracer.record(name, start, time.perf_counter() - start, {"cmd": cmd} if cmd else None)
+        return wrapper
+    return decorator